@@ -0,0 +1,589 @@
+"""
+Alert Rules
+새 PDF 스냅샷이 저장될 때마다 사용자 정의 조건을 전 ETF에 한 번에 평가하는 알림 엔진
+
+조건은 파이썬 식 문법의 작은 부분집합으로 쓰며, 등록 시 한 번만 파싱/검증해서
+컬럼 단위(벡터) 연산 코드로 컴파일한다. 평가할 때는 전 ETF의 (금일, 직전 저장일)
+보유종목을 한 번의 병합으로 만든 테이블에 모든 규칙을 그대로 적용한다.
+
+    event == 'new' and weight > 2                       신규 편입 비중 2% 초과
+    ticker == 'NVDA' and etf_name == '글로벌AI' and crosses_above(10)
+    is_cash and weight_change > 3                       현금 비중 3%p 이상 증가
+
+사용 가능한 이름은 FIELDS / FUNCTIONS 참고. 이벤트(event, pure_change)는
+analyze_rebalancing이 이벤트 저장소에 남긴 결과를 사용한다.
+
+발생한 알림은 (규칙, ETF, 종목, 날짜) 기준으로 중복 제거하여 SQLite에 남기고
+(앱 내 알림 피드), 새 알림만 싱크(JSONL 파일, 웹훅)로 전달한다. 싱크별 전달 대기열에
+넣어 두고 전달에 성공한 뒤에만 지우므로, 실패한 알림은 다음 평가 때 다시 전달된다.
+"""
+
+import ast
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+import requests
+
+from etf_monitor import ActiveETFMonitor, ETF_NAMES
+from event_store import RebalancingEventStore
+from snapshot_store import SnapshotStore, atomic_write
+
+
+# 조건식에서 쓸 수 있는 컬럼
+FIELDS = {
+    'etf': 'ETF idx',
+    'etf_name': 'ETF 이름',
+    'code': '종목코드',
+    'ticker': 'yfinance 티커 (예: NVDA)',
+    'name': '종목명',
+    'weight': '금일 비중(%)',
+    'weight_prev': '직전 저장일 비중(%)',
+    'weight_change': '비중 변화(%p)',
+    'qty': '금일 수량',
+    'qty_prev': '직전 수량',
+    'is_new': '신규 편입 여부',
+    'is_removed': '완전 편출 여부',
+    'is_cash': '현금 여부',
+    'event': "리밸런싱 이벤트 ('new', 'removed', 'increased', 'decreased', '')",
+    'pure_change': '가격효과 제거 순수 비중변화(%p, 이벤트가 없으면 0)',
+    'market_return': '시장 수익률(%, 이벤트가 없으면 0)',
+}
+
+# 평가 테이블 컬럼 타입 (등록 시 규칙을 미리 평가해 타입 오류를 거를 때 사용)
+FIELD_TYPES = {
+    'etf': object, 'etf_name': object, 'code': object, 'ticker': object, 'name': object,
+    'weight': float, 'weight_prev': float, 'weight_change': float, 'qty': float, 'qty_prev': float,
+    'is_new': bool, 'is_removed': bool, 'is_cash': bool,
+    'event': object, 'pure_change': float, 'market_return': float,
+}
+
+# 조건식에서 쓸 수 있는 함수 (구현은 _namespace)
+FUNCTIONS = {
+    'abs': 'abs(weight_change): 절댓값',
+    'crosses_above': 'crosses_above(10): 직전 비중 < 10 <= 금일 비중',
+    'crosses_below': 'crosses_below(10): 직전 비중 >= 10 > 금일 비중',
+    'contains': "contains(name, '엔비디아'): 부분 문자열 (대소문자 무시)",
+}
+
+SEVERITIES = ('info', 'warning', 'critical')
+
+_COMPARE_OPS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn)
+_ARITH_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+
+
+class RuleError(ValueError):
+    """허용되지 않는 조건식"""
+
+
+class _Vectorize(ast.NodeTransformer):
+    """
+    검증된 조건식을 컬럼 연산 식으로 변환
+
+    and/or/not → & | ~, 연쇄 비교 → 비교의 &, in (..) → _isin(...)
+    """
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        result = node.values[0]
+        for value in node.values[1:]:
+            result = ast.BinOp(left=result, op=op, right=value)
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        parts = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                part = ast.Call(func=ast.Name(id='_isin', ctx=ast.Load()), args=[left, right], keywords=[])
+                if isinstance(op, ast.NotIn):
+                    part = ast.UnaryOp(op=ast.Invert(), operand=part)
+            else:
+                part = ast.Compare(left=left, ops=[op], comparators=[right])
+            parts.append(part)
+            left = right
+        result = parts[0]
+        for part in parts[1:]:
+            result = ast.BinOp(left=result, op=ast.BitAnd(), right=part)
+        return result
+
+
+def _validate(tree: ast.AST):
+    """허용된 노드/이름/함수만 쓰였는지 확인"""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Expression, ast.Load, ast.And, ast.Or, ast.Not, ast.USub)
+                      + _COMPARE_OPS + _ARITH_OPS):
+            continue
+        if isinstance(node, (ast.BoolOp, ast.Compare)):
+            continue
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            continue
+        if isinstance(node, ast.BinOp) and isinstance(node.op, _ARITH_OPS):
+            continue
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+            continue
+        if isinstance(node, (ast.Tuple, ast.List)):
+            if not all(isinstance(e, ast.Constant) for e in node.elts):
+                raise RuleError("목록에는 상수만 쓸 수 있습니다.")
+            continue
+        if isinstance(node, ast.Name):
+            if node.id not in FIELDS and node.id not in FUNCTIONS:
+                raise RuleError(f"알 수 없는 이름입니다: {node.id} (사용 가능: {', '.join(FIELDS)})")
+            continue
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise RuleError(f"허용되지 않은 함수 호출입니다 (사용 가능: {', '.join(FUNCTIONS)})")
+            continue
+        raise RuleError(f"허용되지 않은 문법입니다: {type(node).__name__}")
+
+
+def compile_condition(condition: str):
+    """
+    조건식 → 벡터 평가용 코드 객체 (한 번만 호출)
+
+    Raises:
+        RuleError: 문법 오류 또는 허용되지 않은 이름/연산
+    """
+    try:
+        tree = ast.parse(condition.strip(), mode='eval')
+    except SyntaxError as e:
+        raise RuleError(f"조건식 문법 오류: {e.msg}") from None
+    _validate(tree)
+    tree = ast.fix_missing_locations(_Vectorize().visit(tree))
+    return compile(tree, f"<rule: {condition}>", 'eval')
+
+
+def probe_frame() -> pd.DataFrame:
+    """
+    컬럼 타입대로 기본값('', 0.0, False) 한 행만 담은 평가 테이블
+
+    빈 object 배열은 어떤 연산도 통과하므로 타입 오류가 드러나도록 한 행을 둔다.
+    """
+    return pd.DataFrame({col: pd.Series([dtype()], dtype=dtype) if dtype is not object
+                         else pd.Series([''], dtype=object) for col, dtype in FIELD_TYPES.items()})
+
+
+def _match(code, frame: pd.DataFrame, namespace: Dict = None) -> np.ndarray:
+    """컴파일된 조건식을 평가 테이블에 적용 (상수 결과는 행 수만큼 확장)"""
+    if namespace is None:
+        namespace = _namespace(frame)
+    return np.broadcast_to(np.asarray(eval(code, namespace), dtype=bool), len(frame))
+
+
+def _namespace(frame: pd.DataFrame) -> Dict:
+    """조건식 평가용 이름 공간 (컬럼 배열 + 벡터 함수)"""
+    weight = frame['weight'].to_numpy()
+    weight_prev = frame['weight_prev'].to_numpy()
+    namespace = {col: frame[col].to_numpy() for col in FIELDS}
+    namespace.update({
+        '__builtins__': {},
+        'abs': np.abs,
+        'crosses_above': lambda level: (weight_prev < level) & (weight >= level),
+        'crosses_below': lambda level: (weight_prev >= level) & (weight < level),
+        'contains': lambda values, text: pd.Series(values).str.contains(str(text), case=False, regex=False).to_numpy(),
+        '_isin': lambda values, options: np.isin(values, list(options)),
+    })
+    return namespace
+
+
+@dataclass
+class AlertRule:
+    """사용자 정의 알림 규칙"""
+
+    name: str
+    condition: str
+    severity: str = 'info'
+    enabled: bool = True
+    _code: object = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.severity not in SEVERITIES:
+            raise RuleError(f"알 수 없는 중요도입니다: {self.severity}")
+        self._code = compile_condition(self.condition)
+        # 문법은 맞아도 타입이 맞지 않는 식(예: contains(weight, 'a'))은 등록 시점에 거른다
+        try:
+            with np.errstate(all='ignore'):
+                _match(self._code, probe_frame())
+        except Exception as e:
+            raise RuleError(f"조건식을 평가할 수 없습니다: {type(e).__name__}: {e}") from None
+
+    def matches(self, frame: pd.DataFrame, namespace: Dict = None) -> np.ndarray:
+        """평가 테이블 각 행의 조건 충족 여부 (bool 배열)"""
+        return _match(self._code, frame, namespace)
+
+    def to_dict(self) -> Dict:
+        return {k: v for k, v in asdict(self).items() if not k.startswith('_')}
+
+
+DEFAULT_RULES = [
+    AlertRule("신규 편입 2% 초과", "event == 'new' and weight > 2", 'warning'),
+    AlertRule("글로벌AI NVDA 10% 돌파", "ticker == 'NVDA' and etf_name == '글로벌AI' and crosses_above(10)", 'critical'),
+    AlertRule("현금 비중 3%p 급증", "is_cash and weight_change > 3", 'warning'),
+]
+
+
+def load_rules(path: str) -> List[AlertRule]:
+    """규칙 파일(JSON 목록) 로드, 파일이 없으면 기본 규칙"""
+    if not os.path.exists(path):
+        return list(DEFAULT_RULES)
+    with open(path, 'r', encoding='utf-8') as f:
+        return [AlertRule(**item) for item in json.load(f)]
+
+
+def save_rules(rules: List[AlertRule], path: str):
+    """규칙 파일 저장"""
+    payload = [rule.to_dict() for rule in rules]
+
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+
+    atomic_write(path, write)
+
+
+def build_frame(pairs: List[Dict], events: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    전 ETF의 (금일, 직전 저장일) 보유종목을 한 번에 병합한 평가 테이블
+
+    Args:
+        pairs: [{'idx', 'date', 'prev_date', 'today', 'prev'}] (today/prev는 저장 형식 DataFrame)
+        events: 이벤트 저장소 조회 결과 (etf_idx, date, code, event_type, pure_change, market_return)
+
+    Returns:
+        DataFrame: date, prev_date + FIELDS
+    """
+    def stack(key):
+        frames = []
+        for pair in pairs:
+            df = pair[key]
+            if df is None or df.empty:
+                continue
+            frames.append(pd.DataFrame({
+                'etf': str(pair['idx']), 'date': pair['date'], 'prev_date': pair['prev_date'],
+                'code': df['종목코드'].astype(object).fillna('').astype(str).to_numpy(),
+                'name': df['종목명'].astype(object).fillna('').astype(str).to_numpy(),
+                'qty': pd.to_numeric(df['수량'], errors='coerce').to_numpy(),
+                'weight': pd.to_numeric(df['비중'], errors='coerce').to_numpy(),
+            }))
+        frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            columns=['etf', 'date', 'prev_date', 'code', 'name', 'qty', 'weight'])
+        # 현금처럼 종목코드가 빈 행은 종목명으로 식별, 같은 종목이 여러 행이면 합산
+        frame['key'] = frame['code'].where(frame['code'] != '', frame['name'])
+        return frame.groupby(['etf', 'key'], as_index=False, sort=False).agg(
+            date=('date', 'first'), prev_date=('prev_date', 'first'), code=('code', 'first'),
+            name=('name', 'first'), qty=('qty', 'sum'), weight=('weight', 'sum'))
+
+    today, prev = stack('today'), stack('prev')
+    merged = today.merge(prev[['etf', 'key', 'name', 'qty', 'weight']], on=['etf', 'key'],
+                         how='outer', suffixes=('', '_prev'))
+    dates = {str(p['idx']): (p['date'], p['prev_date']) for p in pairs}
+    merged['date'] = merged['etf'].map(lambda e: dates[e][0])
+    merged['prev_date'] = merged['etf'].map(lambda e: dates[e][1])
+    merged['name'] = merged['name'].fillna(merged['name_prev'])
+    merged['code'] = merged['code'].fillna(merged['key'].where(merged['key'] != merged['name'], ''))
+    for col in ['qty', 'qty_prev', 'weight', 'weight_prev']:
+        merged[col] = merged[col].astype(float).fillna(0.0)
+
+    merged['etf_name'] = merged['etf'].map(ETF_NAMES).fillna(merged['etf'])
+    tickers = {code: ActiveETFMonitor._ticker_from_code(code) for code in merged['code'].unique() if code}
+    merged['ticker'] = merged['code'].map(tickers).fillna('')
+    merged['weight_change'] = merged['weight'] - merged['weight_prev']
+    merged['is_new'] = (merged['qty_prev'] == 0) & (merged['qty'] > 0)
+    merged['is_removed'] = (merged['qty'] == 0) & (merged['qty_prev'] > 0)
+    merged['is_cash'] = merged['name'] == '현금'
+
+    merged['event'] = ''
+    merged['pure_change'] = 0.0
+    merged['market_return'] = 0.0
+    if events is not None and not events.empty:
+        ev = events.drop_duplicates(['etf_idx', 'date', 'code'], keep='last').set_index(['etf_idx', 'date', 'code'])
+        index = pd.MultiIndex.from_arrays([merged['etf'], merged['date'], merged['code']])
+        matched = ev.reindex(index)
+        has_event = matched['event_type'].notna().to_numpy()
+        merged.loc[has_event, 'event'] = matched['event_type'].to_numpy()[has_event]
+        merged.loc[has_event, 'pure_change'] = matched['pure_change'].to_numpy()[has_event]
+        merged.loc[has_event, 'market_return'] = matched['market_return'].to_numpy()[has_event] * 100
+
+    return merged[['date', 'prev_date'] + list(FIELDS)].reset_index(drop=True)
+
+
+class AlertStore:
+    """발생한 알림 기록 (중복 제거 + 앱 내 알림 피드, SQLite WAL)"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY,
+        dedup_key TEXT UNIQUE NOT NULL,
+        rule TEXT NOT NULL,
+        severity TEXT,
+        etf_idx TEXT,
+        etf_name TEXT,
+        date TEXT,
+        code TEXT,
+        name TEXT,
+        message TEXT,
+        payload TEXT,
+        fired_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS ix_alerts_fired ON alerts (fired_at);
+    CREATE TABLE IF NOT EXISTS outbox (
+        dedup_key TEXT NOT NULL,
+        sink TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        PRIMARY KEY (dedup_key, sink)
+    );
+    """
+
+    def __init__(self, db_path: str = "./data/alerts.db"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def add_new(self, alerts: List[Dict], sinks: List[str] = ()) -> List[Dict]:
+        """
+        처음 발생한 알림만 저장하고 반환 (이미 기록된 dedup_key는 무시)
+
+        Args:
+            alerts: evaluate 결과
+            sinks: 새 알림을 전달 대기열에 넣을 싱크 키 목록 (전달 성공 시 mark_delivered로 제거)
+        """
+        fresh = []
+        with closing(self._connect()) as conn, conn:
+            for alert in alerts:
+                cursor = conn.execute("""
+                    INSERT OR IGNORE INTO alerts (dedup_key, rule, severity, etf_idx, etf_name, date, code, name,
+                                                  message, payload, fired_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (alert['dedup_key'], alert['rule'], alert['severity'], alert['etf'], alert['etf_name'],
+                      alert['date'], alert['code'], alert['name'], alert['message'],
+                      json.dumps(alert, ensure_ascii=False, default=str), alert['fired_at']))
+                if cursor.rowcount:
+                    fresh.append(alert)
+            conn.executemany("INSERT OR IGNORE INTO outbox (dedup_key, sink) VALUES (?, ?)",
+                             [(alert['dedup_key'], sink) for alert in fresh for sink in sinks])
+        return fresh
+
+    def pending(self, sink: str, limit: int = 1000) -> List[Dict]:
+        """싱크에 아직 전달되지 않은 알림 (발생 순서)"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT a.payload FROM outbox o JOIN alerts a ON a.dedup_key = o.dedup_key "
+                "WHERE o.sink = ? ORDER BY a.id LIMIT ?", (sink, int(limit))).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def mark_delivered(self, sink: str, keys: List[str]):
+        """전달에 성공한 알림을 싱크 대기열에서 제거"""
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("DELETE FROM outbox WHERE dedup_key = ? AND sink = ?", [(key, sink) for key in keys])
+
+    def mark_failed(self, sink: str, keys: List[str], error: str):
+        """전달 실패 기록 (대기열에 남겨 다음 평가 때 재시도)"""
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE dedup_key = ? AND sink = ?",
+                             [(error, key, sink) for key in keys])
+
+    def recent(self, limit: int = 100) -> pd.DataFrame:
+        """최근 알림 (알림 피드)"""
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                "SELECT fired_at, severity, rule, etf_name, date, code, name, message FROM alerts "
+                "ORDER BY id DESC LIMIT ?", conn, params=[int(limit)])
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
+
+
+class FileSink:
+    """알림을 JSONL 파일에 한 줄씩 추가"""
+
+    def __init__(self, path: str = "./data/alerts.jsonl"):
+        self.path = path
+        self.key = f"file:{os.path.abspath(path)}"
+
+    def __call__(self, alerts: List[Dict]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for alert in alerts:
+                f.write(json.dumps(alert, ensure_ascii=False, default=str) + "\n")
+
+
+class WebhookSink:
+    """알림 목록을 JSON으로 POST (Slack/Teams 등 수신기 대용)"""
+
+    def __init__(self, url: str, timeout: float = 5):
+        self.url = url
+        self.timeout = timeout
+        self.key = f"webhook:{url}"
+
+    def __call__(self, alerts: List[Dict]):
+        response = requests.post(self.url, json={'alerts': alerts}, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class AlertEngine:
+    """규칙 컴파일 + 전 ETF 일괄 평가 + 중복 제거 + 전달"""
+
+    def __init__(self, data_dir: str = "./data", rules: List[AlertRule] = None,
+                 sinks: List[Callable[[List[Dict]], None]] = None):
+        """
+        Args:
+            data_dir: 데이터 루트 디렉토리 (idx_*/ 스냅샷, events.db, alerts.db, alert_rules.json)
+            rules: 규칙 목록, None이면 {data_dir}/alert_rules.json (없으면 기본 규칙)
+            sinks: 새 알림 목록을 받는 콜백, None이면 {data_dir}/alerts.jsonl 파일 싱크
+                   (key 속성이 있으면 전달 대기열 식별에 사용, 없으면 클래스/함수 이름)
+        """
+        self.data_dir = data_dir
+        self.rules_path = os.path.join(data_dir, "alert_rules.json")
+        self.rules = rules if rules is not None else load_rules(self.rules_path)
+        self.sinks = sinks if sinks is not None else [FileSink(os.path.join(data_dir, "alerts.jsonl"))]
+        self.store = AlertStore(os.path.join(data_dir, "alerts.db"))
+        self.last_stats = {}
+        self.rule_errors = {}
+
+    @staticmethod
+    def _sink_key(sink) -> str:
+        return getattr(sink, 'key', None) or getattr(sink, '__qualname__', type(sink).__name__)
+
+    def latest_pairs(self, date: str = None, idx: List[str] = None) -> List[Dict]:
+        """ETF별 기준일(기본: 최신 저장일)과 직전 저장일 스냅샷 쌍"""
+        pairs = []
+        if not os.path.exists(self.data_dir):
+            return pairs
+        for entry in sorted(os.listdir(self.data_dir)):
+            path = os.path.join(self.data_dir, entry)
+            if not entry.startswith('idx_') or not os.path.isdir(path):
+                continue
+            etf = entry[len('idx_'):]
+            if idx and etf not in idx:
+                continue
+            store = SnapshotStore(path)
+            dates = [d for d in store.dates() if not date or d <= date]
+            if len(dates) < 2:
+                continue
+            loaded = store.load_range(dates[-2:])
+            if len(loaded) < 2:
+                continue
+            prev, today = loaded
+            pairs.append({'idx': etf, 'date': dates[-1], 'prev_date': dates[-2], 'today': today, 'prev': prev})
+        return pairs
+
+    def evaluate(self, frame: pd.DataFrame) -> List[Dict]:
+        """
+        평가 테이블에 모든 규칙 적용 → 알림 목록 (중복 제거 전)
+
+        규칙 하나가 실패해도 나머지 규칙은 평가하고, 실패 내용은 rule_errors에 남긴다.
+        """
+        self.rule_errors = {}
+        if frame.empty:
+            return []
+        namespace = _namespace(frame)
+        fired_at = datetime.now().isoformat(timespec='seconds')
+        alerts = []
+        for rule in self.rules:
+            if not rule.enabled:
+                continue
+            try:
+                mask = rule.matches(frame, namespace)
+            except Exception as e:
+                self.rule_errors[rule.name] = f"{type(e).__name__}: {e}"
+                print(f"[WARN] 규칙 평가 실패 ({rule.name}): {type(e).__name__}: {e}")
+                continue
+            for row in frame[mask].to_dict('records'):
+                message = (f"[{row['etf_name']}] {row['name']}({row['code'] or '-'}) {rule.name}: "
+                           f"비중 {row['weight_prev']:.2f}% → {row['weight']:.2f}% ({row['weight_change']:+.2f}%p)")
+                alerts.append({
+                    **row,
+                    'rule': rule.name, 'severity': rule.severity, 'message': message, 'fired_at': fired_at,
+                    'dedup_key': f"{rule.name}|{row['etf']}|{row['code'] or row['name']}|{row['date']}",
+                })
+        return alerts
+
+    def run(self, date: str = None, idx: List[str] = None) -> List[Dict]:
+        """
+        새 스냅샷 반영 후 호출: 전 ETF 평가 → 새 알림만 기록/전달
+
+        Returns:
+            이번에 처음 발생한 알림 목록
+        """
+        started = time.perf_counter()
+        pairs = self.latest_pairs(date, idx)
+        events = None
+        if pairs:
+            event_store = RebalancingEventStore(os.path.join(self.data_dir, "events.db"))
+            dates = sorted({p['date'] for p in pairs})
+            events = event_store.query(start=dates[0], end=dates[-1], limit=1_000_000)
+        frame = build_frame(pairs, events)
+        loaded = time.perf_counter()
+
+        alerts = self.evaluate(frame)
+        fresh = self.store.add_new(alerts, [self._sink_key(sink) for sink in self.sinks])
+        # 싱크별 대기열 전달 (이전에 실패한 알림 포함), 성공한 뒤에만 대기열에서 제거
+        undelivered = 0
+        for sink in self.sinks:
+            key = self._sink_key(sink)
+            pending = self.store.pending(key)
+            if not pending:
+                continue
+            keys = [alert['dedup_key'] for alert in pending]
+            try:
+                sink(pending)
+            except Exception as e:
+                undelivered += len(pending)
+                self.store.mark_failed(key, keys, f"{type(e).__name__}: {e}")
+                print(f"[WARN] 알림 전달 실패 ({key}, {len(pending)}건 대기): {type(e).__name__}: {e}")
+            else:
+                self.store.mark_delivered(key, keys)
+
+        self.last_stats = {
+            'etfs': len(pairs), 'rows': len(frame), 'rules': sum(r.enabled for r in self.rules),
+            'matched': len(alerts), 'new': len(fresh),
+            'rule_errors': len(self.rule_errors), 'undelivered': undelivered,
+            'load_ms': (loaded - started) * 1000, 'eval_ms': (time.perf_counter() - loaded) * 1000,
+        }
+        return fresh
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="저장된 최신 스냅샷으로 알림 규칙 평가")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--date", help="기준일 (기본: ETF별 최신 저장일)")
+    parser.add_argument("--webhook", help="새 알림을 POST할 URL")
+    parser.add_argument("--check", metavar="CONDITION", help="조건식 문법만 검사")
+    args = parser.parse_args()
+
+    if args.check:
+        compile_condition(args.check)
+        print("[OK] 조건식이 유효합니다.")
+    else:
+        sinks = [FileSink(os.path.join(args.data_dir, "alerts.jsonl"))]
+        if args.webhook:
+            sinks.append(WebhookSink(args.webhook))
+        engine = AlertEngine(args.data_dir, sinks=sinks)
+        for alert in engine.run(args.date):
+            print(f"[{alert['severity'].upper()}] {alert['message']}")
+        print(f"[STATS] {engine.last_stats}")
@@ -0,0 +1,297 @@
+"""
+Performance Attribution
+저장된 PDF 히스토리로 ETF별 일간 수익률을 보유종목별 기여도로 분해하는 모듈
+
+모든 ETF의 모든 날짜를 (ETF, 날짜) 행 × 보유종목 열의 정렬된 행렬로 만든 뒤,
+수익률/기여도/누적 기여도/지역별 합계를 몇 번의 행렬 연산으로 계산한다.
+
+- 종목 수익률: PDF 가격(평가금액/수량)의 직전 저장일 대비 변화 (원화 기준이므로 환율 효과 포함)
+- 기여도: 직전일 비중 × 종목 수익률 (ETF 보유종목 수익률 = 기여도 합계)
+- 누적 기여도: 기여도 × 직전일까지의 ETF 누적 성장률의 누적합
+  (종목별 누적 기여도의 합이 ETF 누적 수익률과 정확히 같음)
+"""
+
+import re
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from etf_monitor import ETF_CATEGORIES, ETF_NAMES, load_all_histories
+
+
+# 블룸버그 거래소 코드 → 지역
+EXCHANGE_REGIONS = {
+    'US': '미국', 'UN': '미국', 'UW': '미국', 'UQ': '미국',
+    'CT': '캐나다', 'CN': '캐나다',
+    'JP': '일본', 'JT': '일본',
+    'HK': '홍콩', 'CH': '중국', 'C1': '중국', 'C2': '중국',
+    'TT': '대만', 'KS': '한국', 'KQ': '한국',
+    'LN': '유럽', 'GR': '유럽', 'GY': '유럽', 'FP': '유럽', 'NA': '유럽', 'SW': '유럽', 'SE': '유럽',
+    'IM': '유럽', 'SM': '유럽', 'DC': '유럽', 'SS': '유럽', 'FH': '유럽',
+}
+
+# ISIN 국가 코드 → 지역
+ISIN_REGIONS = {'US': '미국', 'CA': '캐나다', 'JP': '일본', 'KR': '한국', 'CN': '중국',
+                'HK': '홍콩', 'TW': '대만', 'KY': '중국'}
+
+
+def classify_region(code: str, name: str = None) -> str:
+    """종목코드 → 지역 (현금/선물 포함)"""
+    code = (code or '').strip()
+    if not code or name == '현금':
+        return '현금'
+    if 'Index' in code or 'FUT' in code:
+        return '선물'
+    if re.fullmatch(r'A?\d{6}', code):
+        return '한국'
+    match = re.search(r'\b([A-Z0-9]{2}) EQUITY$', code)
+    if match:
+        return EXCHANGE_REGIONS.get(match.group(1), '기타')
+    if len(code) == 12 and ' ' not in code:
+        return ISIN_REGIONS.get(code[:2], '기타')
+    return '기타'
+
+
+class AttributionEngine:
+    """ETF × 날짜 × 보유종목 성과 기여도 엔진"""
+
+    def __init__(self, data_dir: str = "./data", etf_names: Dict[str, str] = None):
+        """
+        Args:
+            data_dir: 데이터 루트 디렉토리 (idx_*/ 스냅샷 사용)
+            etf_names: idx → 상품명, None이면 ETF_NAMES
+        """
+        self.data_dir = data_dir
+        self.etf_names = etf_names or ETF_NAMES
+
+        self.rows = pd.MultiIndex.from_arrays([[], []], names=['idx', '날짜'])  # (ETF, 날짜) 행
+        self.holdings = pd.Index([], dtype=object)                           # 보유종목 열 (종목코드)
+        self.names = pd.Series(dtype=object)                                 # 종목코드 → 종목명
+        self.regions = pd.Series(dtype=object)                               # 종목코드 → 지역
+        self.weights = np.zeros((0, 0))        # 비중 (소수)
+        self.returns = np.zeros((0, 0))        # 종목 수익률 (직전 저장일 대비)
+        self.contribution = np.zeros((0, 0))   # 기여도
+        self.cumulative = np.zeros((0, 0))     # 누적 기여도 (ETF별 첫 날짜부터)
+        self.prev_row = np.zeros(0, dtype=np.int64)  # 같은 ETF의 직전 날짜 행 (-1: 첫 날짜)
+        self.fund_return = np.zeros(0)         # ETF 보유종목 수익률
+        self.fund_cumulative = np.zeros(0)     # ETF 누적 수익률
+
+    def load(self, days: int = None) -> int:
+        """
+        저장된 히스토리로 비중/가격 행렬을 만들고 기여도까지 계산
+
+        Args:
+            days: ETF별 최근 N개 저장일, None이면 전체
+
+        Returns:
+            (ETF, 날짜) 행 수
+        """
+        history = load_all_histories(self.data_dir, days=days)
+        if not history.empty:
+            history = history[history['idx'].astype(str).isin(self.etf_names.keys())]
+        if history.empty:
+            self.__init__(self.data_dir, self.etf_names)
+            return 0
+
+        # 현금 등 종목코드가 없는 행은 종목명을 키로 사용
+        codes = history['종목코드'].astype(str)
+        names = history['종목명'].astype(str)
+        keys = codes.where(codes != '', names)
+
+        row_keys = pd.MultiIndex.from_arrays([history['idx'].astype(str).to_numpy(), history['날짜'].to_numpy()])
+        row_index = pd.MultiIndex.from_tuples(
+            sorted(set(row_keys), key=lambda r: (int(r[0]) if r[0].isdigit() else r[0], r[1])),
+            names=['idx', '날짜'])
+        holding_index = pd.Index(sorted(keys.unique()))
+        r = row_index.get_indexer(row_keys)
+        c = holding_index.get_indexer(keys)
+
+        shape = (len(row_index), len(holding_index))
+        weights, values, quantities = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        np.add.at(weights, (r, c), history['비중'].to_numpy(dtype=np.float64) / 100)
+        np.add.at(values, (r, c), history['평가금액'].to_numpy(dtype=np.float64))
+        np.add.at(quantities, (r, c), history['수량'].to_numpy(dtype=np.float64))
+
+        self.rows = row_index
+        self.holdings = holding_index
+        unique = pd.DataFrame({'key': keys, 'code': codes, 'name': names}).drop_duplicates('key', keep='last')
+        unique = unique.set_index('key').reindex(holding_index)
+        self.names = unique['name']
+        self.regions = pd.Series([classify_region(code, name) for code, name in zip(unique['code'], unique['name'])],
+                                 index=holding_index)
+        self.weights = weights
+        self._compute(values, quantities)
+
+        print(f"[OK] 기여도 행렬: (ETF, 날짜) {shape[0]}행 × 보유종목 {shape[1]}개")
+        return shape[0]
+
+    def _compute(self, values: np.ndarray, quantities: np.ndarray):
+        """수익률 → 기여도 → ETF 수익률 → 누적 기여도"""
+        etf = self.rows.get_level_values('idx').to_numpy()
+        first = np.r_[True, etf[1:] != etf[:-1]]          # ETF별 첫 날짜 행
+        prev = np.arange(len(etf)) - 1
+        prev[first] = -1
+        group = np.cumsum(first) - 1                       # 행 → ETF 그룹 번호
+        starts = np.flatnonzero(first)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prices = np.where(quantities > 0, values / quantities, np.nan)
+            prev_prices = np.where(prev[:, None] >= 0, prices[prev], np.nan)
+            returns = prices / prev_prices - 1
+        returns = np.where(np.isfinite(returns), returns, 0.0)
+
+        prev_weights = np.where(prev[:, None] >= 0, self.weights[prev], 0.0)
+        contribution = prev_weights * returns
+        fund_return = contribution.sum(axis=1)
+
+        # ETF별 누적 성장률 (그룹 내 cumprod = 전체 cumsum(log) - 그룹 시작 오프셋)
+        log_growth = np.cumsum(np.log1p(fund_return))
+        log_growth -= np.r_[0.0, log_growth][starts][group]
+        growth = np.exp(log_growth)
+        growth_before = growth / (1 + fund_return)
+
+        linked = contribution * growth_before[:, None]
+        cumulative = np.cumsum(linked, axis=0)
+        offsets = np.vstack([np.zeros((1, linked.shape[1])), cumulative])[starts]
+        cumulative -= offsets[group]
+
+        self.prev_row = prev
+        self.returns = returns
+        self.contribution = contribution
+        self.cumulative = cumulative
+        self.fund_return = fund_return
+        self.fund_cumulative = growth - 1
+
+    def _rows_of(self, idx: str, start: str = None, end: str = None) -> np.ndarray:
+        etf = self.rows.get_level_values('idx')
+        dates = self.rows.get_level_values('날짜')
+        mask = etf == str(idx)
+        if start:
+            mask &= dates >= pd.Timestamp(start)
+        if end:
+            mask &= dates <= pd.Timestamp(end)
+        return np.flatnonzero(mask)
+
+    def fund_returns(self) -> pd.DataFrame:
+        """
+        ETF별 일간/누적 보유종목 수익률
+
+        Returns:
+            DataFrame: idx, ETF, 날짜, 수익률(%), 누적수익률(%)
+        """
+        return pd.DataFrame({
+            'idx': self.rows.get_level_values('idx'),
+            'ETF': [self.etf_names.get(i, i) for i in self.rows.get_level_values('idx')],
+            '날짜': self.rows.get_level_values('날짜'),
+            '수익률(%)': self.fund_return * 100,
+            '누적수익률(%)': self.fund_cumulative * 100,
+        })
+
+    def contributions(self, idx: str = None) -> pd.DataFrame:
+        """
+        보유종목별 일간 기여도 (보유 중이었던 칸만)
+
+        Args:
+            idx: ETF idx, None이면 전체
+
+        Returns:
+            DataFrame: idx, 날짜, 종목코드, 종목명, 지역, 비중_prev(%), 수익률(%), 기여도(%p), 누적기여도(%p)
+        """
+        rows = np.arange(len(self.rows)) if idx is None else self._rows_of(idx)
+        prev = self.prev_row[rows]
+        prev_weights = np.where(prev[:, None] >= 0, self.weights[prev], 0.0)
+        r, c = np.nonzero((prev_weights > 0) | (self.weights[rows] > 0))
+        rr = rows[r]
+        return pd.DataFrame({
+            'idx': self.rows.get_level_values('idx')[rr],
+            '날짜': self.rows.get_level_values('날짜')[rr],
+            '종목코드': self.holdings[c],
+            '종목명': self.names.to_numpy()[c],
+            '지역': self.regions.to_numpy()[c],
+            '비중_prev(%)': prev_weights[r, c] * 100,
+            '수익률(%)': self.returns[rr, c] * 100,
+            '기여도(%p)': self.contribution[rr, c] * 100,
+            '누적기여도(%p)': self.cumulative[rr, c] * 100,
+        })
+
+    def period_attribution(self, idx: str, start: str = None, end: str = None) -> pd.DataFrame:
+        """
+        기간 내 보유종목별 연결(linked) 기여도
+
+        기간 첫날의 수익률은 기간 밖(직전 저장일 대비)이므로 제외하고, 기간 안에서
+        다시 연결하므로 기여도 합계가 기간 수익률과 같다.
+
+        Returns:
+            DataFrame: 종목코드, 종목명, 지역, 기여도(%p), 평균비중(%) (기여도 내림차순)
+        """
+        rows = self._rows_of(idx, start, end)[1:]
+        if len(rows) == 0:
+            return pd.DataFrame(columns=['종목코드', '종목명', '지역', '기여도(%p)', '평균비중(%)'])
+        growth_before = np.r_[1.0, np.cumprod(1 + self.fund_return[rows])[:-1]]
+        linked = (self.contribution[rows] * growth_before[:, None]).sum(axis=0)
+        held = (self.weights[self.prev_row[rows]] > 0).any(axis=0) | (linked != 0)
+        result = pd.DataFrame({
+            '종목코드': self.holdings,
+            '종목명': self.names.to_numpy(),
+            '지역': self.regions.to_numpy(),
+            '기여도(%p)': linked * 100,
+            '평균비중(%)': self.weights[self.prev_row[rows]].mean(axis=0) * 100,
+        })[held]
+        return result.sort_values('기여도(%p)', ascending=False).reset_index(drop=True)
+
+    def rollup(self, mapping: Optional[Dict[str, str]] = None, idx: str = None) -> pd.DataFrame:
+        """
+        (ETF, 날짜)별 그룹 기여도 합계 (기여도 행렬 × 그룹 원-핫 행렬)
+
+        Args:
+            mapping: 종목코드 → 그룹 (예: 섹터), None이면 지역
+            idx: ETF idx, None이면 전체
+
+        Returns:
+            DataFrame: idx, 날짜, 그룹, 기여도(%p), 누적기여도(%p)
+        """
+        groups = self.regions if mapping is None else pd.Series(mapping).reindex(self.holdings).fillna('기타')
+        labels, uniques = pd.factorize(groups.to_numpy())
+        one_hot = np.zeros((len(self.holdings), len(uniques)))
+        one_hot[np.arange(len(self.holdings)), labels] = 1.0
+
+        rows = np.arange(len(self.rows)) if idx is None else self._rows_of(idx)
+        daily = self.contribution[rows] @ one_hot * 100
+        cumulative = self.cumulative[rows] @ one_hot * 100
+        n_groups = len(uniques)
+        return pd.DataFrame({
+            'idx': np.repeat(self.rows.get_level_values('idx')[rows], n_groups),
+            '날짜': np.repeat(self.rows.get_level_values('날짜')[rows], n_groups),
+            '그룹': np.tile(np.asarray(uniques, dtype=object), len(rows)),
+            '기여도(%p)': daily.ravel(),
+            '누적기여도(%p)': cumulative.ravel(),
+        })
+
+    def category_rollup(self) -> pd.DataFrame:
+        """ETF 분류(해외/국내)별 평균 누적 수익률"""
+        category = {idx: cat for cat, group in ETF_CATEGORIES.items() for idx in group.values()}
+        funds = self.fund_returns()
+        funds['분류'] = funds['idx'].map(category)
+        return funds.groupby(['분류', '날짜'], as_index=False)['누적수익률(%)'].mean()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="ETF 보유종목 성과 기여도")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--days", type=int, help="ETF별 최근 N개 저장일 (기본 전체)")
+    parser.add_argument("--idx", help="기간 기여도를 출력할 ETF idx")
+    args = parser.parse_args()
+
+    engine = AttributionEngine(args.data_dir)
+    started = time.perf_counter()
+    engine.load(days=args.days)
+    print(f"[STATS] 로드 + 계산 {time.perf_counter() - started:.2f}초")
+
+    funds = engine.fund_returns()
+    print(funds.groupby('ETF')['누적수익률(%)'].last().sort_values(ascending=False).to_string())
+    if args.idx:
+        print(engine.period_attribution(args.idx).head(15).to_string(index=False))
@@ -0,0 +1,122 @@
+"""
+Chart Data
+차트용 데이터 계층: 화면 폭에 맞춘 다운샘플링(LTTB)과 Plotly figure 생성
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+
+# 화면에 실제로 그려지는 차트 폭 (px) 기준 포인트 수
+MINI_CHART_POINTS = 160    # 시장 동향 미니 차트 (4열 배치, 약 320px)
+FULL_CHART_POINTS = 600    # 전체 폭 라인 차트
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 다운샘플링 인덱스
+
+    첫/마지막 포인트를 유지하고, 나머지는 버킷마다 이전 선택점과 다음 버킷
+    평균점이 이루는 삼각형 면적이 가장 큰 포인트 하나를 고른다.
+    고점/저점 같은 형태가 보존된다.
+
+    Args:
+        x: 정렬된 x 좌표 (숫자)
+        y: y 값
+        n_out: 출력 포인트 수
+
+    Returns:
+        선택된 포인트의 정수 인덱스 (오름차순)
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # 양 끝을 제외한 n-2개 포인트를 n_out-2개 버킷으로 분할
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # 다음 버킷의 평균점 (마지막 버킷이면 마지막 포인트)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        area = np.abs((x[prev] - avg_x) * (y[start:end] - y[prev])
+                      - (x[prev] - x[start:end]) * (avg_y - y[prev]))
+        prev = start + int(np.nanargmax(area)) if np.isfinite(area).any() else start
+        selected[i + 1] = prev
+
+    return selected
+
+
+def downsample_series(series: pd.Series, n_out: int) -> pd.Series:
+    """
+    시계열을 n_out 포인트로 LTTB 다운샘플링 (결측치 제거 후)
+
+    Args:
+        series: DatetimeIndex 또는 숫자 인덱스를 가진 Series
+        n_out: 출력 포인트 수 (보통 차트 픽셀 폭)
+    """
+    series = series.dropna()
+    if len(series) <= n_out:
+        return series
+
+    index = series.index
+    if isinstance(index, pd.DatetimeIndex):
+        x = index.asi8.astype(np.float64)
+    else:
+        x = np.arange(len(series), dtype=np.float64)
+    return series.iloc[lttb_indices(x, series.to_numpy(), n_out)]
+
+
+def build_pie_figure(df_today: pd.DataFrame):
+    """포트폴리오 비중 파이 차트 (1% 미만은 기타로 묶음)"""
+    chart_df = df_today[['종목명', '비중']].copy()
+    chart_df['종목명'] = chart_df['종목명'].astype(str).where(chart_df['비중'] >= 1.0, '기타')  # 1% 미만 기타 처리
+    chart_df = chart_df.groupby('종목명', as_index=False, sort=False)['비중'].sum()
+
+    return px.pie(chart_df, values="비중", names="종목명", hole=0.4, title="포트폴리오 비중",
+                  color_discrete_sequence=px.colors.qualitative.Set3)
+
+
+def build_treemap_figure(df_today: pd.DataFrame, etf_name: str):
+    """보유 종목 트리맵 (현금 제외, Size=비중), 데이터가 없으면 None"""
+    tree_df = df_today.loc[df_today['종목명'] != '현금', ['종목명', '비중']].copy()
+    if tree_df.empty:
+        return None
+    tree_df['종목명'] = tree_df['종목명'].astype(str)
+
+    # 색상을 위한 등락폭 데이터가 있다면 좋겠지만, 지금은 비중 크기로만 시각화
+    fig = px.treemap(tree_df, path=['종목명'], values='비중',
+                     color='비중', color_continuous_scale='Viridis',
+                     title=f"{etf_name} 보유 종목 맵 (Size=비중)")
+    fig.update_traces(textinfo="label+value+percent entry")
+    return fig
+
+
+def build_history_figure(history_df: pd.DataFrame, stock_name: str, n_out: int = FULL_CHART_POINTS):
+    """선택 종목의 비중 변화 추이 라인 차트 (화면 폭에 맞춰 다운샘플링)"""
+    stock_history = history_df.loc[history_df['종목명'] == stock_name, ['날짜', '비중']]
+    series = stock_history.set_index(pd.to_datetime(stock_history['날짜']))['비중'].sort_index()
+    series = downsample_series(series, n_out)
+    chart_df = pd.DataFrame({'날짜': series.index, '비중': series.to_numpy()})
+
+    # 포인트가 적을 때만 값 라벨 표시
+    show_text = len(chart_df) <= 60
+    chart = px.line(chart_df, x='날짜', y='비중', title=f"{stock_name} 비중 변화 추이",
+                    markers=True, text='비중' if show_text else None)
+    if show_text:
+        chart.update_traces(textposition="top center")
+    return chart
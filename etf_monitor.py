@@ -9,15 +9,49 @@ from datetime import datetime, timedelta
 import pandas as pd
 import json
 import os
-from typing import Dict, List, Tuple
+import hashlib
+import time
+from typing import Callable, Dict, List, Tuple
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
+from yfinance.exceptions import YFPricesMissingError, YFTzMissingError
 import pytz
 import urllib3
 
+from holdings_schema import apply_holdings_schema, concat_holdings, to_storage_frame
+from singleflight import SINGLE_FLIGHT, CallerTimeout
+from event_store import RebalancingEventStore
+from resilience import Deadline, TIMEFOLIO_HOST, YAHOO_HOST, get_breaker, get_limiter
+from snapshot_store import SnapshotStore, atomic_write
+
 # 보안 인증서 경고 무시
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# 타임폴리오 Active ETF 목록 (분류 → 상품명 → idx)
+ETF_CATEGORIES = {
+    "해외주식형 (10종)": {
+        "글로벌탑픽": "22", "글로벌바이오": "9", "우주테크&방산": "20",
+        "S&P500": "5", "나스닥100": "2", "글로벌AI": "6",
+        "차이나AI": "19", "미국배당다우존스": "18",
+        "미국나스닥100채권혼합50": "10", "글로벌소비트렌드": "8"
+    },
+    "국내주식형 (7종)": {
+        "K신재생에너지": "16", "K바이오": "13", "Korea플러스배당": "12",
+        "코스피": "11", "코리아밸류업": "15", "K이노베이션": "17", "K컬처": "1"
+    }
+}
+
+# idx → 상품명
+ETF_NAMES = {idx: name for group in ETF_CATEGORIES.values() for name, idx in group.items()}
+
+# 해시 인덱스(hashes.json) 읽기-수정-쓰기 보호용 잠금
+_HASH_INDEX_LOCK = threading.Lock()
+
+# yfinance가 한 번이라도 가격을 돌려준 티커 (이후 데이터가 없으면 종목 문제가 아니라 소스 장애로 본다)
+_RESOLVED_TICKERS = set()
+
 
 class ActiveETFMonitor:
     """Active ETF 포트폴리오 모니터링 클래스"""
@@ -25,13 +59,25 @@ class ActiveETFMonitor:
     BASE_URL = "https://timefolioetf.co.kr/m11_view.php"
     KST = pytz.timezone('Asia/Seoul')  # 한국 표준시
 
+    # 브라우저 헤더
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Referer': 'https://timefolioetf.co.kr/'
+    }
+
     # ISIN 코드 → yfinance 티커 매핑 테이블
     ISIN_TO_TICKER = {
         'CA13321L1085': 'CCJ',  # Cameco Corp
         # 필요시 추가 매핑 추가
     }
 
-    def __init__(self, data_dir: str = "./data", url: str = None, etf_name: str = None):
+    def __init__(self, data_dir: str = "./data", url: str = None, etf_name: str = None,
+                 storage: str = None):
         """
         Args:
             data_dir: 데이터 저장 디렉토리
@@ -39,6 +85,8 @@ class ActiveETFMonitor:
                  None이면 기본값 (idx=5) 사용
             etf_name: ETF 이름 (예: "Active ETF", "Value ETF")
                       None이면 기본값 사용
+            storage: 스냅샷 저장 모드 'full' 또는 'delta' (키프레임 + 델타)
+                     None이면 ETF_SNAPSHOT_STORAGE 환경변수 (기본 'full')
         """
         # URL에서 idx 추출 (먼저 수행)
         if url:
@@ -52,25 +100,33 @@ class ActiveETFMonitor:
 
         # ETF별로 데이터 디렉토리 분리
         # 예: ./data/idx_5/, ./data/idx_2/
+        self.base_dir = data_dir
         self.data_dir = os.path.join(data_dir, f"idx_{self.idx}")
         os.makedirs(self.data_dir, exist_ok=True)
+        self.snapshots = SnapshotStore(self.data_dir, storage)
 
         # ETF 이름 설정
         self.etf_name = etf_name if etf_name else 'Active ETF'
 
-    def get_portfolio_data(self, date: str = None) -> pd.DataFrame:
+        # 폴링용 HTTP 세션 (keep-alive) 및 날짜별 조건부 요청 검증자
+        self._session = requests.Session()
+        self._validators = {}
+        # 저장했지만 on_change가 끝나지 않은 날짜 (다음 폴링에서 다시 처리)
+        self._pending_changes = set()
+
+    def _fetch_page(self, date: str, conditional: bool = False):
         """
-        특정 날짜의 포트폴리오 데이터를 크롤링
+        PDF 페이지 HTML 요청
 
         Args:
-            date: 조회할 날짜 (YYYY-MM-DD), None이면 오늘 날짜
+            date: 조회할 날짜 (YYYY-MM-DD)
+            conditional: True면 직전 응답의 ETag/Last-Modified로 조건부 요청
 
         Returns:
-            DataFrame: 종목코드, 종목명, 수량, 평가금액, 비중
+            (HTML 문자열, 응답 검증자 {'ETag', 'Last-Modified'}),
+            서버가 304(변경 없음)를 반환하면 (None, None).
+            검증자는 호출자가 파싱/저장에 성공한 뒤 _validators에 반영한다.
         """
-        if date is None:
-            date = datetime.now(self.KST).strftime("%Y-%m-%d")
-
         # URL 파라미터 구성
         params = {
             'idx': self.idx,
@@ -78,56 +134,79 @@ class ActiveETFMonitor:
             'pdfDate': date
         }
 
-        try:
-            # 브라우저 헤더 추가
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Referer': 'https://timefolioetf.co.kr/'
-            }
-
-            # HTTP 요청 (SSL 검증 비활성화)
-            response = requests.get(self.BASE_URL, params=params, headers=headers, timeout=30, verify=False)
+        # 브라우저 헤더 추가
+        headers = dict(self.HEADERS)
+        validators = self._validators.get(date, {})
+        if conditional:
+            if validators.get('ETag'):
+                headers['If-None-Match'] = validators['ETag']
+            if validators.get('Last-Modified'):
+                headers['If-Modified-Since'] = validators['Last-Modified']
+
+        # HTTP 요청 (SSL 검증 비활성화, 호스트별 적응형 동시성 제한)
+        with get_limiter(TIMEFOLIO_HOST).slot():
+            response = self._session.get(self.BASE_URL, params=params, headers=headers, timeout=30, verify=False)
             response.raise_for_status()
-            response.encoding = 'utf-8'
-
-            # HTML 파싱
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # 구성종목 테이블 찾기
-            table = soup.find('table', class_='table3')
-            if not table:
-                raise ValueError(f"테이블을 찾을 수 없습니다. (날짜: {date})")
-
-            # 데이터 추출 (display:none인 행도 모두 포함)
-            rows = table.find('tbody').find_all('tr')
-            data = []
-
-            for row in rows:
-                cols = row.find_all('td')
-                if len(cols) == 5:
-                    # 숫자 파싱 (쉼표 제거)
-                    quantity_text = cols[2].get_text(strip=True).replace(',', '')
-                    value_text = cols[3].get_text(strip=True).replace(',', '')
-                    weight_text = cols[4].get_text(strip=True)
-
-                    data.append({
-                        '종목코드': cols[0].get_text(strip=True),
-                        '종목명': cols[1].get_text(strip=True),
-                        '수량': int(quantity_text) if quantity_text else 0,
-                        '평가금액': int(value_text) if value_text else 0,
-                        '비중': float(weight_text) if weight_text else 0.0
-                    })
-
-            df = pd.DataFrame(data)
-            df['날짜'] = date
-
-            print(f"[OK] {date} 데이터 수집 완료: {len(df)}개 종목")
-            return df
+        if response.status_code == 304:
+            return None, None
+        response.encoding = 'utf-8'
+
+        # 다음 조건부 요청을 위한 검증자 (저장은 호출자가 처리 성공 후)
+        return response.text, {
+            'ETag': response.headers.get('ETag'),
+            'Last-Modified': response.headers.get('Last-Modified'),
+        }
+
+    def _parse_portfolio(self, html: str, date: str) -> pd.DataFrame:
+        """PDF 페이지 HTML에서 구성종목 테이블 파싱"""
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # 구성종목 테이블 찾기
+        table = soup.find('table', class_='table3')
+        if not table:
+            raise ValueError(f"테이블을 찾을 수 없습니다. (날짜: {date})")
+
+        # 데이터 추출 (display:none인 행도 모두 포함)
+        rows = table.find('tbody').find_all('tr')
+        data = []
+
+        for row in rows:
+            cols = row.find_all('td')
+            if len(cols) == 5:
+                # 숫자 파싱 (쉼표 제거)
+                quantity_text = cols[2].get_text(strip=True).replace(',', '')
+                value_text = cols[3].get_text(strip=True).replace(',', '')
+                weight_text = cols[4].get_text(strip=True)
+
+                data.append({
+                    '종목코드': cols[0].get_text(strip=True),
+                    '종목명': cols[1].get_text(strip=True),
+                    '수량': int(quantity_text) if quantity_text else 0,
+                    '평가금액': int(value_text) if value_text else 0,
+                    '비중': float(weight_text) if weight_text else 0.0
+                })
+
+        df = pd.DataFrame(data, columns=['종목코드', '종목명', '수량', '평가금액', '비중'])
+        df['날짜'] = date
+        return apply_holdings_schema(df)
+
+    def get_portfolio_data(self, date: str = None) -> pd.DataFrame:
+        """
+        특정 날짜의 포트폴리오 데이터를 크롤링
+
+        Args:
+            date: 조회할 날짜 (YYYY-MM-DD), None이면 오늘 날짜
+
+        Returns:
+            DataFrame: 종목코드, 종목명, 수량, 평가금액, 비중
+        """
+        if date is None:
+            date = datetime.now(self.KST).strftime("%Y-%m-%d")
+
+        try:
+            # 같은 ETF/날짜를 동시에 요청한 세션들은 한 번의 크롤링 결과를 공유
+            df = SINGLE_FLIGHT.do(('scrape', self.idx, date), self._scrape, date)
+            return df.copy()
 
         except requests.RequestException as e:
             print(f"[ERR] 네트워크 오류: {e}")
@@ -136,55 +215,181 @@ class ActiveETFMonitor:
             print(f"[ERR] 데이터 수집 오류: {e}")
             raise
 
-    def save_data(self, df: pd.DataFrame, date: str):
-        """데이터를 JSON 파일로 저장"""
-        filename = os.path.join(self.data_dir, f"portfolio_{date}.json")
-        df.to_json(filename, orient='records', force_ascii=False, indent=2)
-        print(f"[OK] 데이터 저장 완료: {filename}")
+    def _scrape(self, date: str) -> pd.DataFrame:
+        """페이지 요청 + 파싱 (single-flight 단위)"""
+        html, _ = self._fetch_page(date)
+        df = self._parse_portfolio(html, date)
+        print(f"[OK] {date} 데이터 수집 완료: {len(df)}개 종목")
+        return df
 
-    def load_data(self, date: str) -> pd.DataFrame:
-        """저장된 데이터 로드"""
-        filename = os.path.join(self.data_dir, f"portfolio_{date}.json")
+    @staticmethod
+    def compute_content_hash(df: pd.DataFrame) -> str:
+        """
+        스냅샷의 정규화된 내용 해시 (SHA-256)
+
+        행 순서, 날짜 컬럼, 문자열 앞뒤 공백, 숫자 표기 차이는 무시하므로
+        같은 구성종목이면 다시 수집해도 같은 해시가 나온다.
+        """
+        rows = []
+        for code, name, qty, value, weight in df[['종목코드', '종목명', '수량', '평가금액', '비중']].itertuples(index=False):
+            rows.append((str(code).strip(), str(name).strip(),
+                         int(qty), int(value), f"{float(weight):.4f}"))
+        rows.sort()
+        payload = "\n".join("\t".join(map(str, r)) for r in rows)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _load_hashes(self) -> Dict[str, str]:
+        """날짜별 스냅샷 해시 인덱스 로드"""
+        filename = os.path.join(self.data_dir, "hashes.json")
         if os.path.exists(filename):
             try:
-                return pd.read_json(filename)
+                with open(filename, encoding='utf-8') as f:
+                    return json.load(f)
             except ValueError:
-                return None
-        return None
+                return {}
+        return {}
+
+    def get_content_hash(self, date: str) -> str:
+        """저장된 스냅샷의 내용 해시 (없으면 None)"""
+        return self._load_hashes().get(date)
+
+    def get_history_hash(self, history_df: pd.DataFrame) -> str:
+        """
+        히스토리 구간 전체의 내용 해시 (구간 내 모든 저장일의 스냅샷 해시를 묶음)
+
+        해시 인덱스에 없는 날짜는 해당 날짜 행으로 직접 계산하므로,
+        구간 안의 어느 날짜가 재게시되거나 구간이 밀려도 값이 바뀐다.
+
+        Args:
+            history_df: load_history 결과
+
+        Returns:
+            SHA-256 hex
+        """
+        hashes = self._load_hashes()
+        parts = []
+        for date, rows in history_df.groupby('날짜', sort=True):
+            parts.append(f"{date}\t{hashes.get(str(date)) or self.compute_content_hash(rows)}")
+        return hashlib.sha256("\n".join(parts).encode('utf-8')).hexdigest()
+
+    def save_data(self, df: pd.DataFrame, date: str) -> bool:
+        """
+        데이터를 JSON 파일로 저장
+
+        내용 해시가 이미 저장된 스냅샷과 같으면 파일을 다시 쓰지 않는다.
+
+        Returns:
+            내용이 바뀌어 새로 저장했으면 True
+        """
+        content_hash = self.compute_content_hash(df)
+        # 같은 내용을 동시에 저장하려는 세션들은 한 번의 쓰기를 공유
+        return SINGLE_FLIGHT.do(('save', self.data_dir, date, content_hash),
+                                self._write_snapshot, df, date, content_hash)
+
+    def _write_snapshot(self, df: pd.DataFrame, date: str, content_hash: str) -> bool:
+        """스냅샷 파일과 해시 인덱스를 원자적으로 기록"""
+        with _HASH_INDEX_LOCK:
+            hashes = self._load_hashes()
+            if hashes.get(date) == content_hash and self.snapshots.exists(date):
+                print(f"[INFO] 변경 없음, 저장 생략: {self.data_dir} {date}")
+                return False
+
+            storage_df = to_storage_frame(df)
+            storage_df['날짜'] = date
+            kind = self.snapshots.write(storage_df)
+            hashes[date] = content_hash
+
+            def write_hashes(path):
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(hashes, f, indent=2, sort_keys=True)
+            atomic_write(os.path.join(self.data_dir, "hashes.json"), write_hashes)
+
+        print(f"[OK] 데이터 저장 완료: {self.data_dir} {date} ({kind})")
+        return True
+
+    def poll_portfolio(self, interval: int = 300, on_change: Callable = None,
+                       date: str = None, max_polls: int = None):
+        """
+        장중 PDF 재게시 감지를 위한 폴링
+
+        interval초마다 조건부 요청으로 페이지를 다시 받고, 서버가 304를 주거나
+        내용 해시가 그대로면 아무 것도 하지 않는다. 해시가 바뀐 경우에만
+        저장 후 on_change(df, date)를 호출한다 (수익률 수집, 분석, 알림 등).
+        on_change가 실패하면 검증자를 남기지 않고 다음 폴링에서 다시 호출한다.
+
+        Args:
+            interval: 폴링 간격 (초)
+            on_change: 변경 시 호출할 콜백 (df, date)
+            date: 감시할 날짜 (YYYY-MM-DD), None이면 매 폴링마다 오늘 날짜
+            max_polls: 최대 폴링 횟수, None이면 무한
+        """
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            if polls > 0:
+                time.sleep(interval)
+            polls += 1
+            target = date or datetime.now(self.KST).strftime("%Y-%m-%d")
+
+            try:
+                html, validators = self._fetch_page(target, conditional=True)
+                if html is None:
+                    print(f"[INFO] {target} PDF 변경 없음 (304)")
+                    continue
+
+                df = self._parse_portfolio(html, target)
+                if len(df) == 0:
+                    # 빈 테이블은 검증자를 남기지 않아 다음 폴링에서 다시 받음
+                    print(f"[INFO] {target} PDF 구성종목 없음")
+                    continue
+                changed = self.compute_content_hash(df) != self.get_content_hash(target)
+                if not changed and target not in self._pending_changes:
+                    self._validators[target] = validators
+                    print(f"[INFO] {target} PDF 변경 없음")
+                    continue
+
+                if changed:
+                    print(f"[OK] {target} PDF 변경 감지: {len(df)}개 종목")
+                    self.save_data(df, target)
+                else:
+                    print(f"[INFO] {target} 이전 변경 처리 재시도")
+                # on_change까지 끝난 응답만 조건부 요청 기준으로 사용 (실패하면 다음 폴링에서 재시도)
+                self._pending_changes.add(target)
+                if on_change:
+                    on_change(df, target)
+                self._pending_changes.discard(target)
+                self._validators[target] = validators
+            except Exception as e:
+                print(f"[WARN] 폴링 실패 ({target}): {type(e).__name__}: {e}")
+
+    def load_data(self, date: str) -> pd.DataFrame:
+        """저장된 데이터 로드 (키프레임 또는 델타 체인 복원)"""
+        try:
+            df = self.snapshots.load(date)
+        except (OSError, ValueError, KeyError, IndexError):
+            return None
+        return apply_holdings_schema(df) if df is not None else None
 
     def load_history(self, days: int = 30) -> pd.DataFrame:
         """
         최근 N일간의 모든 포트폴리오 데이터를 로드하여 병합합니다.
+
+        Args:
+            days: 최근 N개 저장일, None이면 전체
         
         Returns:
             DataFrame: [날짜, 종목코드, 종목명, 비중, 수량, 평가금액] 통합 테이블
         """
-        all_dfs = []
-        
-        # 데이터 디렉토리 내의 모든 JSON 파일 검색
-        if not os.path.exists(self.data_dir):
-            return pd.DataFrame()
-            
-        files = [f for f in os.listdir(self.data_dir) if f.startswith('portfolio_') and f.endswith('.json')]
-        files.sort(reverse=True) # 최신순
-        
-        # 최근 N개 파일만 (또는 날짜 기준으로 N일 필터링도 가능하지만, 파일 개수로 제한하는게 단순함)
-        target_files = files[:days]
-        
-        for file in target_files:
-            date_str = file.replace('portfolio_', '').replace('.json', '')
-            file_path = os.path.join(self.data_dir, file)
-            try:
-                df = pd.read_json(file_path)
-                df['날짜'] = date_str
-                all_dfs.append(df)
-            except Exception:
-                continue
-                
-        if all_dfs:
-            return pd.concat(all_dfs, ignore_index=True)
-        else:
+        # 최근 N개 저장일만 (또는 날짜 기준으로 N일 필터링도 가능하지만, 저장일 개수로 제한하는게 단순함)
+        dates = self.snapshots.dates()
+        if days is not None:
+            dates = dates[max(len(dates) - days, 0):]
+
+        # 델타 체인은 오름차순으로 한 번씩만 적용하고, 결과는 최신순으로 정렬
+        table = self.snapshots.load_table(dates)
+        if table.empty:
             return pd.DataFrame()
+        table = table.sort_values('날짜', ascending=False, kind='stable')
+        return apply_holdings_schema(table.reset_index(drop=True))
 
     def get_previous_business_day(self, date: str, lookback_days: int = 10) -> str:
         """
@@ -218,7 +423,8 @@ class ActiveETFMonitor:
 
         raise ValueError(f"{date}로부터 {lookback_days}일 이내에 이전 영업일을 찾을 수 없습니다.")
 
-    def _ticker_from_code(self, code: str) -> str:
+    @classmethod
+    def _ticker_from_code(cls, code: str) -> str:
         """
         종목코드를 yfinance 티커로 변환
 
@@ -235,8 +441,8 @@ class ActiveETFMonitor:
         # 예: CA13321L1085 (ISIN)
         # 제외: "PG US EQUITY" (12자이지만 공백 있음)
         if len(code) == 12 and ' ' not in code:
-            if code in self.ISIN_TO_TICKER:
-                return self.ISIN_TO_TICKER[code]
+            if code in cls.ISIN_TO_TICKER:
+                return cls.ISIN_TO_TICKER[code]
             else:
                 # 매핑되지 않은 ISIN 코드
                 return None
@@ -268,105 +474,159 @@ class ActiveETFMonitor:
 
         return ticker if ticker else None
 
+    @staticmethod
+    def _fetch_price_history(ticker_symbol: str, timeout: float = 10, budget: Deadline = None) -> pd.DataFrame:
+        """
+        yfinance 최근 5일 가격 이력
+
+        여러 ETF/세션이 같은 티커를 동시에 조회하면 한 번의 호출 결과를 공유한다.
+        budget이 주어지면 다른 호출자의 같은 조회나 리미터 슬롯을 기다리는 것도 마감 안에서만 하고
+        (넘기면 CallerTimeout), 요청 타임아웃은 슬롯을 얻은 시점의 남은 시간으로 줄인다.
+        yfinance 기본 설정은 전송 오류/5xx도 빈 결과로 숨기므로 이 호출은 예외로 받는다.
+        """
+        def fetch():
+            with get_limiter(YAHOO_HOST).slot(timeout=budget.remaining() if budget else None):
+                request_timeout = timeout if budget is None else max(1.0, min(timeout, budget.remaining()))
+                hist = yf.Ticker(ticker_symbol).history(period="5d", timeout=request_timeout, raise_errors=True)
+            if len(hist) > 0:
+                _RESOLVED_TICKERS.add(ticker_symbol)
+            return hist
+
+        return SINGLE_FLIGHT.do(('price', ticker_symbol), fetch,
+                                wait_timeout=budget.remaining() if budget else None)
+
+    @staticmethod
+    def _pdf_implied_return(row: pd.Series, df_today: pd.DataFrame):
+        """
+        PDF 가격(평가금액/수량)으로 계산한 수익률
+
+        Returns:
+            수익률, 계산할 수 없으면 None (금일 미보유 또는 수량 0)
+        """
+        today_row = df_today[df_today['종목코드'] == row['종목코드']]
+        if len(today_row) > 0 and row['수량'] > 0 and today_row.iloc[0]['수량'] > 0:
+            prev_price = row['평가금액'] / row['수량']
+            today_price = today_row.iloc[0]['평가금액'] / today_row.iloc[0]['수량']
+            return (today_price / prev_price - 1) if prev_price > 0 else 0.0
+        return None
+
     def get_market_returns(self, df_prev: pd.DataFrame, df_today: pd.DataFrame,
-                          date_prev: str, date_today: str) -> Dict[str, float]:
+                          date_prev: str, date_today: str, deadline: float = 60.0) -> Tuple[Dict[str, float], Dict[str, str]]:
         """
         yfinance로 각 종목의 시장 수익률 가져오기
 
+        수익률 단계 전체는 deadline초 안에 끝난다. 마감이 지나거나 yfinance 서킷
+        브레이커가 열리면(최근 오류율이 임계치 초과) 남은 종목은 yfinance를 호출하지
+        않고 바로 PDF 가격으로 계산한다.
+        종목별 조회는 병렬로 실행하며, 실제 동시 요청 수는 yfinance 호스트의 적응형 리미터가 정한다.
+
         Args:
             df_prev: 전일 포트폴리오
             df_today: 금일 포트폴리오 (PDF fallback용)
             date_prev: 전일 날짜
             date_today: 금일 날짜
+            deadline: 수익률 단계 전체 허용 시간 (초), None이면 무제한
 
         Returns:
-            {종목코드: 수익률} 딕셔너리
+            ({종목코드: 수익률}, {종목코드: 소스}) - 소스는 'yfinance', 'pdf', 'zero', 'cash'
         """
         market_returns = {}
-        print(f"[STATS] yfinance로 시장 수익률 수집 중...")
+        sources = {}
+        budget = Deadline(deadline)
+        breaker = get_breaker('yfinance')
+        print(f"[STATS] yfinance로 시장 수익률 수집 중... (마감 {deadline}초, 브레이커 {breaker.state})")
+
+        def fallback(row, label, reason):
+            # PDF 데이터로 fallback, 불가하면 0%
+            try:
+                pdf_return = self._pdf_implied_return(row, df_today)
+            except Exception as e:
+                pdf_return = None
+                reason = f"{reason}, PDF fallback 실패 - {type(e).__name__}: {str(e)[:50]}"
+            if pdf_return is not None:
+                market_returns[row['종목코드']] = pdf_return
+                sources[row['종목코드']] = 'pdf'
+                print(f"[INFO]  {label} ({row['종목명']}): {reason}, PDF 가격 사용 ({pdf_return*100:.2f}%)")
+            else:
+                market_returns[row['종목코드']] = 0.0
+                sources[row['종목코드']] = 'zero'
+                print(f"[WARN]  {label} ({row['종목명']}): {reason}, 0% 사용")
 
+        # 1) 현금/미지원 종목은 바로 처리하고 yfinance 조회 대상만 모음
+        targets = []
         for _, row in df_prev.iterrows():
             code = row['종목코드']
-            stock_name = row['종목명']
 
             # 현금은 0% 처리
-            if stock_name == '현금' or code == '':
+            if row['종목명'] == '현금' or code == '':
                 market_returns[code] = 0.0
+                sources[code] = 'cash'
                 continue
 
             ticker_symbol = self._ticker_from_code(code)
 
             # 티커 변환 실패 (ISIN, 지원안하는 선물 등)
             if not ticker_symbol:
-                # PDF 데이터로 fallback
-                try:
-                    today_row = df_today[df_today['종목코드'] == code]
-                    if len(today_row) > 0 and row['수량'] > 0 and today_row.iloc[0]['수량'] > 0:
-                        prev_price = row['평가금액'] / row['수량']
-                        today_price = today_row.iloc[0]['평가금액'] / today_row.iloc[0]['수량']
-                        pdf_return = (today_price / prev_price - 1) if prev_price > 0 else 0
-                        market_returns[code] = pdf_return
-                        print(f"[INFO]  {code[:20]} ({stock_name}): yfinance 미지원, PDF 가격 사용 ({pdf_return*100:.2f}%)")
-                    else:
-                        market_returns[code] = 0.0
-                        print(f"[INFO]  {code[:20]} ({stock_name}): yfinance 미지원, 0% 사용")
-                except Exception as e:
-                    market_returns[code] = 0.0
-                    print(f"[WARN]  {code[:20]} ({stock_name}): PDF fallback 실패 - {type(e).__name__}: {str(e)[:50]}")
+                fallback(row, code[:20], "yfinance 미지원")
                 continue
-
+            targets.append((row, ticker_symbol))
+
+        def fetch(ticker_symbol):
+            # 마감 초과 또는 브레이커 open이면 yfinance 호출 생략
+            if budget.expired():
+                return None, "수익률 단계 마감 초과"
+            if not breaker.allow():
+                return None, "yfinance 서킷 브레이커 open"
             try:
-                # yfinance로 데이터 가져오기
                 # 미국 장 기준: 항상 최신 2개 영업일 (D-1, D-2) 사용
-                ticker = yf.Ticker(ticker_symbol)
-                hist = ticker.history(period="5d")  # 최근 5일 데이터 (영업일 2일 확보)
-
-                if len(hist) < 2:
-                    # 데이터 부족 - PDF 데이터로 fallback
-                    today_row = df_today[df_today['종목코드'] == code]
-                    if len(today_row) > 0 and row['수량'] > 0 and today_row.iloc[0]['수량'] > 0:
-                        prev_price = row['평가금액'] / row['수량']
-                        today_price = today_row.iloc[0]['평가금액'] / today_row.iloc[0]['수량']
-                        pdf_return = (today_price / prev_price - 1) if prev_price > 0 else 0
-                        market_returns[code] = pdf_return
-                        print(f"[INFO]  {ticker_symbol} ({stock_name}): yfinance 데이터 부족, PDF 가격 사용 ({pdf_return*100:.2f}%)")
-                    else:
-                        market_returns[code] = 0.0
-                        print(f"[WARN]  {ticker_symbol} ({stock_name}): yfinance 데이터 부족, 0% 사용")
-                    continue
+                hist = self._fetch_price_history(ticker_symbol, timeout=10.0, budget=budget)
+            except CallerTimeout:
+                # 슬롯/병합 대기 중 마감 - 이 호출자는 yfinance를 호출하지 않았으므로 브레이커와 무관
+                return None, "수익률 단계 마감 초과"
+            except (YFPricesMissingError, YFTzMissingError) as e:
+                # 가격 없음: Yahoo 상태 코드(5xx 등)가 붙었거나 전에 가격을 받은 티커면 소스 장애,
+                # 처음 보는 티커면 상장폐지/미해석 티커로 보고 브레이커에는 중립
+                if 'status_code' in str(e) or ticker_symbol in _RESOLVED_TICKERS:
+                    breaker.record_failure()
+                else:
+                    breaker.record_neutral()
+                return None, f"yfinance 데이터 없음 ({type(e).__name__}: {str(e)[:100]})"
+            except Exception as e:
+                breaker.record_failure()
+                return None, f"yfinance 오류 ({type(e).__name__}: {str(e)[:100]})"
+            if len(hist) < 2:
+                # 응답은 정상이지만 봉이 부족 (신규 상장 등) - PDF 데이터로 fallback, 브레이커에는 중립
+                breaker.record_neutral()
+                return None, "yfinance 데이터 부족"
+            breaker.record_success()
+            return hist, None
+
+        # 2) 병렬 조회 (실제 동시 요청 수는 yfinance 호스트 리미터가 지연/오류에 따라 조절)
+        limiter = get_limiter(YAHOO_HOST)
+        with ThreadPoolExecutor(max_workers=max(1, min(limiter.max_limit, len(targets))),
+                                thread_name_prefix="market-returns") as executor:
+            results = list(executor.map(fetch, [ticker for _, ticker in targets]))
+
+        # 3) 원래 순서대로 수익률 계산
+        for (row, ticker_symbol), (hist, reason) in zip(targets, results):
+            if hist is None:
+                fallback(row, ticker_symbol, reason)
+                continue
 
-                # 최신 2개 영업일 사용 (D-1, D-2)
-                prev_close = hist.iloc[-2]['Close']   # D-2 (전전일 종가)
-                today_close = hist.iloc[-1]['Close']  # D-1 (전일 종가)
-                prev_date_used = hist.iloc[-2].name.strftime('%Y-%m-%d')
-                today_date_used = hist.iloc[-1].name.strftime('%Y-%m-%d')
+            prev_close = hist.iloc[-2]['Close']   # D-2 (전전일 종가)
+            today_close = hist.iloc[-1]['Close']  # D-1 (전일 종가)
+            prev_date_used = hist.iloc[-2].name.strftime('%Y-%m-%d')
+            today_date_used = hist.iloc[-1].name.strftime('%Y-%m-%d')
 
-                # 수익률 계산
-                market_return = (today_close / prev_close - 1) if prev_close > 0 else 0.0
-                market_returns[code] = market_return
-                print(f"[OK] {ticker_symbol} ({stock_name}): {market_return*100:+.2f}% ({prev_date_used} → {today_date_used})")
+            # 수익률 계산
+            market_return = (today_close / prev_close - 1) if prev_close > 0 else 0.0
+            market_returns[row['종목코드']] = market_return
+            sources[row['종목코드']] = 'yfinance'
+            print(f"[OK] {ticker_symbol} ({row['종목명']}): {market_return*100:+.2f}% ({prev_date_used} → {today_date_used})")
 
-            except Exception as e:
-                # 오류 발생 시 PDF 데이터로 fallback
-                error_type = type(e).__name__
-                error_msg = str(e)[:100]
-
-                try:
-                    today_row = df_today[df_today['종목코드'] == code]
-                    if len(today_row) > 0 and row['수량'] > 0 and today_row.iloc[0]['수량'] > 0:
-                        prev_price = row['평가금액'] / row['수량']
-                        today_price = today_row.iloc[0]['평가금액'] / today_row.iloc[0]['수량']
-                        pdf_return = (today_price / prev_price - 1) if prev_price > 0 else 0
-                        market_returns[code] = pdf_return
-                        print(f"[WARN]  {ticker_symbol} ({stock_name}): yfinance 오류 ({error_type}: {error_msg}), PDF 가격 사용 ({pdf_return*100:.2f}%)")
-                    else:
-                        market_returns[code] = 0.0
-                        print(f"[WARN]  {ticker_symbol} ({stock_name}): yfinance 오류 ({error_type}: {error_msg}), 0% 사용")
-                except:
-                    market_returns[code] = 0.0
-                    print(f"[WARN]  {ticker_symbol} ({stock_name}): yfinance 및 PDF fallback 실패 ({error_type}), 0% 사용")
-
-        return market_returns
+        counts = pd.Series(sources, dtype=object).value_counts().to_dict()
+        print(f"[STATS] 수익률 소스: {counts}, {budget.elapsed():.1f}초 (브레이커 {breaker.state})")
+        return market_returns, sources
 
     def analyze_rebalancing(self, df_today: pd.DataFrame, df_prev: pd.DataFrame,
                            date_prev: str = None, date_today: str = None) -> Dict:
@@ -376,6 +636,10 @@ class ActiveETFMonitor:
         시장 가격 변동만으로 설명되지 않는 비중 변화를 리밸런싱으로 감지
         AUM 변화와 가격 변동 효과를 모두 제거
 
+        같은 ETF/날짜/스냅샷 내용에 대한 동시 분석 요청은 한 번만 실행되고
+        결과 딕셔너리를 공유한다 (호출자는 결과를 수정하지 않아야 함).
+        날짜가 주어지면 감지된 이벤트를 이벤트 저장소에 기록한다.
+
         Args:
             df_today: 금일 포트폴리오
             df_prev: 전일 포트폴리오
@@ -383,6 +647,45 @@ class ActiveETFMonitor:
         Returns:
             분석 결과 딕셔너리
         """
+        key = ('analysis', self.idx, date_prev, date_today,
+               self.compute_content_hash(df_prev), self.compute_content_hash(df_today))
+
+        def run():
+            analysis = self._analyze_rebalancing(df_today, df_prev, date_prev, date_today)
+            if date_today:
+                try:
+                    self.record_events(analysis, date_prev, date_today)
+                except Exception as e:
+                    print(f"[WARN] 이벤트 저장 실패: {type(e).__name__}: {e}")
+            return analysis
+
+        return SINGLE_FLIGHT.do(key, run)
+
+    def record_events(self, analysis: Dict, date_prev: str, date_today: str,
+                      store: RebalancingEventStore = None) -> int:
+        """
+        분석 결과의 편입/편출/확대/축소 이벤트를 이벤트 저장소에 기록
+
+        Args:
+            analysis: analyze_rebalancing 결과
+            date_prev: 비교일
+            date_today: 기준일
+            store: 이벤트 저장소, None이면 {data_dir}/events.db
+
+        Returns:
+            기록된 이벤트 수
+        """
+        store = store or RebalancingEventStore(os.path.join(self.base_dir, "events.db"))
+        codes = {str(s['종목코드']) for key in ('new_stocks', 'removed_stocks', 'increased_stocks', 'decreased_stocks')
+                 for s in analysis[key]}
+        tickers = {code: self._ticker_from_code(code) for code in codes if code}
+        count = store.append(analysis, self.idx, self.etf_name, date_today, date_prev, tickers)
+        print(f"[OK] 리밸런싱 이벤트 {count}건 기록 ({date_today})")
+        return count
+
+    def _analyze_rebalancing(self, df_today: pd.DataFrame, df_prev: pd.DataFrame,
+                             date_prev: str = None, date_today: str = None) -> Dict:
+        """analyze_rebalancing 본체 (single-flight 단위)"""
         # 종목코드를 기준으로 병합 (양쪽 모두 종목명 포함)
         merged = pd.merge(
             df_today[['종목코드', '종목명', '수량', '평가금액', '비중']],
@@ -392,6 +695,10 @@ class ActiveETFMonitor:
             suffixes=('_today', '_prev')
         )
 
+        # 분석용 작업 테이블은 일반 문자열 컬럼으로 다룬다 (category 해제)
+        for col in ['종목코드', '종목명_today', '종목명_prev']:
+            merged[col] = merged[col].astype(object)
+
         # 종목명 통합 (금일 우선, 없으면 전일 사용)
         merged['종목명'] = merged['종목명_today'].fillna(merged['종목명_prev'])
 
@@ -401,7 +708,7 @@ class ActiveETFMonitor:
 
         # 1단계: yfinance로 시장 수익률 가져오기
         if date_prev and date_today:
-            market_returns = self.get_market_returns(df_prev, df_today, date_prev, date_today)
+            market_returns, return_sources = self.get_market_returns(df_prev, df_today, date_prev, date_today)
         else:
             # 날짜 정보가 없으면 PDF 데이터로 fallback
             print(f"[WARN]  날짜 정보 없음, PDF 데이터로 수익률 계산")
@@ -416,9 +723,11 @@ class ActiveETFMonitor:
                     market_returns[code] = (today_price / prev_price - 1) if prev_price > 0 else 0
                 else:
                     market_returns[code] = 0
+            return_sources = {code: 'pdf' for code in market_returns}
 
-        # 시장 수익률을 merged에 추가
+        # 시장 수익률과 그 소스를 merged에 추가 (금일 신규 종목은 전일 보유가 없어 'none')
         merged['시장_수익률'] = merged['종목코드'].map(market_returns).fillna(0)
+        merged['수익률_소스'] = merged['종목코드'].map(return_sources).fillna('none')
 
         # 2단계: 가상 비중 계산 (시장 변동만 반영)
         merged['가상_비중'] = merged['비중_prev'] * (1 + merged['시장_수익률'])
@@ -475,6 +784,7 @@ class ActiveETFMonitor:
             'total_changes': len(rebalanced),
             'stock_weight_prev': stock_weight_prev,
             'stock_weight_today': stock_weight_today,
+            'return_sources': return_sources,
         }
 
     def format_summary(self, analysis: Dict, df_today: pd.DataFrame,
@@ -565,27 +875,84 @@ class ActiveETFMonitor:
         return "\n".join(lines)
 
 
-if __name__ == "__main__":
-    # 테스트 코드
-    monitor = ActiveETFMonitor()
+def load_all_histories(data_dir: str = "./data", days: int = 30) -> pd.DataFrame:
+    """
+    모든 ETF(idx_*)의 저장된 히스토리를 하나의 컴팩트 테이블로 로드
+
+    Args:
+        data_dir: 데이터 루트 디렉토리
+        days: ETF별 최근 N개 파일, None이면 전체
+
+    Returns:
+        DataFrame: [idx, 날짜, 종목코드, 종목명, 수량, 평가금액, 비중]
+    """
+    if not os.path.exists(data_dir):
+        return pd.DataFrame()
+
+    frames = []
+    for entry in sorted(os.listdir(data_dir)):
+        if not entry.startswith('idx_') or not os.path.isdir(os.path.join(data_dir, entry)):
+            continue
+        idx = entry[len('idx_'):]
+        history = ActiveETFMonitor(data_dir=data_dir, url=f"{ActiveETFMonitor.BASE_URL}?idx={idx}").load_history(days=days)
+        if not history.empty:
+            history.insert(0, 'idx', idx)
+            frames.append(history)
 
-    # 오늘 데이터 수집
-    today = datetime.now(pytz.timezone('Asia/Seoul')).strftime("%Y-%m-%d")
-    df_today = monitor.get_portfolio_data(today)
-    monitor.save_data(df_today, today)
+    if not frames:
+        return pd.DataFrame()
+    merged = concat_holdings(frames)
+    merged['idx'] = merged['idx'].astype('category')
+    return merged
 
-    # 전일 데이터 가져오기
+
+def run_pipeline(monitor: ActiveETFMonitor, df_today: pd.DataFrame, today: str):
+    """전일 대비 리밸런싱 분석 후 요약 출력 (수집 이후 단계)"""
     try:
         prev_day = monitor.get_previous_business_day(today)
         df_prev = monitor.load_data(prev_day)
 
         # 리밸런싱 분석
-        analysis = monitor.analyze_rebalancing(df_today, df_prev)
+        analysis = monitor.analyze_rebalancing(df_today, df_prev, prev_day, today)
 
         # 결과 출력
         summary = monitor.format_summary(analysis, df_today, today, prev_day)
         print(summary)
+
+        # 전 ETF 알림 규칙 평가 (새 알림만 출력/전달)
+        try:
+            from alert_rules import AlertEngine
+            for alert in AlertEngine(monitor.base_dir).run():
+                print(f"[ALERT] {alert['message']}")
+        except Exception as e:
+            print(f"[WARN] 알림 규칙 평가 실패: {type(e).__name__}: {e}")
     except Exception as e:
         print(f"전일 데이터를 찾을 수 없습니다: {e}")
         print(f"\n금일 포트폴리오 ({today}):")
         print(df_today.to_string())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="타임폴리오 Active ETF PDF 모니터")
+    parser.add_argument("--poll", type=int, metavar="SECONDS",
+                        help="장중 폴링 모드: N초마다 PDF를 확인하고 변경 시에만 분석")
+    parser.add_argument("--storage", choices=["full", "delta"],
+                        help="스냅샷 저장 모드 (delta: 키프레임 + 일별 변경분)")
+    parser.add_argument("--force", action="store_true", help="내용이 그대로여도 분석을 다시 실행")
+    args = parser.parse_args()
+
+    monitor = ActiveETFMonitor(storage=args.storage)
+
+    if args.poll:
+        monitor.poll_portfolio(interval=args.poll,
+                               on_change=lambda df, date: run_pipeline(monitor, df, date))
+    else:
+        # 오늘 데이터 수집
+        today = datetime.now(pytz.timezone('Asia/Seoul')).strftime("%Y-%m-%d")
+        df_today = monitor.get_portfolio_data(today)
+        if monitor.save_data(df_today, today) or args.force:
+            run_pipeline(monitor, df_today, today)
+        else:
+            print(f"[INFO] {today} PDF 변경 없음, 분석 생략 (다시 실행하려면 --force)")
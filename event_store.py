@@ -0,0 +1,240 @@
+"""
+Rebalancing Event Store
+analyze_rebalancing 결과(편입/편출/비중 확대/비중 축소)를 SQLite에 누적 저장하고
+종목/ETF/날짜/이벤트 종류로 빠르게 조회하는 모듈
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, List
+
+import pandas as pd
+
+
+# analyze_rebalancing 결과 키 → 이벤트 종류
+EVENT_TYPES = {
+    'new_stocks': 'new',
+    'removed_stocks': 'removed',
+    'increased_stocks': 'increased',
+    'decreased_stocks': 'decreased',
+}
+
+EVENT_LABELS = {
+    'new': '신규 편입',
+    'removed': '완전 편출',
+    'increased': '비중 확대',
+    'decreased': '비중 축소',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    etf_idx TEXT NOT NULL,
+    etf_name TEXT,
+    date TEXT NOT NULL,
+    prev_date TEXT,
+    event_type TEXT NOT NULL,
+    code TEXT NOT NULL,
+    ticker TEXT,
+    name TEXT,
+    weight_prev REAL,
+    weight_today REAL,
+    pure_change REAL,
+    qty_prev REAL,
+    qty_today REAL,
+    market_return REAL,
+    recorded_at TEXT,
+    UNIQUE (etf_idx, date, event_type, code)
+);
+CREATE INDEX IF NOT EXISTS ix_events_code_nocase ON events (code COLLATE NOCASE, date);
+CREATE INDEX IF NOT EXISTS ix_events_ticker_nocase ON events (ticker COLLATE NOCASE, date);
+CREATE INDEX IF NOT EXISTS ix_events_etf ON events (etf_idx, date);
+CREATE INDEX IF NOT EXISTS ix_events_date ON events (date);
+CREATE INDEX IF NOT EXISTS ix_events_type ON events (event_type, date);
+CREATE INDEX IF NOT EXISTS ix_events_type_change ON events (event_type, pure_change);
+"""
+
+# 정렬 허용 컬럼
+SORTABLE = {'date', 'pure_change', 'weight_today', 'weight_prev', 'market_return', 'etf_idx', 'code'}
+
+
+class RebalancingEventStore:
+    """리밸런싱 이벤트 저장소 (SQLite, WAL)"""
+
+    def __init__(self, db_path: str = "./data/events.db"):
+        """
+        Args:
+            db_path: SQLite 파일 경로
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """스레드마다 새 연결 (Streamlit 세션 스레드 간 공유 금지, 호출자가 닫음)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def append(self, analysis: Dict, etf_idx: str, etf_name: str,
+               date_today: str, date_prev: str = None, tickers: Dict[str, str] = None) -> int:
+        """
+        분석 결과의 이벤트를 저장
+
+        같은 ETF/날짜의 기존 이벤트는 교체한다 (장중 PDF 재게시 후 재분석 대비).
+
+        Args:
+            analysis: analyze_rebalancing 결과
+            etf_idx: ETF idx
+            etf_name: ETF 이름
+            date_today: 기준일 (YYYY-MM-DD)
+            date_prev: 비교일
+            tickers: 종목코드 → yfinance 티커 (검색용)
+
+        Returns:
+            저장된 이벤트 수
+        """
+        tickers = tickers or {}
+        recorded_at = datetime.now().isoformat(timespec='seconds')
+        rows = []
+        for key, event_type in EVENT_TYPES.items():
+            for stock in analysis.get(key, []):
+                code = str(stock['종목코드'])
+                rows.append((
+                    str(etf_idx), etf_name, date_today, date_prev, event_type,
+                    code, tickers.get(code), stock.get('종목명'),
+                    float(stock.get('비중_prev', 0)), float(stock.get('비중_today', 0)),
+                    float(stock.get('순수_비중변화', 0)),
+                    float(stock.get('수량_prev', 0)), float(stock.get('수량_today', 0)),
+                    float(stock.get('시장_수익률', 0)), recorded_at,
+                ))
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM events WHERE etf_idx = ? AND date = ?", (str(etf_idx), date_today))
+            conn.executemany("""
+                INSERT INTO events (etf_idx, etf_name, date, prev_date, event_type, code, ticker, name,
+                                    weight_prev, weight_today, pure_change, qty_prev, qty_today,
+                                    market_return, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+
+    def query(self, code: str = None, etf: List[str] = None, event_type: List[str] = None,
+              start: str = None, end: str = None, order_by: str = 'date',
+              ascending: bool = False, limit: int = 500) -> pd.DataFrame:
+        """
+        이벤트 조회
+
+        예) 올해 NVDA를 편입/확대한 모든 이벤트:
+            query(code='NVDA', event_type=['new', 'increased'], start='2025-01-01')
+            지난주 순수 비중 축소 상위:
+            query(event_type=['decreased'], start=..., order_by='pure_change', ascending=True)
+
+        Args:
+            code: 종목코드 또는 티커 (대소문자 무시, 정확히 일치)
+            etf: ETF idx 또는 이름 목록
+            event_type: 'new', 'removed', 'increased', 'decreased' 중 목록
+            start: 시작일 (포함)
+            end: 종료일 (포함)
+            order_by: 정렬 컬럼
+            ascending: 오름차순 여부
+            limit: 최대 행 수
+
+        Returns:
+            이벤트 DataFrame
+        """
+        if order_by not in SORTABLE:
+            raise ValueError(f"정렬할 수 없는 컬럼입니다: {order_by}")
+
+        where, params = [], []
+        if code:
+            code = code.strip().upper()
+            where.append("(code = ? COLLATE NOCASE OR ticker = ? COLLATE NOCASE)")
+            params += [code, code]
+        if etf:
+            marks = ",".join("?" * len(etf))
+            where.append(f"(etf_idx IN ({marks}) OR etf_name IN ({marks}))")
+            params += [str(e) for e in etf] * 2
+        if event_type:
+            where.append(f"event_type IN ({','.join('?' * len(event_type))})")
+            params += list(event_type)
+        if start:
+            where.append("date >= ?")
+            params.append(start)
+        if end:
+            where.append("date <= ?")
+            params.append(end)
+
+        sql = "SELECT * FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_by} {'ASC' if ascending else 'DESC'}, date DESC LIMIT ?"
+        params.append(int(limit))
+
+        with closing(self._connect()) as conn, conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def timed_query(self, **kwargs):
+        """query 결과와 소요 시간(ms)"""
+        started = time.perf_counter()
+        result = self.query(**kwargs)
+        return result, (time.perf_counter() - started) * 1000
+
+    def count(self) -> int:
+        """저장된 전체 이벤트 수"""
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+def backfill_from_history(data_dir: str = "./data", days: int = None) -> int:
+    """
+    저장된 스냅샷 히스토리의 연속된 날짜 쌍을 분석하여 이벤트 저장소를 채움
+
+    과거 시점의 시장 수익률은 PDF 가격(평가금액/수량)으로 계산한다.
+
+    Returns:
+        저장된 이벤트 수
+    """
+    from etf_monitor import ActiveETFMonitor, ETF_NAMES
+
+    store = RebalancingEventStore(os.path.join(data_dir, "events.db"))
+    total = 0
+    for entry in sorted(os.listdir(data_dir)):
+        if not entry.startswith('idx_'):
+            continue
+        idx = entry[len('idx_'):]
+        monitor = ActiveETFMonitor(data_dir=data_dir, url=f"{ActiveETFMonitor.BASE_URL}?idx={idx}",
+                                   etf_name=ETF_NAMES.get(idx))
+        history = monitor.load_history(days=days)
+        if history.empty:
+            continue
+
+        snapshots = [(d.strftime('%Y-%m-%d'), g) for d, g in history.groupby('날짜', sort=True)]
+        for (date_prev, df_prev), (date_today, df_today) in zip(snapshots, snapshots[1:]):
+            analysis = monitor._analyze_rebalancing(df_today, df_prev)
+            total += monitor.record_events(analysis, date_prev, date_today, store)
+        print(f"[OK] {monitor.etf_name}: {len(snapshots)}일 분석")
+
+    print(f"[OK] 이벤트 백필 완료: {total}건")
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="리밸런싱 이벤트 저장소")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--backfill", action="store_true", help="저장된 히스토리로 이벤트 재구성")
+    parser.add_argument("--code", help="종목코드/티커로 조회")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill_from_history(args.data_dir)
+    events, elapsed = RebalancingEventStore(os.path.join(args.data_dir, "events.db")).timed_query(code=args.code)
+    print(events.to_string(index=False))
+    print(f"[STATS] {len(events)}건, {elapsed:.1f}ms")
@@ -0,0 +1,288 @@
+"""
+Export API
+리스크/OMS 등 하위 시스템용 로컬 HTTP 데이터 제공 서버
+
+Streamlit 화면이나 엑셀 다운로드 대신 저장된 스냅샷, 히스토리, 리밸런싱 분석/이벤트를
+직접 가져갈 수 있게 한다. 대량 조회는 Arrow IPC 스트림, 소량 조회는 JSON으로 응답한다.
+
+    GET /etfs                                        ETF 목록 + 저장일 범위 (JSON)
+    GET /snapshot?idx=5&date=2025-06-02              하루 스냅샷 (date 생략 시 최신)
+    GET /history?idx=5,2&start=2025-01-01&end=...    히스토리 (기본 Arrow, idx 생략 시 전체 ETF)
+    GET /analysis?idx=5&date=2025-06-02[&prev=...]   리밸런싱 분석 결과 (JSON, 저장일끼리 PDF 가격 기준)
+    GET /events?code=NVDA&type=new,increased&...     누적 리밸런싱 이벤트
+
+    공통: format=arrow|json (Accept: application/vnd.apache.arrow.stream 도 인식),
+          compression=zstd|lz4 (Arrow 응답 압축)
+
+Arrow 응답은 컴팩트 스키마(holdings_schema) 프레임을 그대로 변환하므로 수치 컬럼은
+복사 없이 버퍼를 공유하고, 종목코드/종목명은 공유 사전의 정수 코드가 그대로
+dictionary 배열이 된다. 배치 단위로 소켓에 바로 써서 전체 응답을 메모리에 다시 만들지 않는다.
+
+    import pyarrow as pa, urllib.request
+    table = pa.ipc.open_stream(urllib.request.urlopen("http://127.0.0.1:8765/history")).read_all()
+"""
+
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from etf_monitor import ActiveETFMonitor, ETF_CATEGORIES, ETF_NAMES
+from event_store import RebalancingEventStore
+from holdings_schema import apply_holdings_schema, concat_holdings, to_storage_frame
+from snapshot_store import SnapshotStore
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow가 없으면 JSON 응답만 제공
+    pa = None
+
+
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+BATCH_ROWS = 64 * 1024
+JSON_MAX_ROWS = 100_000  # 이보다 큰 JSON 응답은 Arrow로 받도록 안내
+
+
+class ExportError(Exception):
+    """HTTP 상태 코드를 가진 요청 오류"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _etf_dirs(data_dir: str) -> Dict[str, str]:
+    """저장 디렉토리가 있는 ETF idx → 디렉토리"""
+    if not os.path.exists(data_dir):
+        return {}
+    dirs = {}
+    for entry in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, entry)
+        if entry.startswith('idx_') and os.path.isdir(path):
+            dirs[entry[len('idx_'):]] = path
+    return dirs
+
+
+def load_histories(data_dir: str = "./data", idx: List[str] = None,
+                   start: str = None, end: str = None) -> pd.DataFrame:
+    """
+    ETF별 히스토리를 날짜 범위로 잘라 하나의 컴팩트 테이블로 로드
+
+    Args:
+        data_dir: 데이터 루트 디렉토리
+        idx: ETF idx 목록, None이면 저장된 전체 ETF
+        start: 시작일 (포함)
+        end: 종료일 (포함)
+
+    Returns:
+        DataFrame: [idx, 날짜, 종목코드, 종목명, 수량, 평가금액, 비중] (ETF, 날짜 오름차순)
+    """
+    dirs = _etf_dirs(data_dir)
+    frames = []
+    for etf in (idx or list(dirs)):
+        if etf not in dirs:
+            continue
+        store = SnapshotStore(dirs[etf])
+        dates = [d for d in store.dates() if (not start or d >= start) and (not end or d <= end)]
+        table = store.load_table(dates)
+        if table.empty:
+            continue
+        table.insert(0, 'idx', etf)
+        frames.append(apply_holdings_schema(table))
+
+    if not frames:
+        return pd.DataFrame()
+    merged = concat_holdings(frames)
+    merged['idx'] = merged['idx'].astype('category')
+    return merged[['idx'] + [col for col in merged.columns if col != 'idx']]
+
+
+def _json_default(value):
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating,)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
+    return str(value)
+
+
+def _records(df: pd.DataFrame) -> List[Dict]:
+    """DataFrame → JSON 레코드 (날짜 문자열, category 해제, NaN → null)"""
+    out = to_storage_frame(df)
+    out = out.astype(object).where(out.notna(), None)
+    return out.to_dict('records')
+
+
+class ExportHandler(BaseHTTPRequestHandler):
+    """조회 전용 요청 처리기 (server.data_dir 기준)"""
+
+    server_version = "TempoExport/1.0"
+
+    def do_GET(self):
+        started = time.perf_counter()
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        route = getattr(self, f"route_{parsed.path.strip('/') or 'etfs'}", None)
+        try:
+            if route is None:
+                raise ExportError(404, f"알 수 없는 경로입니다: {parsed.path}")
+            route(params)
+        except ExportError as e:
+            self._send_json({'error': str(e)}, status=e.status)
+        except ValueError as e:
+            self._send_json({'error': str(e)}, status=400)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        except Exception as e:
+            self._send_json({'error': f"{type(e).__name__}: {e}"}, status=500)
+        finally:
+            self.log_message('"%s" %.1fms', self.path, (time.perf_counter() - started) * 1000)
+
+    def log_request(self, code='-', size='-'):
+        # 소요 시간을 포함한 로그를 do_GET에서 한 번만 남김
+        pass
+
+    # -------------------------------------------------------------
+    # 응답
+    # -------------------------------------------------------------
+    def _wants_arrow(self, params: Dict[str, str], default: str) -> bool:
+        fmt = params.get('format')
+        if fmt is None and ARROW_MIME in self.headers.get('Accept', ''):
+            fmt = 'arrow'
+        fmt = fmt or default
+        if fmt not in ('arrow', 'json'):
+            raise ValueError(f"지원하지 않는 format입니다: {fmt}")
+        if fmt == 'arrow' and pa is None:
+            raise ExportError(501, "pyarrow가 설치되어 있지 않아 Arrow 응답을 만들 수 없습니다. format=json을 사용하세요.")
+        return fmt == 'arrow'
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_frame(self, df: pd.DataFrame, params: Dict[str, str], default: str = 'json'):
+        if self._wants_arrow(params, default):
+            self._send_arrow(df, params.get('compression'))
+            return
+        if len(df) > JSON_MAX_ROWS:
+            raise ExportError(413, f"{len(df):,}행은 JSON으로 보내기에 너무 큽니다. format=arrow를 사용하세요.")
+        self._send_json({'rows': len(df), 'data': _records(df)})
+
+    def _send_arrow(self, df: pd.DataFrame, compression: Optional[str]):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        options = pa.ipc.IpcWriteOptions(compression=compression) if compression else None
+
+        # 연결 종료로 본문 끝을 알리므로(HTTP/1.0) 배치를 만드는 대로 바로 전송
+        self.send_response(200)
+        self.send_header('Content-Type', ARROW_MIME)
+        self.send_header('X-Row-Count', str(table.num_rows))
+        self.end_headers()
+        sink = pa.PythonFile(self.wfile, mode='w')
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            for batch in table.to_batches(max_chunksize=BATCH_ROWS):
+                writer.write_batch(batch)
+
+    # -------------------------------------------------------------
+    # 경로
+    # -------------------------------------------------------------
+    def _monitor(self, idx: Optional[str]) -> ActiveETFMonitor:
+        if not idx:
+            raise ValueError("idx 파라미터가 필요합니다.")
+        if idx not in _etf_dirs(self.server.data_dir):
+            raise ExportError(404, f"저장된 데이터가 없는 ETF입니다: idx={idx}")
+        return ActiveETFMonitor(data_dir=self.server.data_dir, url=f"{ActiveETFMonitor.BASE_URL}?idx={idx}",
+                                etf_name=ETF_NAMES.get(idx))
+
+    def route_etfs(self, params):
+        category = {idx: cat for cat, group in ETF_CATEGORIES.items() for idx in group.values()}
+        etfs = []
+        for idx, path in _etf_dirs(self.server.data_dir).items():
+            dates = SnapshotStore(path).dates()
+            etfs.append({'idx': idx, 'name': ETF_NAMES.get(idx), 'category': category.get(idx),
+                         'dates': len(dates), 'first': dates[0] if dates else None,
+                         'last': dates[-1] if dates else None})
+        self._send_json({'etfs': etfs})
+
+    def route_snapshot(self, params):
+        monitor = self._monitor(params.get('idx'))
+        dates = monitor.snapshots.dates()
+        date = params.get('date') or (dates[-1] if dates else None)
+        df = monitor.load_data(date) if date else None
+        if df is None:
+            raise ExportError(404, f"스냅샷이 없습니다: idx={monitor.idx}, date={date}")
+        df.insert(0, 'idx', monitor.idx)
+        self._send_frame(df, params)
+
+    def route_history(self, params):
+        idx = [i.strip() for i in params['idx'].split(',') if i.strip()] if params.get('idx') else None
+        df = load_histories(self.server.data_dir, idx, params.get('start'), params.get('end'))
+        self._send_frame(df, params, default='arrow')
+
+    def route_analysis(self, params):
+        monitor = self._monitor(params.get('idx'))
+        dates = monitor.snapshots.dates()
+        date = params.get('date') or (dates[-1] if dates else None)
+        df_today = monitor.load_data(date) if date else None
+        if df_today is None:
+            raise ExportError(404, f"스냅샷이 없습니다: idx={monitor.idx}, date={date}")
+        # 저장된 스냅샷끼리만 비교 (크롤링/시장 수익률 조회/이벤트 기록 없음)
+        earlier = [d for d in dates if d < date]
+        prev = params.get('prev') or (earlier[-1] if earlier else None)
+        if prev not in earlier:
+            raise ExportError(404, f"비교할 이전 저장일이 없습니다: idx={monitor.idx}, date={date}, prev={prev}")
+        df_prev = monitor.load_data(prev)
+        if df_prev is None:
+            raise ExportError(404, f"비교할 스냅샷이 없습니다: idx={monitor.idx}, date={prev}")
+
+        # 날짜 없이 호출하면 PDF 가격 기반 수익률로 분석하고 이벤트 저장소에 기록하지 않음
+        analysis = monitor.analyze_rebalancing(df_today, df_prev)
+        self._send_json({'idx': monitor.idx, 'name': monitor.etf_name, 'date': date, 'prev': prev,
+                         'return_basis': 'pdf', **analysis})
+
+    def route_events(self, params):
+        store = RebalancingEventStore(os.path.join(self.server.data_dir, "events.db"))
+        split = lambda key: [v.strip() for v in params[key].split(',') if v.strip()] if params.get(key) else None
+        events = store.query(code=params.get('code'), etf=split('etf'), event_type=split('type'),
+                             start=params.get('start'), end=params.get('end'),
+                             order_by=params.get('order_by', 'date'),
+                             ascending=params.get('ascending', '').lower() in ('1', 'true'),
+                             limit=int(params.get('limit', 500)))
+        self._send_frame(events, params)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, data_dir: str = "./data") -> ThreadingHTTPServer:
+    """요청마다 스레드를 쓰는 Export 서버 생성 (serve_forever는 호출자가 실행)"""
+    server = ThreadingHTTPServer((host, port), ExportHandler)
+    server.daemon_threads = True
+    server.data_dir = data_dir
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="스냅샷/히스토리/분석 결과 Export API 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data-dir", default="./data")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.data_dir)
+    print(f"[OK] Export API: http://{args.host}:{args.port}/ (data: {args.data_dir}, "
+          f"Arrow: {'사용' if pa is not None else '미설치 - JSON만 제공'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,197 @@
+"""
+Holdings Schema
+보유종목(PDF) 스냅샷의 표준 스키마와 컴팩트 인메모리 표현
+
+- 종목코드/종목명: 모든 ETF가 공유하는 사전 기반 category (정수 코드 배열)
+- 날짜: datetime64
+- 수량/평가금액: 값 범위에 맞춰 다운캐스트한 정수
+- 비중: float32
+"""
+
+import sys
+import threading
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+HOLDINGS_COLUMNS = ['날짜', '종목코드', '종목명', '수량', '평가금액', '비중']
+CATEGORY_COLUMNS = ['종목코드', '종목명']
+INTEGER_COLUMNS = ['수량', '평가금액']
+
+
+class HoldingsDictionary:
+    """
+    ETF 간 공유하는 종목코드/종목명 사전
+
+    추가 전용(append-only)이므로 한 번 부여된 코드는 바뀌지 않는다.
+    사전이 커진 뒤에도 예전 프레임의 category를 현재 사전으로 맞추면
+    (set_categories) 정수 코드가 그대로 유지되어 concat 시 category가 보존된다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {col: [] for col in CATEGORY_COLUMNS}
+        self._positions = {col: {} for col in CATEGORY_COLUMNS}
+        self._categories = {col: pd.Index([], dtype=object) for col in CATEGORY_COLUMNS}
+
+    def categories(self, column: str) -> pd.Index:
+        """현재 사전 (category 목록)"""
+        return self._categories[column]
+
+    def encode(self, column: str, values) -> pd.Categorical:
+        """
+        문자열 배열을 공유 사전 기반 Categorical로 변환
+
+        Args:
+            column: '종목코드' 또는 '종목명'
+            values: 문자열 배열 (Series, list 등)
+
+        Returns:
+            현재 사전 전체를 category로 가지는 Categorical
+        """
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna('').astype(str))
+        with self._lock:
+            positions = self._positions[column]
+            added = [u for u in uniques if u not in positions]
+            if added:
+                for value in added:
+                    positions[value] = len(self._values[column])
+                    self._values[column].append(value)
+                self._categories[column] = pd.Index(self._values[column], dtype=object)
+            mapping = np.fromiter((positions[u] for u in uniques), dtype=np.int64, count=len(uniques))
+            categories = self._categories[column]
+
+        return pd.Categorical.from_codes(mapping[codes] if len(codes) else codes, categories=categories)
+
+    def size(self) -> Dict[str, int]:
+        """컬럼별 사전 크기"""
+        return {col: len(values) for col, values in self._values.items()}
+
+
+# 프로세스 전역 공유 사전
+HOLDINGS_DICTIONARY = HoldingsDictionary()
+
+
+def apply_holdings_schema(df: pd.DataFrame, dictionary: HoldingsDictionary = None) -> pd.DataFrame:
+    """
+    스냅샷/히스토리 DataFrame에 표준 스키마 적용 (수집/로드 시점에 호출)
+
+    이미 스키마가 적용된 프레임에 다시 호출해도 안전하며, 그 경우 category를
+    현재 공유 사전으로 맞춰준다. 스키마 밖의 추가 컬럼은 그대로 둔다.
+
+    Args:
+        df: 종목코드, 종목명, 수량, 평가금액, 비중 (+ 날짜) 컬럼을 가진 DataFrame
+        dictionary: 사용할 사전, None이면 전역 공유 사전
+
+    Returns:
+        컴팩트 dtype으로 변환된 새 DataFrame
+    """
+    dictionary = dictionary or HOLDINGS_DICTIONARY
+    out = df.copy()
+
+    for col in CATEGORY_COLUMNS:
+        if col in out.columns:
+            values = out[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(object)
+            out[col] = dictionary.encode(col, values.to_numpy())
+
+    if '날짜' in out.columns:
+        out['날짜'] = pd.to_datetime(out['날짜'])
+
+    for col in INTEGER_COLUMNS:
+        if col in out.columns:
+            values = pd.to_numeric(out[col], errors='coerce').fillna(0)
+            out[col] = pd.to_numeric(values.astype(np.int64), downcast='integer')
+
+    if '비중' in out.columns:
+        out['비중'] = pd.to_numeric(out['비중'], errors='coerce').fillna(0).astype(np.float32)
+
+    ordered = [col for col in HOLDINGS_COLUMNS if col in out.columns]
+    return out[ordered + [col for col in out.columns if col not in ordered]]
+
+
+def concat_holdings(frames: List[pd.DataFrame], dictionary: HoldingsDictionary = None) -> pd.DataFrame:
+    """
+    스키마가 적용된 프레임들을 category를 유지한 채 병합
+
+    각 프레임의 category를 현재 공유 사전으로 맞춘 뒤 concat 한다.
+    정수 컬럼은 병합 후 다시 다운캐스트한다.
+    """
+    dictionary = dictionary or HOLDINGS_DICTIONARY
+    frames = [f for f in frames if f is not None and len(f) > 0]
+    if not frames:
+        return pd.DataFrame()
+
+    aligned = []
+    for frame in frames:
+        frame = frame.copy()
+        for col in CATEGORY_COLUMNS:
+            if col in frame.columns and isinstance(frame[col].dtype, pd.CategoricalDtype):
+                frame[col] = frame[col].cat.set_categories(dictionary.categories(col))
+        aligned.append(frame)
+
+    merged = pd.concat(aligned, ignore_index=True)
+    for col in INTEGER_COLUMNS:
+        if col in merged.columns and pd.api.types.is_integer_dtype(merged[col]):
+            merged[col] = pd.to_numeric(merged[col], downcast='integer')
+    return merged
+
+
+def to_storage_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    JSON 저장용 일반 dtype 프레임으로 변환
+
+    날짜는 YYYY-MM-DD 문자열, 비중은 float32 표현 오차를 제거한 float64로 되돌린다.
+    """
+    out = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in out.columns and isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(object)
+    if '날짜' in out.columns and pd.api.types.is_datetime64_any_dtype(out['날짜']):
+        out['날짜'] = out['날짜'].dt.strftime('%Y-%m-%d')
+    for col in INTEGER_COLUMNS:
+        if col in out.columns and pd.api.types.is_integer_dtype(out[col]):
+            out[col] = out[col].astype(np.int64)
+    if '비중' in out.columns:
+        out['비중'] = out['비중'].astype(np.float64).round(6)
+    return out
+
+
+def memory_usage_report(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    컴팩트 스키마 적용 전/후 메모리 사용량 비교
+
+    Args:
+        df: 스키마가 적용된 (또는 적용 전) 보유종목 DataFrame
+
+    Returns:
+        DataFrame: 컬럼, 기존(bytes), 컴팩트(bytes), 절감률(%) (마지막 행은 합계)
+    """
+    compact = apply_holdings_schema(df)
+
+    # 기존 표현: object 문자열 + 문자열 날짜 + int64/float64
+    loose = to_storage_frame(compact)
+    for col in loose.columns:
+        if pd.api.types.is_float_dtype(loose[col]):
+            loose[col] = loose[col].astype(np.float64)
+
+    before = loose.memory_usage(deep=True, index=False)
+    after = compact.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({'기존(bytes)': before, '컴팩트(bytes)': after})
+    report.loc['합계'] = report.sum()
+    report['절감률(%)'] = (1 - report['컴팩트(bytes)'] / report['기존(bytes)'].where(report['기존(bytes)'] > 0)) * 100
+    report.index.name = '컬럼'
+    return report.reset_index()
+
+
+if __name__ == "__main__":
+    # 사용법: python holdings_schema.py [데이터 디렉토리]
+    from etf_monitor import load_all_histories
+
+    history = load_all_histories(sys.argv[1] if len(sys.argv) > 1 else "./data", days=None)
+    print(f"[STATS] 전체 히스토리: {len(history):,}행, 사전 크기 {HOLDINGS_DICTIONARY.size()}")
+    if not history.empty:
+        print(memory_usage_report(history).to_string(index=False))
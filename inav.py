@@ -0,0 +1,238 @@
+"""
+iNAV Engine
+추적 중인 모든 ETF의 장중 추정 순자산가치(iNAV) 계산 모듈
+
+모든 ETF의 보유종목을 (ETF × 고유 티커) 평가금액 행렬로 만들고,
+고유 티커 전체의 시세를 한 번에 배치 조회한 뒤 행렬 연산 한 번으로
+펀드별 추정가치를 계산한다. 갱신 비용은 (ETF, 종목) 쌍의 수가 아니라
+고유 티커 수에 비례한다.
+
+스냅샷은 스냅샷일 직전 영업일 종가로 평가되어 있으므로, 종목별 수익률은 그 종가에서
+현재가까지로 잰다 (국내 장중의 미국 종목은 아직 0%). 외화 종목은 상장 통화별 원화
+환율 변동을 곱한다.
+"""
+
+import re
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from etf_monitor import ActiveETFMonitor, ETF_NAMES, load_all_histories
+from indicators import download_closes
+
+
+# 원화 환산에 사용하는 환율 티커 (미국 달러, 다른 통화는 {통화}KRW=X)
+FX_TICKER = "KRW=X"
+
+# yfinance 티커 접미사 → 상장 통화 (접미사가 없거나 목록에 없으면 미국 달러)
+SUFFIX_CURRENCY = {
+    'TO': 'CAD', 'V': 'CAD', 'HK': 'HKD', 'T': 'JPY', 'TW': 'TWD', 'TWO': 'TWD',
+    'SS': 'CNY', 'SZ': 'CNY', 'L': 'GBP', 'DE': 'EUR', 'PA': 'EUR', 'AS': 'EUR', 'MI': 'EUR',
+    'SW': 'CHF', 'AX': 'AUD',
+}
+
+# 가장 오래된 스냅샷일부터 현재까지를 덮는 조회 기간 (yfinance period, 달력 일수)
+PERIODS = (("5d", 7), ("1mo", 30), ("3mo", 90), ("1y", 365))
+
+
+def _is_krw_ticker(ticker: str) -> bool:
+    """원화 표시 종목 여부 (국내 상장: .KS/.KQ 티커 또는 6자리 단축코드)"""
+    return (ticker.endswith('.KS') or ticker.endswith('.KQ') or ticker.startswith('^KS')
+            or re.fullmatch(r'A?\d{6}', ticker) is not None)
+
+
+def ticker_currency(ticker: str) -> str:
+    """티커의 상장 통화 (예: NVDA → USD, SHOP.TO → CAD, 0700.HK → HKD, 005930.KS → KRW)"""
+    if _is_krw_ticker(ticker):
+        return 'KRW'
+    suffix = ticker.rsplit('.', 1)[1] if '.' in ticker else ''
+    return SUFFIX_CURRENCY.get(suffix, 'USD')
+
+
+def fx_ticker(currency: str) -> str:
+    """통화 → 원화 환율 티커 (원화는 빈 문자열)"""
+    if currency == 'KRW':
+        return ''
+    return FX_TICKER if currency == 'USD' else f"{currency}KRW=X"
+
+
+class INAVEngine:
+    """장중 iNAV 계산 엔진"""
+
+    def __init__(self, data_dir: str = "./data", etf_names: Dict[str, str] = None):
+        """
+        Args:
+            data_dir: 데이터 루트 디렉토리 (idx_*/ 스냅샷 사용)
+            etf_names: idx → 상품명, None이면 ETF_NAMES
+        """
+        self.data_dir = data_dir
+        self.etf_names = etf_names or ETF_NAMES
+
+        self.etfs: List[str] = []              # 행: ETF idx
+        self.tickers: List[str] = []           # 열: 고유 티커
+        self.snapshot_dates: Dict[str, str] = {}
+        self.holdings = np.zeros((0, 0))       # ETF × 티커 평가금액 (원)
+        self.unpriced = np.zeros(0)            # ETF별 시세 미반영 금액 (현금, 미지원 종목)
+        self.base_value = np.zeros(0)          # ETF별 스냅샷 평가금액 합계
+        self.fx_tickers: List[str] = []        # 티커별 원화 환율 티커 (원화 종목은 '')
+
+    def load_holdings(self) -> int:
+        """
+        저장된 최신 스냅샷으로 보유종목 행렬 구성
+
+        Returns:
+            고유 티커 수
+        """
+        history = load_all_histories(self.data_dir, days=1)
+        if history.empty:
+            self.__init__(self.data_dir, self.etf_names)
+            return 0
+
+        history = history[history['idx'].astype(str).isin(self.etf_names.keys())]
+        codes = history['종목코드'].astype(str)
+
+        # 고유 종목코드별로 한 번만 티커 변환
+        code_to_ticker = {code: ActiveETFMonitor._ticker_from_code(code) if code else None
+                          for code in codes.unique()}
+        tickers = codes.map(code_to_ticker)
+        is_cash = (history['종목명'] == '현금') | (codes == '')
+        priced = tickers.notna() & ~is_cash
+
+        etf_index = pd.Index(sorted(history['idx'].astype(str).unique(), key=int))
+        ticker_index = pd.Index(sorted(tickers[priced].unique()))
+        rows = etf_index.get_indexer(history['idx'].astype(str))
+        values = history['평가금액'].to_numpy(dtype=np.float64)
+
+        matrix = np.zeros((len(etf_index), len(ticker_index)))
+        np.add.at(matrix, (rows[priced.to_numpy()], ticker_index.get_indexer(tickers[priced])),
+                  values[priced.to_numpy()])
+
+        self.etfs = list(etf_index)
+        self.tickers = list(ticker_index)
+        self.holdings = matrix
+        self.base_value = np.bincount(rows, weights=values, minlength=len(etf_index))
+        self.unpriced = self.base_value - matrix.sum(axis=1)
+        self.fx_tickers = [fx_ticker(ticker_currency(t)) for t in self.tickers]
+        self.snapshot_dates = (history.groupby(history['idx'].astype(str), observed=True)['날짜']
+                               .max().dt.strftime('%Y-%m-%d').to_dict())
+
+        print(f"[OK] iNAV 보유종목 행렬: ETF {len(self.etfs)}개 × 고유 티커 {len(self.tickers)}개 "
+              f"((ETF, 종목) {int(priced.sum())}쌍)")
+        return len(self.tickers)
+
+    def fetch_returns(self) -> pd.DataFrame:
+        """
+        고유 티커 전체 + 통화별 환율의 스냅샷 평가 시점 대비 수익률
+
+        종목별로 스냅샷일 전날까지의 마지막 종가(스냅샷 평가 가격)를 기준가로 삼아
+        최신 봉(장중에는 현재가)과 비교한다. 조회는 호스트 리미터를 거치는 묶음 배치로 한다.
+
+        Returns:
+            DataFrame: 스냅샷일 × 심볼(티커 + 환율 티커) 수익률, 조회 실패는 NaN
+        """
+        symbols = self.tickers + sorted(set(self.fx_tickers) - {''})
+        dates = sorted(set(self.snapshot_dates.values()))
+        if not symbols or not dates:
+            return pd.DataFrame(columns=symbols, dtype=np.float64)
+
+        age = (pd.Timestamp.now().normalize() - pd.Timestamp(dates[0])).days
+        period = next((name for name, days in PERIODS if days >= age + 5), PERIODS[-1][0])
+        closes = download_closes(symbols, period).reindex(columns=symbols)
+        if closes.empty:
+            return pd.DataFrame(np.nan, index=dates, columns=symbols)
+
+        live = closes.ffill().iloc[-1]
+        rows = {}
+        for date in dates:
+            before = closes.loc[:pd.Timestamp(date) - pd.Timedelta(days=1)].ffill()
+            base = before.iloc[-1] if not before.empty else pd.Series(np.nan, index=symbols)
+            rows[date] = (live / base.where(base > 0)) - 1
+        return pd.DataFrame(rows).T.reindex(columns=symbols)
+
+    def compute(self, returns: pd.DataFrame) -> pd.DataFrame:
+        """
+        펀드별 추정가치 = Σ 보유종목 평가금액 × (1 + 현지통화 수익률) × (1 + 환율 수익률) + 시세 미반영 금액
+
+        Args:
+            returns: fetch_returns 결과 (스냅샷일 × 심볼 수익률, 환율 티커 포함)
+
+        Returns:
+            DataFrame: idx, ETF, 스냅샷일, 기준가치, 추정가치, 추정수익률(%), 시세반영비중(%)
+        """
+        growth = np.ones_like(self.holdings)
+        available = np.zeros(self.holdings.shape, dtype=bool)
+        snapshot_dates = pd.Series([self.snapshot_dates.get(idx) for idx in self.etfs])
+        for date, rows in snapshot_dates.groupby(snapshot_dates).indices.items():
+            row = returns.loc[date] if date in returns.index else pd.Series(dtype=np.float64)
+            local = row.reindex(self.tickers).to_numpy(dtype=np.float64)
+            fx = np.nan_to_num(row.reindex(self.fx_tickers).to_numpy(dtype=np.float64), nan=0.0)
+            # 외화 종목은 환율 변동까지 반영 (원화 종목과 환율 조회 실패는 0%), 조회 실패 종목은 0% 가정
+            ok = ~np.isnan(local)
+            growth[rows] = np.where(ok, (1 + local) * (1 + fx), 1.0)
+            available[rows] = ok
+
+        estimated = (self.holdings * growth).sum(axis=1) + self.unpriced
+        covered = (self.holdings * available).sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inav_return = np.where(self.base_value > 0, estimated / self.base_value - 1, 0.0)
+            coverage = np.where(self.base_value > 0, covered / self.base_value, 0.0)
+
+        return pd.DataFrame({
+            'idx': self.etfs,
+            'ETF': [self.etf_names.get(idx, idx) for idx in self.etfs],
+            '스냅샷일': list(snapshot_dates),
+            '기준가치': self.base_value,
+            '추정가치': estimated,
+            '추정수익률(%)': inav_return * 100,
+            '시세반영비중(%)': coverage * 100,
+        })
+
+    def refresh(self) -> pd.DataFrame:
+        """시세 조회 + iNAV 계산 한 번"""
+        if not self.tickers:
+            self.load_holdings()
+        if not self.tickers:
+            return pd.DataFrame()
+        started = time.time()
+        result = self.compute(self.fetch_returns())
+        result['시각'] = datetime.now(ActiveETFMonitor.KST).strftime("%H:%M:%S")
+        print(f"[OK] iNAV 갱신: 티커 {len(self.tickers)}개, {time.time() - started:.2f}초")
+        return result
+
+    def run(self, interval: int = 60, on_update: Callable = None, max_iterations: int = None):
+        """
+        interval초마다 iNAV를 갱신하여 on_update(result)로 전달
+
+        Args:
+            interval: 갱신 간격 (초)
+            on_update: 갱신 결과 콜백, None이면 표로 출력
+            max_iterations: 최대 반복 횟수, None이면 무한
+        """
+        iterations = 0
+        while max_iterations is None or iterations < max_iterations:
+            if iterations > 0:
+                time.sleep(interval)
+            iterations += 1
+            try:
+                result = self.refresh()
+                if on_update:
+                    on_update(result)
+                else:
+                    print(result.to_string(index=False))
+            except Exception as e:
+                print(f"[WARN] iNAV 갱신 실패: {type(e).__name__}: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="타임폴리오 Active ETF 장중 iNAV")
+    parser.add_argument("--interval", type=int, default=60, help="갱신 간격 (초)")
+    parser.add_argument("--data-dir", default="./data")
+    args = parser.parse_args()
+
+    INAVEngine(args.data_dir).run(interval=args.interval)
@@ -0,0 +1,395 @@
+"""
+Technical Indicators
+날짜 × 티커 종가 행렬에서 기술적 지표를 열 단위로 한 번에 계산하는 모듈
+
+- MA5/20/60/120, RSI(14, Wilder), 실현 변동성(20일, 연율화), 고점 대비 낙폭, Z-score(20일)
+- 티커마다 거래일이 달라도(코스피 vs 비트코인) 각 티커 자신의 관측치로 윈도우를 센다
+- 롤링 상태(최근 120개 종가, RSI 평균 상승/하락폭, 누적 고점)를 저장해 두고
+  새 봉이 오면 그 봉만 반영한다 (1년치 재계산/재조회 없음)
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from resilience import YAHOO_HOST, get_limiter
+from snapshot_store import atomic_write
+
+
+MA_WINDOWS = (5, 20, 60, 120)
+RSI_PERIOD = 14
+VOL_WINDOW = 20
+ZSCORE_WINDOW = 20
+TRADING_DAYS = 252
+
+# 상태에 보관하는 최근 종가 수 (가장 긴 윈도우)
+TAIL = max(MA_WINDOWS + (VOL_WINDOW + 1, ZSCORE_WINDOW))
+
+INDICATORS = ['close'] + [f'ma{w}' for w in MA_WINDOWS] + ['rsi', 'volatility', 'drawdown', 'zscore']
+
+# 화면 표시용 컬럼명
+INDICATOR_LABELS = {
+    'close': '종가', 'ma5': 'MA5', 'ma20': 'MA20', 'ma60': 'MA60', 'ma120': 'MA120',
+    'rsi': f'RSI({RSI_PERIOD})', 'volatility': f'변동성{VOL_WINDOW}일(%)', 'drawdown': '고점대비(%)',
+    'zscore': f'Z-score({ZSCORE_WINDOW})',
+}
+
+# 증분 갱신/전체 재계산 시 조회 기간 (yfinance period)
+INCREMENTAL_PERIOD = "1mo"
+FULL_PERIOD = "1y"
+
+# 한 번에 받는 티커 수 (묶음마다 리미터 슬롯 하나, 묶음 안에서는 순차 요청)
+DOWNLOAD_CHUNK = 10
+
+
+def daily_closes(closes: Dict[str, pd.Series]) -> pd.DataFrame:
+    """
+    티커별 종가 시계열을 날짜 × 티커 행렬로 정렬
+
+    거래소 시간대가 달라도 현지 날짜 기준으로 맞추며, 해당 날짜에 봉이 없는 티커는 NaN.
+    """
+    columns = {}
+    for name, series in closes.items():
+        series = series.dropna()
+        index = series.index
+        if isinstance(index, pd.DatetimeIndex) and index.tz is not None:
+            index = index.tz_localize(None)
+        series = pd.Series(series.to_numpy(dtype=np.float64), index=pd.DatetimeIndex(index).normalize())
+        columns[name] = series[~series.index.duplicated(keep='last')]
+    if not columns:
+        return pd.DataFrame(dtype=np.float64)
+    return pd.DataFrame(columns).sort_index()
+
+
+def _compact(values: np.ndarray):
+    """열마다 관측치를 위로 모음 (시간 순서 유지, NaN은 아래로) → (원래 행 위치, 압축 행렬)"""
+    order = np.argsort(np.isnan(values), axis=0, kind='stable')
+    return order, np.take_along_axis(values, order, axis=0)
+
+
+def _scatter(order: np.ndarray, compacted: np.ndarray, observed: np.ndarray) -> np.ndarray:
+    """압축 행렬 결과를 원래 날짜 위치로 되돌림 (봉이 없는 날짜는 NaN)"""
+    out = np.empty_like(compacted)
+    np.put_along_axis(out, order, compacted, axis=0)
+    out[~observed] = np.nan
+    return out
+
+
+def _rsi(avg_gain: np.ndarray, avg_loss: np.ndarray) -> np.ndarray:
+    total = avg_gain + avg_loss
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, 100 * avg_gain / total, 50.0)
+
+
+@dataclass
+class IndicatorState:
+    """증분 갱신용 롤링 상태 (마지막 확정 봉 기준)"""
+    tickers: List[str]
+    date: pd.Timestamp              # 마지막 확정 봉 날짜
+    tail: np.ndarray                # (TAIL, 티커) 최근 종가, 관측치가 적으면 위쪽 NaN
+    count: np.ndarray               # 티커별 누적 관측치 수
+    avg_gain: np.ndarray            # RSI Wilder 평균 상승폭
+    avg_loss: np.ndarray            # RSI Wilder 평균 하락폭
+    peak: np.ndarray                # 누적 고점
+
+    def select(self, tickers: List[str]) -> 'IndicatorState':
+        """일부 티커만 남긴 상태"""
+        cols = pd.Index(self.tickers).get_indexer(tickers)
+        return IndicatorState(list(tickers), self.date, self.tail[:, cols], self.count[cols],
+                              self.avg_gain[cols], self.avg_loss[cols], self.peak[cols])
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, tickers=np.array(self.tickers, dtype=str), date=np.array(str(self.date.date())),
+                         tail=self.tail, count=self.count, avg_gain=self.avg_gain, avg_loss=self.avg_loss,
+                         peak=self.peak)
+        atomic_write(path, write)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['IndicatorState']:
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return cls(list(data['tickers']), pd.Timestamp(str(data['date'])), data['tail'], data['count'],
+                           data['avg_gain'], data['avg_loss'], data['peak'])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] 지표 상태 로드 실패 ({path}): {e}")
+            return None
+
+
+def compute_indicators(closes: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    전체 기간 지표를 한 번의 열 단위 벡터 연산으로 계산
+
+    Args:
+        closes: 날짜 × 티커 종가 (daily_closes 결과)
+
+    Returns:
+        지표명(INDICATORS) → 날짜 × 티커 DataFrame
+    """
+    panel, _ = _compute(closes)
+    return panel
+
+
+def _compute(closes: pd.DataFrame):
+    """compute_indicators 본체, 마지막 행 기준 롤링 상태도 함께 반환"""
+    values = closes.to_numpy(dtype=np.float64)
+    observed = ~np.isnan(values)
+    count = observed.sum(axis=0)
+    order, c = _compact(values)
+    frame = pd.DataFrame(c)
+
+    results = {'close': c}
+    for w in MA_WINDOWS:
+        results[f'ma{w}'] = frame.rolling(w, min_periods=w).mean().to_numpy()
+
+    diff = frame.diff()
+    gain = diff.clip(lower=0).ewm(alpha=1 / RSI_PERIOD, adjust=False).mean().to_numpy()
+    loss = (-diff).clip(lower=0).ewm(alpha=1 / RSI_PERIOD, adjust=False).mean().to_numpy()
+    diffs_seen = np.arange(len(c))[:, None]  # 압축 행 i까지의 변화량 개수
+    results['rsi'] = np.where(diffs_seen >= RSI_PERIOD, _rsi(gain, loss), np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_returns = np.log(frame).diff()
+    results['volatility'] = (log_returns.rolling(VOL_WINDOW, min_periods=VOL_WINDOW).std()
+                             .to_numpy() * np.sqrt(TRADING_DAYS) * 100)
+    results['drawdown'] = (c / np.fmax.accumulate(c, axis=0) - 1) * 100
+    mean = frame.rolling(ZSCORE_WINDOW, min_periods=ZSCORE_WINDOW).mean().to_numpy()
+    std = frame.rolling(ZSCORE_WINDOW, min_periods=ZSCORE_WINDOW).std().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        results['zscore'] = np.where(std > 0, (c - mean) / std, np.nan)
+
+    panel = {name: pd.DataFrame(_scatter(order, results[name], observed), index=closes.index, columns=closes.columns)
+             for name in INDICATORS}
+
+    # 롤링 상태: 티커별 마지막 관측치 위치에서 추출
+    last = np.maximum(count - 1, 0)[None, :]
+    rows = count[None, :] - TAIL + np.arange(TAIL)[:, None]
+    tail = np.where(rows >= 0, np.take_along_axis(c, np.clip(rows, 0, None), axis=0), np.nan) if len(c) else \
+        np.full((TAIL, values.shape[1]), np.nan)
+    has_diff = count >= 2
+    state = IndicatorState(
+        tickers=list(closes.columns),
+        date=closes.index[-1] if len(closes) else pd.Timestamp(0),
+        tail=tail,
+        count=count,
+        avg_gain=np.where(has_diff, np.take_along_axis(gain, last, axis=0)[0], 0.0) if len(c) else np.zeros(len(count)),
+        avg_loss=np.where(has_diff, np.take_along_axis(loss, last, axis=0)[0], 0.0) if len(c) else np.zeros(len(count)),
+        peak=np.fmax.reduce(c, axis=0) if len(c) else np.full(len(count), np.nan),
+    )
+    return panel, state
+
+
+def step(state: IndicatorState, bar: np.ndarray) -> IndicatorState:
+    """
+    새 봉 하나를 롤링 상태에 반영 (티커 축 벡터 연산, 봉이 없는 티커는 그대로)
+
+    Args:
+        state: 직전 상태
+        bar: 티커별 종가 (봉이 없으면 NaN)
+    """
+    bar = np.asarray(bar, dtype=np.float64)
+    mask = ~np.isnan(bar)
+    tail = state.tail.copy()
+    tail[:, mask] = np.vstack([tail[1:, mask], bar[mask]])
+
+    diff = bar - state.tail[-1]
+    gain, loss = np.clip(diff, 0, None), np.clip(-diff, 0, None)
+    seed = mask & (state.count == 1)          # 첫 변화량은 그대로 시작값
+    update = mask & (state.count >= 2)
+    alpha = 1 / RSI_PERIOD
+    avg_gain = np.where(seed, gain, np.where(update, state.avg_gain + alpha * (gain - state.avg_gain), state.avg_gain))
+    avg_loss = np.where(seed, loss, np.where(update, state.avg_loss + alpha * (loss - state.avg_loss), state.avg_loss))
+
+    return IndicatorState(state.tickers, state.date, tail, state.count + mask, avg_gain, avg_loss,
+                          np.where(mask, np.fmax(state.peak, bar), state.peak))
+
+
+def snapshot(state: IndicatorState) -> pd.DataFrame:
+    """
+    롤링 상태에서 티커별 최신 지표 (각 티커의 마지막 봉 기준)
+
+    Returns:
+        DataFrame: 티커 × INDICATORS
+    """
+    tail, count = state.tail, state.count
+    close = tail[-1]
+    result = {'close': close}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for w in MA_WINDOWS:
+            result[f'ma{w}'] = np.where(count >= w, tail[-w:].mean(axis=0), np.nan)
+        result['rsi'] = np.where(count > RSI_PERIOD, _rsi(state.avg_gain, state.avg_loss), np.nan)
+        log_returns = np.diff(np.log(tail[-(VOL_WINDOW + 1):]), axis=0)
+        result['volatility'] = np.where(count > VOL_WINDOW, log_returns.std(axis=0, ddof=1), np.nan) \
+            * np.sqrt(TRADING_DAYS) * 100
+        result['drawdown'] = (close / state.peak - 1) * 100
+        window = tail[-ZSCORE_WINDOW:]
+        std = window.std(axis=0, ddof=1)
+        result['zscore'] = np.where((count >= ZSCORE_WINDOW) & (std > 0), (close - window.mean(axis=0)) / std, np.nan)
+    return pd.DataFrame(result, index=pd.Index(state.tickers, name='ticker'))[INDICATORS]
+
+
+def trend_label(close: float, ma: float) -> str:
+    """종가 vs 이동평균 추세 라벨 (이평이 아직 없으면 하락)"""
+    return "상승 🐂" if close > ma else "하락 🐻"
+
+
+def _download_chunk(tickers: List[str], period: str) -> Dict[str, pd.Series]:
+    """티커 묶음 하나의 일봉 종가 (리미터 슬롯 하나 안에서 순차 요청)"""
+    with get_limiter(YAHOO_HOST).slot(requests=len(tickers)):
+        data = yf.download(list(tickers), period=period, interval="1d", group_by='column',
+                           progress=False, threads=False, auto_adjust=False)
+    if data is None or data.empty:
+        return {}
+    closes = data['Close']
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(tickers[0])
+    return {ticker: closes[ticker] for ticker in closes.columns}
+
+
+def download_closes(tickers: List[str], period: str = FULL_PERIOD) -> pd.DataFrame:
+    """
+    yfinance 일봉 종가 → 날짜 × 티커 행렬 (조회 실패 티커는 전부 NaN)
+
+    DOWNLOAD_CHUNK개씩 나눠 묶음마다 슬롯을 잡으므로 동시 요청 수는 호스트 리미터가 정한다.
+    """
+    tickers = list(tickers)
+    chunks = [tickers[i:i + DOWNLOAD_CHUNK] for i in range(0, len(tickers), DOWNLOAD_CHUNK)]
+    series = {}
+    if chunks:
+        workers = min(len(chunks), get_limiter(YAHOO_HOST).max_limit)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="closes") as executor:
+            for part in executor.map(lambda chunk: _download_chunk(chunk, period), chunks):
+                series.update(part)
+    if not series:
+        return pd.DataFrame(columns=tickers, dtype=np.float64)
+    return daily_closes(series).reindex(columns=tickers)
+
+
+class IndicatorEngine:
+    """
+    저장된 롤링 상태 기반 증분 지표 엔진
+
+    마지막 봉은 장중에 계속 바뀌므로 상태에는 그 직전 봉까지만 확정하고,
+    마지막 봉은 매번 임시로 얹어 최신 지표를 만든다.
+    """
+
+    def __init__(self, name: str, data_dir: str = "./data"):
+        """
+        Args:
+            name: 상태 파일 이름 (data/indicators/{name}.npz)
+            data_dir: 데이터 루트 디렉토리
+        """
+        self.name = name
+        self.path = os.path.join(data_dir, "indicators", f"{name}.npz")
+        self.state = IndicatorState.load(self.path)
+        self.last_stats: Dict = {}
+        self._lock = threading.Lock()
+
+    def _base_state(self, closes: pd.DataFrame) -> Optional[IndicatorState]:
+        """closes에 이어 붙일 수 있는 저장 상태, 불가능하면 None (티커 누락, 공백 구간, 과거 종가 수정)"""
+        state = self.state
+        if state is None or not set(closes.columns) <= set(state.tickers):
+            return None
+        if state.date not in closes.index or state.date >= closes.index[-1]:
+            return None
+        state = state.select(list(closes.columns))
+        # 티커별 마지막 확정 봉(state.date 이전 마지막 종가)이 달라졌으면(배당 조정 등) 전체 재계산.
+        # 휴장일이 달라 state.date 행이 비어 있는 티커도 직전 봉으로 비교한다
+        committed = closes.loc[:state.date].ffill().iloc[-1].to_numpy(dtype=np.float64)
+        held = state.tail[-1]
+        if np.any(~np.isnan(committed) & np.isnan(held)):
+            return None     # 상태에 없는 과거 봉이 새로 생김
+        seen = ~np.isnan(committed) & ~np.isnan(held)
+        if not np.allclose(committed[seen], held[seen], rtol=1e-6):
+            return None
+        return state
+
+    def can_extend(self, tickers: List[str]) -> bool:
+        """저장 상태가 있는 티커인지 (짧은 기간만 조회해도 되는지 판단용)"""
+        return self.state is not None and set(tickers) <= set(self.state.tickers)
+
+    def update(self, closes: pd.DataFrame) -> pd.DataFrame:
+        """
+        새 봉을 반영한 최신 지표
+
+        저장 상태에 이어 붙일 수 있으면 이후 봉만 단계적으로 반영하고,
+        아니면 closes 전체로 다시 계산한다 (이때 closes는 충분한 기간이어야 함).
+
+        Args:
+            closes: 날짜 × 티커 종가 (daily_closes 결과)
+
+        Returns:
+            DataFrame: 티커 × INDICATORS
+        """
+        started = time.perf_counter()
+        closes = closes.sort_index()
+        if closes.empty:
+            return pd.DataFrame(columns=INDICATORS, index=pd.Index(closes.columns, name='ticker'))
+
+        with self._lock:
+            base = self._base_state(closes)
+            if base is None:
+                _, state = _compute(closes.iloc[:-1])
+                mode, pending = 'full', closes.iloc[-1:]
+            else:
+                state = base
+                mode, pending = 'incremental', closes.loc[closes.index > base.date]
+
+            # 마지막 봉 직전까지 확정
+            for date, bar in zip(pending.index[:-1], pending.to_numpy(dtype=np.float64)[:-1]):
+                state = step(state, bar)
+                state.date = date
+            if self.state is None or mode == 'full' or state.date != self.state.date \
+                    or state.tickers != self.state.tickers:
+                self.state = state
+                state.save(self.path)
+
+            latest = snapshot(step(state, pending.to_numpy(dtype=np.float64)[-1]))
+        self.last_stats = {'mode': mode, 'bars': len(closes) if mode == 'full' else len(pending),
+                           'tickers': len(closes.columns), 'ms': (time.perf_counter() - started) * 1000}
+        return latest
+
+    def refresh(self, tickers: List[str], fetch_closes: Callable[[List[str], str], pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        상태가 있으면 최근 구간만, 없으면 1년치를 조회해서 갱신
+
+        Args:
+            tickers: 대상 티커
+            fetch_closes: (티커 목록, yfinance period) → 날짜 × 티커 종가, 기본은 download_closes
+        """
+        fetch_closes = fetch_closes or download_closes
+        tickers = list(tickers)
+        if self.can_extend(tickers):
+            closes = fetch_closes(tickers, INCREMENTAL_PERIOD)
+            with self._lock:
+                extendable = self._base_state(closes) is not None
+            if extendable:
+                return self.update(closes)
+        return self.update(fetch_closes(tickers, FULL_PERIOD))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="기술적 지표 (증분 상태 기반)")
+    parser.add_argument("tickers", nargs="+", help="yfinance 티커")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--name", default="cli", help="상태 파일 이름")
+    args = parser.parse_args()
+
+    engine = IndicatorEngine(args.name, args.data_dir)
+    result = engine.refresh(args.tickers)
+    print(result.rename(columns=INDICATOR_LABELS).round(2).to_string())
+    print(f"[STATS] {engine.last_stats}")
@@ -0,0 +1,449 @@
+"""
+Load Test Harness
+tempo.py 동시 세션 부하 테스트 (네트워크 불필요)
+
+Streamlit AppTest로 앱을 헤드리스 실행하고, 외부 데이터 소스(yfinance,
+Google News RSS, 타임폴리오 PDF 페이지)는 합성 데이터 또는 저장된 HTML로 대체한다.
+N개 세션이 메뉴 페이지를 돌아가며 전환할 때의 rerun 지연 백분위수,
+세션별 CPU 시간과 메모리를 보고한다.
+
+사용법:
+    python loadtest.py --sessions 20 --rounds 3
+    python loadtest.py --sessions 8 --mode process          # 세션별 프로세스 격리 (세션별 peak RSS)
+    python loadtest.py --replay ./recorded_pages            # idx_{idx}.html 형식의 저장된 PDF 페이지 사용
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tempo.py")
+PDF_BUTTON = "데이터 분석 및 리밸런싱 요약"  # PDF 페이지 분석 버튼 라벨
+sys.path.insert(0, os.path.dirname(APP_PATH))
+
+# 합성 보유종목 유니버스
+UNIVERSE = [
+    ('NVDA US EQUITY', 'NVIDIA'), ('AAPL US EQUITY', 'Apple'), ('MSFT US EQUITY', 'Microsoft'),
+    ('AMZN US EQUITY', 'Amazon'), ('GOOGL US EQUITY', 'Alphabet'), ('META US EQUITY', 'Meta'),
+    ('TSLA US EQUITY', 'Tesla'), ('AVGO US EQUITY', 'Broadcom'), ('LLY US EQUITY', 'Eli Lilly'),
+    ('NVO US EQUITY', 'Novo Nordisk'), ('TSM US EQUITY', 'TSMC'), ('AMD US EQUITY', 'AMD'),
+    ('PLTR US EQUITY', 'Palantir'), ('BRK/B US EQUITY', 'Berkshire'), ('COST US EQUITY', 'Costco'),
+    ('NFLX US EQUITY', 'Netflix'), ('RKLB US EQUITY', 'Rocket Lab'), ('LMT US EQUITY', 'Lockheed'),
+    ('CCJ CT EQUITY', 'Cameco'), ('CA13321L1085', 'Cameco ISIN'), ('ESZ5 Index', 'S&P500 선물'),
+    ('005930', '삼성전자'), ('000660', 'SK하이닉스'), ('207940', '삼성바이오로직스'),
+] + [(f'T{i:03d} US EQUITY', f'Synthetic {i:03d}') for i in range(60)]
+
+
+def _seed(*parts) -> int:
+    return int(hashlib.md5("|".join(map(str, parts)).encode()).hexdigest()[:8], 16)
+
+
+# ---------------------------------------------------------
+# 합성 데이터 소스
+# ---------------------------------------------------------
+
+class StubConfig:
+    """스텁 동작 설정 (업스트림 지연 모사)"""
+    latency = 0.05
+    replay_dir = None
+
+
+def _sleep():
+    if StubConfig.latency:
+        time.sleep(StubConfig.latency * (0.5 + random.random()))
+
+
+def synthetic_pdf_html(idx: str, date: str) -> str:
+    """ETF/날짜별 결정적인 합성 PDF 페이지"""
+    if StubConfig.replay_dir:
+        for name in (f"idx_{idx}_{date}.html", f"idx_{idx}.html"):
+            path = os.path.join(StubConfig.replay_dir, name)
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    return f.read()
+
+    rng = np.random.default_rng(_seed(idx))
+    picks = rng.choice(len(UNIVERSE), size=int(rng.integers(20, 45)), replace=False)
+    day_rng = np.random.default_rng(_seed(idx, date))
+    values = rng.uniform(1e8, 5e9, len(picks)) * day_rng.uniform(0.97, 1.03, len(picks))
+    # 날짜마다 일부 종목 수량 조정 (리밸런싱 모사)
+    quantities = (values / rng.uniform(1e4, 5e5, len(picks))).astype(np.int64)
+    quantities = np.where(day_rng.random(len(picks)) < 0.1, (quantities * 1.2).astype(np.int64), quantities)
+    cash = 3e8
+    total = values.sum() + cash
+
+    rows = []
+    for pos, qty, value in zip(picks, quantities, values):
+        code, name = UNIVERSE[pos]
+        rows.append((code, name, int(qty), int(value), value / total * 100))
+    rows.append(('', '현금', int(cash), int(cash), cash / total * 100))
+    body = "".join(f"<tr><td>{c}</td><td>{n}</td><td>{q:,}</td><td>{v:,}</td><td>{w:.2f}</td></tr>"
+                   for c, n, q, v, w in rows)
+    return f'<html><body><table class="table3"><tbody>{body}</tbody></table></body></html>'
+
+
+def synthetic_history(symbol: str, period: str = "1y") -> pd.DataFrame:
+    """티커별 결정적인 합성 일봉"""
+    days = {'5d': 5, '1mo': 22, '3mo': 63, '6mo': 126, '1y': 252, '2y': 504, '5y': 1260}.get(period, 252)
+    rng = np.random.default_rng(_seed(symbol))
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, days)))
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days, tz='America/New_York')
+    return pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99,
+                         'Close': close, 'Volume': rng.integers(1e5, 1e7, days)}, index=index)
+
+
+class FakeTicker:
+    """yfinance.Ticker 대체"""
+
+    def __init__(self, symbol, session=None, **kwargs):
+        self.ticker = symbol
+
+    def history(self, period="1mo", **kwargs):
+        _sleep()
+        return synthetic_history(self.ticker, period)
+
+    @property
+    def info(self):
+        _sleep()
+        rng = np.random.default_rng(_seed(self.ticker, 'info'))
+        price = float(synthetic_history(self.ticker, '5d')['Close'].iloc[-1])
+        return {
+            'longName': f"{self.ticker} Inc.", 'currentPrice': price, 'previousClose': price,
+            'targetMeanPrice': price * rng.uniform(0.9, 1.4), 'marketCap': rng.uniform(1e10, 3e12),
+            'fiftyTwoWeekHigh': price * 1.2, 'trailingPE': rng.uniform(10, 60), 'forwardPE': rng.uniform(10, 40),
+            'pegRatio': rng.uniform(0.5, 3), 'priceToBook': rng.uniform(1, 20),
+            'priceToSalesTrailing12Months': rng.uniform(1, 30), 'returnOnEquity': rng.uniform(0, 0.6),
+            'profitMargins': rng.uniform(0, 0.5), 'dividendRate': rng.uniform(0, 0.03), 'beta': rng.uniform(0.5, 2),
+            'sector': rng.choice(['Technology', 'Healthcare', 'Industrials', 'Consumer Cyclical']),
+            'longBusinessSummary': "Synthetic company used by the load test harness.",
+        }
+
+
+def fake_download(tickers, period="1mo", **kwargs):
+    """yfinance.download 대체 (배치 1회 = 지연 1회)"""
+    _sleep()
+    symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+    closes = pd.concat({s: synthetic_history(s, period)['Close'] for s in symbols}, axis=1)
+    return pd.concat({'Close': closes}, axis=1)
+
+
+def fake_feed(url, *args, **kwargs):
+    """feedparser.parse 대체"""
+    import feedparser
+
+    _sleep()
+    rng = np.random.default_rng(_seed(url))
+    entries = []
+    for i in range(20):
+        ident = f"{_seed(url, i):08x}"
+        entries.append(feedparser.FeedParserDict({
+            'id': ident, 'title': f"Synthetic headline {ident} about {UNIVERSE[int(rng.integers(len(UNIVERSE)))][1]}",
+            'link': f"https://news.example.com/{ident}",
+            'published': pd.Timestamp.now(tz='UTC').strftime('%a, %d %b %Y %H:%M:%S GMT'),
+            'source': feedparser.FeedParserDict({'title': 'Stub News'}),
+        }))
+    return feedparser.FeedParserDict({'entries': entries})
+
+
+def install_stubs(latency: float = 0.05, replay_dir: str = None):
+    """외부 데이터 소스를 합성 데이터로 교체 (프로세스 전역)"""
+    import feedparser
+    import yfinance
+    import etf_monitor
+
+    StubConfig.latency = latency
+    StubConfig.replay_dir = replay_dir
+
+    yfinance.Ticker = FakeTicker
+    yfinance.download = fake_download
+    feedparser.parse = fake_feed
+
+    def fetch_page(self, date, conditional=False):
+        _sleep()
+        return synthetic_pdf_html(self.idx, date), {}
+
+    etf_monitor.ActiveETFMonitor._fetch_page = fetch_page
+    etf_monitor.yf = yfinance
+
+
+# ---------------------------------------------------------
+# 계측
+# ---------------------------------------------------------
+
+_current = threading.local()
+
+
+def install_instrumentation():
+    """
+    AppTest 실행을 계측
+
+    - 세션 간 st.cache_data 공유: AppTest는 run마다 새 캐시 저장소를 만들므로
+      실제 서버처럼 하나의 저장소를 공유하도록 교체
+    - 세션별 CPU: 스크립트 스레드의 thread CPU 시간을 세션에 귀속
+    - 스크립트 컴파일 직렬화: AppTest는 세션마다 ScriptCache를 따로 두어 여러 스레드가
+      동시에 compile()을 호출하는데, Python 3.11에서는 이때 간헐적으로
+      "AST constructor recursion depth mismatch"가 나서 빈 화면이 된다
+      (실제 서버는 ScriptCache 하나를 공유하므로 생기지 않는 문제)
+    - Runtime 공유: AppTest는 run마다 전역 Runtime._instance를 설정했다가 None으로
+      되돌리므로, 먼저 끝난 세션이 아직 실행 중인 세션의 Runtime을 지우지 않도록
+      마지막으로 설정된 Runtime을 계속 사용
+    """
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    shared_storage = MemoryCacheStorageManager()
+    app_test.MemoryCacheStorageManager = lambda: shared_storage
+
+    original_init = LocalScriptRunner.__init__
+    original_thread = LocalScriptRunner._run_script_thread
+
+    def init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self._loadtest_session = getattr(_current, 'session', None)
+
+    def run_script_thread(self):
+        started = time.thread_time()
+        try:
+            original_thread(self)
+        finally:
+            session = getattr(self, '_loadtest_session', None)
+            if session is not None:
+                session['cpu'] += time.thread_time() - started
+
+    LocalScriptRunner.__init__ = init
+    LocalScriptRunner._run_script_thread = run_script_thread
+
+    compile_lock = threading.Lock()
+    original_get_bytecode = ScriptCache.get_bytecode
+
+    def get_bytecode(self, script_path):
+        with compile_lock:
+            return original_get_bytecode(self, script_path)
+
+    ScriptCache.get_bytecode = get_bytecode
+
+    last_runtime = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last_runtime['runtime'] = cls._instance
+            return cls._instance
+        if 'runtime' in last_runtime:
+            return last_runtime['runtime']
+        raise RuntimeError("Runtime hasn't been created!")
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or 'runtime' in last_runtime)
+
+
+def current_rss_mb() -> float:
+    """현재 프로세스 RSS (MB)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakSampler:
+    """백그라운드에서 RSS 최대치 샘플링"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# ---------------------------------------------------------
+# 세션 시나리오
+# ---------------------------------------------------------
+
+def run_session(session_id: int, rounds: int, pdf_timeout: float = 60.0) -> Dict:
+    """
+    세션 하나: 메뉴 페이지를 순서대로(세션마다 시작 위치를 달리하여) rounds회 순회
+
+    PDF 페이지에서는 분석 버튼을 누르고 백그라운드 분석이 끝날 때까지 rerun 한다.
+
+    Returns:
+        {'id', 'cpu', 'wall', 'samples': [(page, latency_sec)], 'errors': [...], 'harness_errors': [...]}
+    """
+    from streamlit.testing.v1 import AppTest
+
+    session = {'id': session_id, 'cpu': 0.0, 'wall': 0.0, 'samples': [], 'errors': [], 'harness_errors': []}
+    _current.session = session
+    started = time.perf_counter()
+    rng = random.Random(session_id)
+
+    def timed(label, action):
+        t0 = time.perf_counter()
+        try:
+            at = action()
+        except KeyError as e:
+            # AppTest 위젯 상태의 스레드 경합 (하네스 문제): 지연 표본 없이 새 AppTest로 이어서 진행
+            # 앱 타임아웃/예외 등 그 밖의 오류는 그대로 전파
+            session['harness_errors'].append(f"{label}: {type(e).__name__}: {str(e)[:200]}")
+            return AppTest.from_file(APP_PATH, default_timeout=120).run()
+        session['samples'].append((label, time.perf_counter() - t0))
+        for exc in at.exception:
+            session['errors'].append(f"{label}: {exc.value[:200]}")
+        return at
+
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at = timed('초기 로드', at.run)
+    pages = list(at.sidebar.radio[0].options)
+    offset = session_id % len(pages)
+
+    for _ in range(rounds):
+        for i in range(len(pages)):
+            page = pages[(offset + i) % len(pages)]
+            at = timed(page, lambda: at.sidebar.radio[0].set_value(page).run())
+
+            if page.startswith("📊"):
+                # 임의의 ETF 선택 후 분석 실행, 결과가 채워질 때까지 폴링
+                if len(at.selectbox) >= 2:
+                    at = timed(f"{page} (ETF 선택)", lambda: at.selectbox[1].set_value(
+                        rng.choice(at.selectbox[1].options)).run())
+                # 스크립트 컴파일 경합 등으로 빈 화면이 오면 한 번 다시 실행
+                if not [b for b in at.main.button if b.label == PDF_BUTTON]:
+                    session['errors'].append(f"{page}: 분석 버튼 없음 (빈 rerun)")
+                    at = timed(page, at.run)
+                buttons = [b for b in at.main.button if b.label == PDF_BUTTON]
+                if not buttons:
+                    continue
+                at = timed(f"{page} (수집)", lambda: buttons[0].click().run())
+                deadline = time.perf_counter() + pdf_timeout
+                while any("수집 중" in i.value for i in at.info) and time.perf_counter() < deadline:
+                    time.sleep(0.2)
+                    at = timed(f"{page} (분석 폴링)", at.run)
+
+    session['wall'] = time.perf_counter() - started
+    _current.session = None
+    return session
+
+
+def _process_session(args):
+    """프로세스 격리 모드의 세션 진입점"""
+    session_id, rounds, workdir, latency, replay_dir = args
+    os.chdir(workdir)
+    install_stubs(latency, replay_dir)
+    install_instrumentation()
+    session = run_session(session_id, rounds)
+    session['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return session
+
+
+def summarize(sessions: List[Dict]) -> pd.DataFrame:
+    """페이지별 rerun 지연 백분위수 (ms)"""
+    samples = pd.DataFrame([(page, latency * 1000) for s in sessions for page, latency in s['samples']],
+                           columns=['페이지', 'latency_ms'])
+    grouped = samples.groupby('페이지')['latency_ms']
+    report = pd.DataFrame({
+        'rerun 수': grouped.size(),
+        'p50': grouped.quantile(0.50),
+        'p90': grouped.quantile(0.90),
+        'p95': grouped.quantile(0.95),
+        'p99': grouped.quantile(0.99),
+        'max': grouped.max(),
+    })
+    overall = samples['latency_ms']
+    report.loc['전체'] = [len(overall), overall.quantile(0.5), overall.quantile(0.9),
+                        overall.quantile(0.95), overall.quantile(0.99), overall.max()]
+    return report.round(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tempo.py 동시 세션 부하 테스트")
+    parser.add_argument("--sessions", type=int, default=20, help="동시 세션 수")
+    parser.add_argument("--rounds", type=int, default=2, help="세션당 메뉴 순회 횟수")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread",
+                        help="thread: 한 서버 프로세스 안의 세션 (캐시 공유), process: 세션별 프로세스")
+    parser.add_argument("--latency-ms", type=float, default=50, help="스텁 업스트림 응답 지연 (ms)")
+    parser.add_argument("--replay", help="저장된 PDF 페이지 디렉토리 (idx_{idx}.html / idx_{idx}_{date}.html)")
+    parser.add_argument("--keep-data", action="store_true", help="실행 후 임시 데이터 디렉토리 유지")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tempo_loadtest_")
+    replay_dir = os.path.abspath(args.replay) if args.replay else None
+    latency = args.latency_ms / 1000
+    print(f"[INFO] 세션 {args.sessions}개 × {args.rounds}회 순회, 모드 {args.mode}, 작업 디렉토리 {workdir}")
+
+    started = time.perf_counter()
+    if args.mode == "thread":
+        os.chdir(workdir)
+        install_stubs(latency, replay_dir)
+        install_instrumentation()
+        baseline = current_rss_mb()
+        with PeakSampler() as sampler, ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            sessions = list(pool.map(lambda i: run_session(i, args.rounds), range(args.sessions)))
+        peak, per_session = sampler.peak, (sampler.peak - baseline) / args.sessions
+    else:
+        import multiprocessing
+
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(args.sessions) as pool:
+            sessions = pool.map(_process_session, [(i, args.rounds, workdir, latency, replay_dir)
+                                                   for i in range(args.sessions)])
+        peak = max(s['peak_rss_mb'] for s in sessions)
+        per_session = float(np.mean([s['peak_rss_mb'] for s in sessions]))
+    elapsed = time.perf_counter() - started
+
+    print("\n[STATS] rerun 지연 (ms)")
+    print(summarize(sessions).to_string())
+
+    per = pd.DataFrame([{'세션': s['id'], 'rerun 수': len(s['samples']), 'CPU(s)': s['cpu'],
+                         '경과(s)': s['wall'], '오류': len(s['errors']),
+                         '하네스 오류': len(s['harness_errors'])} for s in sessions]).set_index('세션')
+    print("\n[STATS] 세션별 CPU")
+    print(per.describe().loc[['mean', '50%', 'max']].round(2).to_string())
+
+    print(f"\n[STATS] 전체 {elapsed:.1f}초, peak RSS {peak:.0f}MB, 세션당 메모리 {per_session:.1f}MB"
+          f" ({'peak 증가분/세션 수' if args.mode == 'thread' else '세션 프로세스 peak RSS 평균'})")
+
+    errors = [e for s in sessions for e in s['errors']]
+    if errors:
+        print(f"\n[WARN] 스크립트 예외 {len(errors)}건 (최대 5건 표시)")
+        for error in errors[:5]:
+            print(f"  - {error}")
+
+    harness_errors = [e for s in sessions for e in s['harness_errors']]
+    if harness_errors:
+        print(f"\n[WARN] 하네스 경합 {len(harness_errors)}건 (지연 표본에서 제외, 최대 5건 표시)")
+        for error in harness_errors[:5]:
+            print(f"  - {error}")
+
+    if not args.keep_data:
+        # 세션 종료 후에도 남아 있는 백그라운드 분석이 끝나기를 잠시 기다린 뒤 정리
+        time.sleep(1.0)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+News Archive
+수집한 뉴스를 모두 보관하는 로컬 전문검색(SQLite FTS5) 아카이브
+
+RSS를 가져올 때마다 새 항목만 추가하며(link/guid 기준 중복 제거),
+헤드라인을 회사명/티커로 검색할 수 있다.
+"""
+
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Dict, List
+
+import pandas as pd
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    id INTEGER PRIMARY KEY,
+    guid TEXT UNIQUE,
+    link TEXT UNIQUE,
+    title TEXT NOT NULL,
+    source TEXT,
+    published TEXT,
+    published_ts INTEGER,
+    topic TEXT,
+    fetched_at TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_news_published ON news (published_ts);
+CREATE INDEX IF NOT EXISTS ix_news_topic ON news (topic, published_ts);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+    title, source, content='news', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS news_ai AFTER INSERT ON news BEGIN
+    INSERT INTO news_fts (rowid, title, source) VALUES (new.id, new.title, new.source);
+END;
+CREATE TRIGGER IF NOT EXISTS news_ad AFTER DELETE ON news BEGIN
+    INSERT INTO news_fts (news_fts, rowid, title, source) VALUES ('delete', old.id, old.title, old.source);
+END;
+"""
+
+
+def _timestamp(published: str) -> int:
+    """RSS 발행일 문자열 → epoch 초 (파싱 실패 시 현재 시각)"""
+    try:
+        return int(parsedate_to_datetime(published).timestamp())
+    except (TypeError, ValueError):
+        return int(time.time())
+
+
+def build_match_query(text: str) -> str:
+    """
+    사용자 입력을 FTS5 MATCH 식으로 변환
+
+    각 단어는 따옴표로 감싼 접두어 검색이 되고 AND로 묶인다. 'OR'는 그대로 유지한다.
+    예) 'nvidia earnings' → '"nvidia"* "earnings"*'
+    """
+    terms = []
+    for token in re.findall(r'[^\s"]+', text or ''):
+        if token.upper() == 'OR':
+            if terms and terms[-1] != 'OR':
+                terms.append('OR')
+            continue
+        terms.append('"' + token.replace('"', '') + '"*')
+    while terms and terms[-1] == 'OR':
+        terms.pop()
+    return " ".join(terms)
+
+
+def holding_query(name: str, ticker: str = None) -> str:
+    """보유종목 뉴스 검색어 (종목명 또는 티커)"""
+    parts = [name.strip()] if name and name.strip() else []
+    if ticker and ticker.upper() not in (name or '').upper():
+        parts.append(ticker.split('.')[0].split('=')[0].lstrip('^'))
+    return " OR ".join(parts)
+
+
+class NewsArchive:
+    """뉴스 아카이브 (SQLite FTS5)"""
+
+    def __init__(self, db_path: str = "./data/news.db"):
+        """
+        Args:
+            db_path: SQLite 파일 경로
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def ingest(self, entries: List[Dict], topic: str = None) -> int:
+        """
+        RSS 항목 추가 (이미 있는 link/guid는 무시)
+
+        Args:
+            entries: feedparser 항목 또는 {'title', 'link', 'published', 'source', 'guid'} 딕셔너리
+            topic: 수집 토픽 (예: "AI & 반도체", "종목:NVIDIA")
+
+        Returns:
+            새로 추가된 항목 수
+        """
+        fetched_at = datetime.now().isoformat(timespec='seconds')
+        rows = []
+        for entry in entries:
+            link = entry.get('link')
+            title = entry.get('title')
+            if not link or not title:
+                continue
+            source = entry.get('source')
+            if isinstance(source, dict):
+                source = source.get('title')
+            published = entry.get('published', '')
+            rows.append((entry.get('guid') or entry.get('id') or link, link, title,
+                         source or "Google News", published, _timestamp(published), topic, fetched_at))
+
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.executemany("""
+                INSERT OR IGNORE INTO news (guid, link, title, source, published, published_ts, topic, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            return cursor.rowcount if rows else 0
+
+    def search(self, text: str, limit: int = 50, since: str = None) -> pd.DataFrame:
+        """
+        헤드라인 전문검색 (최신순)
+
+        Args:
+            text: 검색어 (단어 AND, 'OR' 지원, 접두어 일치)
+            limit: 최대 건수
+            since: 이 날짜(YYYY-MM-DD) 이후 발행분만
+
+        Returns:
+            DataFrame: title, link, source, published, topic
+        """
+        match = build_match_query(text)
+        if not match:
+            return pd.DataFrame(columns=['title', 'link', 'source', 'published', 'topic'])
+
+        sql = """
+            SELECT n.title, n.link, n.source, n.published, n.topic
+            FROM news_fts JOIN news n ON n.id = news_fts.rowid
+            WHERE news_fts MATCH ?
+        """
+        params = [match]
+        if since:
+            sql += " AND n.published_ts >= ?"
+            params.append(int(pd.Timestamp(since).timestamp()))
+        sql += " ORDER BY n.published_ts DESC LIMIT ?"
+        params.append(int(limit))
+
+        with closing(self._connect()) as conn, conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def timed_search(self, text: str, **kwargs):
+        """search 결과와 소요 시간(ms)"""
+        started = time.perf_counter()
+        result = self.search(text, **kwargs)
+        return result, (time.perf_counter() - started) * 1000
+
+    def count(self) -> int:
+        """보관 중인 전체 항목 수"""
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="뉴스 아카이브 검색")
+    parser.add_argument("query", help="검색어 (공백=AND, OR 지원)")
+    parser.add_argument("--db", default="./data/news.db")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    archive = NewsArchive(args.db)
+    results, elapsed = archive.timed_search(args.query, limit=args.limit)
+    print(results.to_string(index=False))
+    print(f"[STATS] {len(results)}/{archive.count()}건, {elapsed:.1f}ms")
@@ -0,0 +1,374 @@
+"""
+Report Site
+전 ETF 일일 리밸런싱 리포트를 정적 HTML 사이트로 미리 생성하는 모듈
+
+일일 수집이 끝난 뒤 ETF별 최신 저장일(vs 직전 저장일)의 format_summary, 변경 내역 표,
+파이/트리맵, 주요 종목 비중 추이 차트를 HTML 페이지로 만들고 목차(index.html)를 쓴다.
+읽기만 하는 사용자는 Streamlit 재실행/크롤링 없이 디스크의 파일을 그대로 보면 된다.
+
+- 증분 생성: (금일/직전 스냅샷 내용 해시, 수익률 모드, 렌더 버전)이 manifest.json에
+  기록된 키와 같으면 건너뛴다. 단, 시장 수익률을 받아야 할 종목이 yfinance 장애/마감으로
+  PDF 가격이나 0%로 대체된 페이지는 degraded로 표시해 다음 생성 때 다시 만든다
+- 병렬 생성: 분석(시장 수익률 조회)은 스레드, HTML 렌더링(Plotly 직렬화)은 프로세스 풀
+- plotly.js는 사이트에 한 번만 저장하고 모든 페이지가 공유한다 (외부 CDN 불필요)
+
+    python report_site.py                 # ./site 생성 (변경된 ETF만)
+    python report_site.py --serve 8000    # 생성 후 디스크에서 바로 제공
+"""
+
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+import pandas as pd
+
+import chart_data
+from etf_monitor import ActiveETFMonitor, ETF_CATEGORIES, ETF_NAMES
+from snapshot_store import SnapshotStore, atomic_write
+
+
+# 페이지 구성이 바뀌면 올려서 전체 재생성
+RENDER_VERSION = 1
+
+# 비중 추이 차트를 그릴 상위 종목 수 / 히스토리 저장일 수
+HISTORY_TOP_N = 5
+HISTORY_DAYS = 120
+
+PAGE_STYLE = """
+body { font-family: -apple-system, 'Malgun Gothic', 'Apple SD Gothic Neo', sans-serif; margin: 0 auto;
+       max-width: 1200px; padding: 24px; color: #222; }
+h1 { margin-bottom: 4px; } .muted { color: #777; font-size: 0.9em; }
+.metrics { display: flex; gap: 12px; margin: 16px 0; }
+.metric { flex: 1; border: 1px solid #eee; border-radius: 8px; padding: 12px; }
+.metric b { display: block; font-size: 1.6em; }
+.grid { display: grid; grid-template-columns: 1fr 1fr; gap: 16px; }
+table.data { border-collapse: collapse; width: 100%; font-size: 0.9em; }
+table.data th, table.data td { border-bottom: 1px solid #eee; padding: 4px 8px; text-align: right; }
+table.data th:first-child, table.data td:first-child { text-align: left; }
+pre { background: #f7f7f7; padding: 12px; border-radius: 8px; white-space: pre-wrap; }
+a { color: #e8590c; }
+"""
+
+
+def _page(title: str, body: str) -> str:
+    return (f"<!DOCTYPE html>\n<html lang=\"ko\"><head><meta charset=\"utf-8\">"
+            f"<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">"
+            f"<title>{html.escape(title)}</title><script src=\"plotly.min.js\"></script>"
+            f"<style>{PAGE_STYLE}</style></head><body>\n{body}\n</body></html>\n")
+
+
+def _table(df: pd.DataFrame, formats: Dict[str, str] = None) -> str:
+    if df.empty:
+        return "<p class=\"muted\">해당 종목 없음</p>"
+    out = df.copy()
+    for col, fmt in (formats or {}).items():
+        if col in out.columns:
+            out[col] = out[col].map(fmt.format)
+    return out.to_html(index=False, classes='data', border=0, escape=True)
+
+
+def _figure(fig) -> str:
+    if fig is None:
+        return "<p class=\"muted\">시각화할 데이터가 없습니다.</p>"
+    return fig.to_html(full_html=False, include_plotlyjs=False, config={'displaylogo': False})
+
+
+def _changes(stocks: List[Dict], columns: Dict[str, str], sort: str = None, ascending: bool = False) -> pd.DataFrame:
+    df = pd.DataFrame(stocks)
+    if df.empty:
+        return pd.DataFrame(columns=list(columns.values()))
+    if sort:
+        df = df.sort_values(sort, ascending=ascending)
+    return df[list(columns)].rename(columns=columns)
+
+
+def render_fund_page(job: Dict) -> Dict:
+    """
+    ETF 한 개의 리포트 페이지 생성 (프로세스 풀 작업 단위, 입력/출력은 피클 가능한 값만)
+
+    Args:
+        job: idx, name, date, prev_date, summary, analysis, df_today, history, path
+
+    Returns:
+        {'idx', 'path', 'bytes', 'seconds'}
+    """
+    started = time.perf_counter()
+    analysis, df_today, history = job['analysis'], job['df_today'], job['history']
+    name = job['name']
+    counts = {key: len(analysis[key]) for key in ('new_stocks', 'removed_stocks', 'increased_stocks', 'decreased_stocks')}
+
+    new = _changes(analysis['new_stocks'], {'종목명': '종목명', '비중_today': '현재(%)', '순수_비중변화': '순수변동(%p)'})
+    removed = _changes(analysis['removed_stocks'], {'종목명': '종목명', '비중_prev': '이전(%)', '순수_비중변화': '순수변동(%p)'})
+    change_columns = {'종목명': '종목명', '비중_prev': '이전(%)', '비중_today': '현재(%)', '순수_비중변화': '변동(%p)'}
+    increased = _changes(analysis['increased_stocks'], change_columns, '순수_비중변화', ascending=False)
+    decreased = _changes(analysis['decreased_stocks'], change_columns, '순수_비중변화', ascending=True)
+    pct = {'현재(%)': '{:.2f}', '이전(%)': '{:.2f}', '순수변동(%p)': '{:+.2f}', '변동(%p)': '{:+.2f}'}
+
+    holdings = df_today[['종목코드', '종목명', '수량', '평가금액', '비중']].copy()
+    holdings.columns = ['종목코드', '종목명', '수량', '평가금액', '비중(%)']
+
+    top_names = (df_today[df_today['종목명'] != '현금'].sort_values('비중', ascending=False)
+                 ['종목명'].astype(str).head(HISTORY_TOP_N))
+    history_charts = "".join(_figure(chart_data.build_history_figure(history, stock))
+                             for stock in top_names) if not history.empty else ""
+
+    sources = pd.Series(analysis.get('return_sources', {}), dtype=object).value_counts()
+    body = f"""
+<p><a href="index.html">← 전체 ETF</a></p>
+<h1>{html.escape(name)}</h1>
+<p class="muted">기준 {job['date']} vs {job['prev_date']} · 수익률 소스 {html.escape(', '.join(f'{k} {v}' for k, v in sources.items()))}
+ · 생성 {job['generated_at']}</p>
+<div class="metrics">
+  <div class="metric">신규 편입<b>{counts['new_stocks']}</b></div>
+  <div class="metric">완전 편출<b>{counts['removed_stocks']}</b></div>
+  <div class="metric">비중 확대<b>{counts['increased_stocks']}</b></div>
+  <div class="metric">비중 축소<b>{counts['decreased_stocks']}</b></div>
+</div>
+<h2>요약</h2>
+<pre>{html.escape(job['summary'])}</pre>
+<div class="grid">
+  <div><h3>🟢 신규 편입</h3>{_table(new, pct)}</div>
+  <div><h3>🔴 완전 편출</h3>{_table(removed, pct)}</div>
+  <div><h3>🔼 비중 확대</h3>{_table(increased, pct)}</div>
+  <div><h3>🔽 비중 축소</h3>{_table(decreased, pct)}</div>
+</div>
+<h2>포트폴리오</h2>
+<div class="grid">
+  <div>{_figure(chart_data.build_pie_figure(df_today))}</div>
+  <div>{_table(holdings, {'수량': '{:,}', '평가금액': '{:,}', '비중(%)': '{:.2f}'})}</div>
+</div>
+{_figure(chart_data.build_treemap_figure(df_today, name))}
+<h2>주요 종목 비중 추이 (최근 {HISTORY_DAYS}개 저장일)</h2>
+{history_charts}
+"""
+    page = _page(f"{name} 리밸런싱 리포트 {job['date']}", body)
+
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(page)
+    atomic_write(job['path'], write)
+    return {'idx': job['idx'], 'path': job['path'], 'bytes': len(page.encode('utf-8')),
+            'seconds': time.perf_counter() - started}
+
+
+class ReportSite:
+    """ETF별 정적 리포트 + 목차 생성기"""
+
+    def __init__(self, data_dir: str = "./data", out_dir: str = "./site", offline: bool = False):
+        """
+        Args:
+            data_dir: 데이터 루트 디렉토리 (idx_*/ 스냅샷)
+            out_dir: 사이트 출력 디렉토리
+            offline: True면 시장 수익률을 조회하지 않고 PDF 가격으로 분석
+        """
+        self.data_dir = data_dir
+        self.out_dir = out_dir
+        self.offline = offline
+        self.manifest_path = os.path.join(out_dir, "manifest.json")
+
+    def _load_manifest(self) -> Dict:
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, encoding='utf-8') as f:
+                    return json.load(f)
+            except ValueError:
+                return {}
+        return {}
+
+    def _monitor(self, idx: str) -> ActiveETFMonitor:
+        return ActiveETFMonitor(data_dir=self.data_dir, url=f"{ActiveETFMonitor.BASE_URL}?idx={idx}",
+                                etf_name=ETF_NAMES.get(idx))
+
+    def _render_key(self, monitor: ActiveETFMonitor, date: str, prev_date: str) -> str:
+        """페이지 입력의 지문 (스냅샷 내용 해시가 없으면 로드해서 계산)"""
+        def content_hash(d):
+            stored = monitor.get_content_hash(d)
+            return stored or monitor.compute_content_hash(monitor.load_data(d))
+        parts = [str(RENDER_VERSION), 'pdf' if self.offline else 'market', date, prev_date,
+                 content_hash(date), content_hash(prev_date)]
+        return hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()
+
+    def _degraded(self, analysis: Dict) -> bool:
+        """시장 수익률 모드인데 yfinance로 조회할 수 있는 종목이 PDF 가격/0%로 대체됐는지"""
+        if self.offline:
+            return False
+        return any(source in ('pdf', 'zero') and ActiveETFMonitor._ticker_from_code(code)
+                   for code, source in analysis.get('return_sources', {}).items())
+
+    def _prepare(self, idx: str, date: str, prev_date: str, key: str) -> Dict:
+        """분석 + 페이지 입력 준비 (스레드 작업 단위, 시장 수익률 조회 포함)"""
+        monitor = self._monitor(idx)
+        df_today, df_prev = monitor.load_data(date), monitor.load_data(prev_date)
+        if self.offline:
+            analysis = monitor.analyze_rebalancing(df_today, df_prev)
+        else:
+            analysis = monitor.analyze_rebalancing(df_today, df_prev, prev_date, date)
+        return {
+            'idx': idx, 'name': monitor.etf_name, 'date': date, 'prev_date': prev_date, 'key': key,
+            'summary': monitor.format_summary(analysis, df_today, date, prev_date),
+            'analysis': analysis, 'df_today': df_today, 'history': monitor.load_history(days=HISTORY_DAYS),
+            'path': os.path.join(self.out_dir, f"etf_{idx}.html"),
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        }
+
+    def build(self, idx: List[str] = None, force: bool = False, workers: int = None) -> Dict:
+        """
+        변경된 ETF 페이지만 다시 만들고 목차를 갱신
+
+        Args:
+            idx: 대상 ETF idx 목록, None이면 전체
+            force: True면 변경 여부와 관계없이 전부 재생성
+            workers: 렌더링 프로세스 수, None이면 CPU 수
+
+        Returns:
+            {'rendered', 'skipped', 'failed', 'seconds'}
+        """
+        started = time.perf_counter()
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._write_plotly_js()
+        manifest = self._load_manifest()
+
+        # 1) 변경 여부 판단 (해시 인덱스만 읽음, 스냅샷이 없는 ETF는 디렉토리도 만들지 않음)
+        pending, skipped, failed = [], [], {}
+        for etf in (idx or list(ETF_NAMES)):
+            dates = SnapshotStore(os.path.join(self.data_dir, f"idx_{etf}")).dates()
+            if len(dates) < 2:
+                continue
+            date, prev_date = dates[-1], dates[-2]
+            try:
+                key = self._render_key(self._monitor(etf), date, prev_date)
+            except Exception as e:
+                failed[etf] = f"{type(e).__name__}: {e}"
+                continue
+            entry = manifest.get(etf, {})
+            if (not force and entry.get('key') == key and not entry.get('degraded')
+                    and os.path.exists(os.path.join(self.out_dir, entry.get('file', '')))):
+                skipped.append(etf)
+            else:
+                pending.append((etf, date, prev_date, key))
+
+        # 2) 분석은 스레드 (시장 수익률 조회는 호스트 리미터가 동시성 조절)
+        jobs = []
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(pending))), thread_name_prefix="report") as executor:
+            futures = {executor.submit(self._prepare, *args): args[0] for args in pending}
+            for future, etf in futures.items():
+                try:
+                    jobs.append(future.result())
+                except Exception as e:
+                    failed[etf] = f"{type(e).__name__}: {e}"
+
+        # 3) 렌더링은 프로세스 풀 (Plotly 직렬화가 CPU 작업)
+        #    Streamlit 스레드에서 fork하면 잠긴 락을 물려받을 수 있으므로 spawn으로 띄우고,
+        #    페이지별로 제출해서 한 페이지가 실패해도 나머지와 manifest/목차는 그대로 쓴다
+        rendered = []
+        if jobs:
+            with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1),
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = [(job, executor.submit(render_fund_page, job)) for job in jobs]
+                for job, future in futures:
+                    try:
+                        rendered.append(future.result())
+                    except Exception as e:
+                        failed[job['idx']] = f"{type(e).__name__}: {e}"
+                        continue
+                    manifest[job['idx']] = {
+                        'key': job['key'], 'file': os.path.basename(job['path']), 'name': job['name'],
+                        'date': job['date'], 'prev_date': job['prev_date'], 'generated_at': job['generated_at'],
+                        'degraded': self._degraded(job['analysis']),
+                        'counts': {k: len(job['analysis'][k]) for k in
+                                   ('new_stocks', 'removed_stocks', 'increased_stocks', 'decreased_stocks')},
+                    }
+
+        def write_manifest(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        atomic_write(self.manifest_path, write_manifest)
+        self._write_index(manifest, failed)
+
+        stats = {'rendered': len(rendered), 'skipped': len(skipped), 'failed': len(failed),
+                 'seconds': time.perf_counter() - started}
+        for etf, error in failed.items():
+            print(f"[WARN] 리포트 생성 실패 (idx={etf}): {error}")
+        print(f"[STATS] 리포트 사이트: {stats}")
+        return stats
+
+    def _write_plotly_js(self):
+        path = os.path.join(self.out_dir, "plotly.min.js")
+        if os.path.exists(path):
+            return
+        from plotly.offline import get_plotlyjs
+
+        def write(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(get_plotlyjs())
+        atomic_write(path, write)
+
+    def _write_index(self, manifest: Dict, failed: Dict[str, str]):
+        sections = []
+        for category, funds in ETF_CATEGORIES.items():
+            rows = []
+            for fund_name, etf in funds.items():
+                entry = manifest.get(etf)
+                if not entry:
+                    continue
+                c = entry['counts']
+                rows.append(f"<tr><td><a href=\"{entry['file']}\">{html.escape(fund_name)}</a></td>"
+                            f"<td>{entry['date']}</td><td>{entry['prev_date']}</td>"
+                            f"<td>{c['new_stocks']}</td><td>{c['removed_stocks']}</td>"
+                            f"<td>{c['increased_stocks']}</td><td>{c['decreased_stocks']}</td>"
+                            f"<td>{entry['generated_at']}</td></tr>")
+            if rows:
+                sections.append(f"<h2>{html.escape(category)}</h2><table class=\"data\"><tr><th>ETF</th><th>기준일</th>"
+                                f"<th>비교일</th><th>편입</th><th>편출</th><th>확대</th><th>축소</th><th>생성</th></tr>"
+                                + "".join(rows) + "</table>")
+        errors = "".join(f"<li>{html.escape(ETF_NAMES.get(etf, etf))}: {html.escape(error)}</li>"
+                         for etf, error in failed.items())
+        body = (f"<h1>🍊 TIMEFOLIO Active ETF 일일 리밸런싱 리포트</h1>"
+                f"<p class=\"muted\">갱신 {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>"
+                + ("".join(sections) or "<p class=\"muted\">생성된 리포트가 없습니다.</p>")
+                + (f"<h3>생성 실패</h3><ul>{errors}</ul>" if errors else ""))
+        page = _page("TIMEFOLIO 일일 리포트", body)
+
+        def write(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(page)
+        atomic_write(os.path.join(self.out_dir, "index.html"), write)
+
+
+def serve(out_dir: str = "./site", host: str = "127.0.0.1", port: int = 8000):
+    """생성된 사이트를 디스크에서 그대로 제공"""
+    import functools
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=out_dir)
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"[OK] 리포트 사이트: http://{host}:{port}/ ({out_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="전 ETF 일일 리밸런싱 정적 리포트 생성")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--out-dir", default="./site")
+    parser.add_argument("--force", action="store_true", help="변경 여부와 관계없이 전부 재생성")
+    parser.add_argument("--offline", action="store_true", help="시장 수익률 대신 PDF 가격으로 분석")
+    parser.add_argument("--workers", type=int, help="렌더링 프로세스 수")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="생성 후 해당 포트로 사이트 제공")
+    args = parser.parse_args()
+
+    ReportSite(args.data_dir, args.out_dir, offline=args.offline).build(force=args.force, workers=args.workers)
+    if args.serve:
+        serve(args.out_dir, port=args.serve)
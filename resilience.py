@@ -0,0 +1,428 @@
+"""
+Resilience
+외부 데이터 소스 호출의 지연/장애를 제한하는 도구 모음
+
+- Deadline: 단계 전체에 대한 마감 시간
+- CircuitBreaker: 소스별 오류율이 임계치를 넘으면 호출을 차단하고 대체 경로 사용
+- AdaptiveLimiter: 호스트별 동시 요청 수를 지연/오류에 따라 자동 조절 (AIMD)
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+from singleflight import CallerTimeout
+
+
+class Deadline:
+    """단계 전체 마감 시간"""
+
+    def __init__(self, seconds: float):
+        """
+        Args:
+            seconds: 허용 시간 (초), None이면 무제한
+        """
+        self.seconds = seconds
+        self.started = time.monotonic()
+
+    def remaining(self) -> float:
+        """남은 시간 (초), 무제한이면 inf"""
+        if self.seconds is None:
+            return float('inf')
+        return max(0.0, self.seconds - (time.monotonic() - self.started))
+
+    def expired(self) -> bool:
+        """마감 여부"""
+        return self.remaining() <= 0
+
+    def elapsed(self) -> float:
+        """경과 시간 (초)"""
+        return time.monotonic() - self.started
+
+
+class CircuitBreaker:
+    """
+    소스별 서킷 브레이커
+
+    최근 window회 호출 중 오류 비율이 failure_rate 이상이면 (최소 min_calls회 이후)
+    open 상태가 되어 cooldown초 동안 호출을 거부한다. cooldown이 지나면 half-open으로
+    시험 호출 하나를 허용하고, 성공하면 close, 실패하면 다시 open 한다.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 6,
+                 window: int = 20, cooldown: float = 120.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._results = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """호출 허용 여부 (half-open에서는 시험 호출 하나만 허용)"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._results.append(True)
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._results.clear()
+
+    def record_neutral(self):
+        """소스 상태와 무관한 결과 (종목 데이터 없음 등): 오류율에 반영하지 않고 시험 호출만 반납"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._results.append(False)
+            if self._state == self.HALF_OPEN:
+                self._trip()
+                return
+            failures = self._results.count(False)
+            if (self._state == self.CLOSED and len(self._results) >= self.min_calls
+                    and failures / len(self._results) >= self.failure_rate):
+                self._trip()
+
+    def _trip(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        print(f"[WARN] 서킷 브레이커 open: {self.name} ({self.cooldown:.0f}초간 대체 경로 사용)")
+
+    def snapshot(self) -> Dict:
+        """현재 상태 요약"""
+        with self._lock:
+            self._maybe_half_open()
+            total = len(self._results)
+            failures = self._results.count(False)
+            return {
+                'state': self._state,
+                'calls': total,
+                'error_rate': failures / total if total else 0.0,
+            }
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """소스 이름별 프로세스 전역 서킷 브레이커"""
+    with _BREAKERS_LOCK:
+        if name not in _BREAKERS:
+            _BREAKERS[name] = CircuitBreaker(name, **kwargs)
+        return _BREAKERS[name]
+
+
+# 주요 외부 호스트 (리미터 이름)
+TIMEFOLIO_HOST = 'timefolioetf.co.kr'
+YAHOO_HOST = 'finance.yahoo.com'
+
+# 과부하로 보는 HTTP 상태 코드
+OVERLOAD_STATUS = {429, 502, 503, 504}
+
+
+def is_overload(exc: BaseException) -> bool:
+    """
+    예외가 상대 서버 과부하(스로틀링/타임아웃) 신호인지 판단
+
+    HTTP 429/5xx 게이트웨이 오류, 타임아웃, yfinance 요청 제한 오류를 과부하로 본다.
+    그 외(404, 파싱 오류 등)는 동시성과 무관한 오류로 취급한다.
+    """
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(exc, 'code', None)
+    if status in OVERLOAD_STATUS:
+        return True
+    if isinstance(exc, TimeoutError):
+        return True
+    names = ' '.join(cls.__name__ for cls in type(exc).__mro__)
+    if 'Timeout' in names or 'RateLimit' in names:
+        return True
+    message = str(exc)
+    return 'Too Many Requests' in message or 'Rate limited' in message
+
+
+class SlotTimeout(CallerTimeout):
+    """제한 슬롯을 기다리다 허용 시간을 넘김 (요청은 보내지 않음)"""
+
+
+class AdaptiveLimiter:
+    """
+    호스트별 적응형 동시성 제한 (AIMD + 지연 기울기)
+
+    - 제한까지 동시 요청이 차 있는 상태에서 성공하면 제한을 1/limit씩 늘린다
+      (제한만큼 성공할 때마다 +1)
+    - 429/타임아웃 등 과부하 오류가 나면 제한을 backoff배로 줄인다
+    - 최근 지연의 EWMA가 기준 지연의 tolerance배를 넘으면 서버가 느려진 것으로 보고
+      제한 × (기준 지연 × tolerance / EWMA)로 줄인다 (지연 기울기, 한 번에 slowdown배까지)
+    - 기준 지연은 최근 구간 하위 10% 지연이 내려가면 바로 따라가고, 올라가는 쪽은 슬롯에
+      여유가 있을 때(또는 제한이 최소일 때)의 요청으로만 drift 비율씩 따라간다
+      (과부하가 이어지는 동안 기준이 같이 올라가 감속 신호가 사라지는 것 방지)
+    - 한 번 줄인 뒤에는 최근 지연만큼 지나야 다시 줄인다 (같은 묶음의 오류로 연쇄 감소 방지)
+    """
+
+    def __init__(self, name: str, initial: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 backoff: float = 0.5, slowdown: float = 0.5, tolerance: float = 1.3,
+                 smoothing: float = 0.2, window: int = 100, drift: float = 0.001):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.slowdown = slowdown
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.drift = drift
+        self._limit = float(initial)
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._waiting = 0
+        self._latencies = deque(maxlen=window)
+        self._ewma = None
+        self._floor = None
+        self._last_decrease = 0.0
+        self._counts = {'ok': 0, 'overload': 0, 'error': 0, 'slowdown': 0}
+        self._peak = 0
+
+    @property
+    def limit(self) -> int:
+        """현재 동시 요청 제한"""
+        return max(self.min_limit, int(self._limit))
+
+    def acquire(self, timeout: float = None) -> bool:
+        """슬롯 하나 획득 (제한이 차 있으면 대기), timeout 초과 시 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._inflight >= self.limit:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self._inflight += 1
+                self._peak = max(self._peak, self._inflight)
+                return True
+            finally:
+                self._waiting -= 1
+
+    def release(self, latency: float, outcome: str = 'ok', saturated: bool = True):
+        """
+        슬롯 반환 + 결과 반영
+
+        Args:
+            latency: 요청 소요 시간 (초)
+            outcome: 'ok', 'overload' (429/타임아웃 등), 'error' (동시성과 무관한 오류)
+            saturated: 요청 시작 시 제한까지 슬롯이 차 있었는지 (차 있을 때만 제한을 늘림)
+        """
+        with self._cond:
+            self._inflight -= 1
+            self._counts[outcome] += 1
+            now = time.monotonic()
+            can_decrease = now - self._last_decrease >= (self._ewma or 0.0)
+
+            if outcome == 'overload':
+                if can_decrease:
+                    self._decrease(self.backoff, now)
+            elif outcome == 'ok':
+                self._latencies.append(latency)
+                self._ewma = latency if self._ewma is None else (
+                    self.smoothing * latency + (1 - self.smoothing) * self._ewma)
+                self._update_floor(rising=not saturated or self.limit <= self.min_limit)
+                gradient = self.tolerance * self._floor / self._ewma if self._ewma > 0 else 1.0
+                if len(self._latencies) >= 5 and gradient < 1.0:
+                    if can_decrease:
+                        self._counts['slowdown'] += 1
+                        self._decrease(max(self.slowdown, gradient), now)
+                elif saturated:
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            self._cond.notify_all()
+
+    def _baseline(self) -> float:
+        """최근 구간의 하위 10% 지연 (최솟값 하나의 이상치에 덜 민감)"""
+        ordered = sorted(self._latencies)
+        return ordered[len(ordered) // 10]
+
+    def _update_floor(self, rising: bool):
+        """기준 지연 갱신: 내려가면 바로, 올라가는 쪽은 rising일 때 drift 비율만큼만"""
+        recent = self._baseline()
+        if self._floor is None or recent < self._floor:
+            self._floor = recent
+        elif rising:
+            self._floor += (recent - self._floor) * self.drift
+
+    def _decrease(self, factor: float, now: float):
+        self._limit = max(float(self.min_limit), self._limit * factor)
+        self._last_decrease = now
+
+    @contextmanager
+    def slot(self, timeout: float = None, requests: int = 1):
+        """
+        요청 하나를 감싸는 슬롯 (소요 시간과 결과를 자동 반영)
+
+            with get_limiter(YAHOO_HOST).slot(timeout=budget.remaining()):
+                hist = yf.Ticker(symbol).history(period="5d")
+
+        블록 안의 예외는 is_overload로 과부하/일반 오류를 구분한 뒤 그대로 다시 던진다.
+
+        Args:
+            timeout: 슬롯 대기 허용 시간 (초), None/inf면 무제한. 넘기면 SlotTimeout
+            requests: 블록 안에서 차례로 보내는 요청 수 (지연은 요청당 평균으로 반영)
+        """
+        if timeout is not None and timeout == float('inf'):
+            timeout = None
+        if not self.acquire(timeout):
+            raise SlotTimeout(f"{self.name} 동시성 제한 대기 {timeout:.1f}초 초과")
+        with self._cond:
+            saturated = self._inflight >= self.limit
+        started = time.monotonic()
+        outcome = 'ok'
+        try:
+            yield self
+        except BaseException as e:
+            outcome = 'overload' if is_overload(e) else 'error'
+            raise
+        finally:
+            self.release((time.monotonic() - started) / max(1, requests), outcome, saturated)
+
+    def metrics(self) -> Dict:
+        """현재 제한/사용량/지연 요약"""
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'inflight': self._inflight,
+                'waiting': self._waiting,
+                'peak': self._peak,
+                'latency_ms': (self._ewma or 0.0) * 1000,
+                'baseline_ms': (self._floor or 0.0) * 1000,
+                **self._counts,
+            }
+
+
+_LIMITERS: Dict[str, AdaptiveLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(host: str, **kwargs) -> AdaptiveLimiter:
+    """호스트별 프로세스 전역 적응형 리미터"""
+    with _LIMITERS_LOCK:
+        if host not in _LIMITERS:
+            _LIMITERS[host] = AdaptiveLimiter(host, **kwargs)
+        return _LIMITERS[host]
+
+
+def limiter_metrics() -> Dict[str, Dict]:
+    """전체 리미터의 현재 상태 (호스트 → metrics)"""
+    with _LIMITERS_LOCK:
+        limiters = dict(_LIMITERS)
+    return {host: limiter.metrics() for host, limiter in limiters.items()}
+
+
+def _run_demo(requests_total: int, capacity: int, latency_ms: float, error_rate: float, workers: int):
+    """
+    로컬 대체 서버로 리미터 동작 확인
+
+    서버는 동시 요청이 capacity를 넘으면 초과분에 비례해 느려지고, 2배를 넘으면 429를 반환한다.
+    error_rate 비율로 무작위 500을 섞는다 (과부하가 아닌 오류).
+    """
+    import random
+    import urllib.error
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {'inflight': 0}
+    state_lock = threading.Lock()
+
+    class StandIn(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with state_lock:
+                state['inflight'] += 1
+                load = state['inflight']
+            try:
+                if load > capacity * 2:
+                    self.send_response(429)
+                elif random.random() < error_rate:
+                    self.send_response(500)
+                else:
+                    time.sleep(latency_ms / 1000 * max(1.0, load / capacity))
+                    self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            finally:
+                with state_lock:
+                    state['inflight'] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    limiter = AdaptiveLimiter('stand-in', initial=2, max_limit=workers)
+
+    def call(_):
+        try:
+            with limiter.slot():
+                urllib.request.urlopen(url, timeout=5).read()
+        except urllib.error.HTTPError:
+            pass
+
+    done = threading.Event()
+
+    def report():
+        while not done.wait(0.5):
+            m = limiter.metrics()
+            print(f"  limit={m['limit']:>2} inflight={m['inflight']:>2} latency={m['latency_ms']:.0f}ms "
+                  f"(기준 {m['baseline_ms']:.0f}ms) ok={m['ok']} 429={m['overload']} slow={m['slowdown']}")
+
+    started = time.monotonic()
+    threading.Thread(target=report, daemon=True).start()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(call, range(requests_total)))
+    done.set()
+    elapsed = time.monotonic() - started
+    server.shutdown()
+    print(f"[STATS] {requests_total}건 {elapsed:.1f}초 ({requests_total / elapsed:.0f} req/s), 최종 {limiter.metrics()}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="적응형 리미터 데모 (로컬 대체 서버)")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--capacity", type=int, default=8, help="서버가 느려지기 시작하는 동시 요청 수")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="무작위 500 비율")
+    parser.add_argument("--workers", type=int, default=32, help="클라이언트 스레드 수 (리미터 최대값)")
+    args = parser.parse_args()
+    _run_demo(args.requests, args.capacity, args.latency_ms, args.error_rate, args.workers)
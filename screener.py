@@ -0,0 +1,362 @@
+"""
+Fundamental Screener
+전 ETF 보유종목 합집합의 펀더멘털을 한 테이블로 모아 정렬/필터링하는 모듈
+
+- 유니버스: ETF별 최신 저장 스냅샷의 종목코드 → 티커 (현금/미지원 선물/미매핑 ISIN 제외)
+  국내 6자리 코드는 .KS로 먼저 조회하고 info가 없으면 .KQ(코스닥)로 다시 조회해 확인된 티커를 저장
+- 펀더멘털: 스카우터와 같은 yfinance info 필드를 병렬 조회해 SQLite에 보관
+  (티커별 조회 시각 기준으로 오래된 것만 다시 조회하는 증분 갱신)
+- 스크리닝: 합쳐진 테이블을 메모리에서 정렬/필터링 (외부 호출 없음)
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from etf_monitor import ActiveETFMonitor, ETF_NAMES, load_all_histories
+from resilience import Deadline, SlotTimeout, YAHOO_HOST, get_breaker, get_limiter
+from singleflight import SINGLE_FLIGHT
+
+
+# yfinance info 필드 → 테이블 컬럼
+INFO_FIELDS = {
+    'shortName': '종목명(영문)',
+    'sector': '섹터',
+    'currency': '통화',
+    'marketCap': '시가총액',
+    'currentPrice': '현재가',
+    'targetMeanPrice': '목표가',
+    'trailingPE': 'Trailing P/E',
+    'forwardPE': 'Forward P/E',
+    'pegRatio': 'PEG',
+    'priceToBook': 'PBR',
+    'priceToSalesTrailing12Months': 'PSR',
+    'returnOnEquity': 'ROE(%)',
+    'profitMargins': '순이익률(%)',
+    'operatingMargins': '영업이익률(%)',
+    'dividendYield': '배당수익률',
+    'beta': 'Beta',
+    'recommendationMean': '투자의견(1=매수)',
+    'numberOfAnalystOpinions': '애널리스트 수',
+}
+
+# 소수로 오는 비율 필드 (×100 해서 %로 표시)
+PERCENT_FIELDS = ['returnOnEquity', 'profitMargins', 'operatingMargins']
+
+# 정렬/범위 필터에 쓰는 수치 컬럼
+NUMERIC_COLUMNS = ['시가총액', '현재가', '목표가', '상승여력(%)', 'Trailing P/E', 'Forward P/E', 'PEG', 'PBR', 'PSR',
+                   'ROE(%)', '순이익률(%)', '영업이익률(%)', '배당수익률', 'Beta', '투자의견(1=매수)', '애널리스트 수',
+                   '보유 ETF 수', '합산 비중(%)']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fundamentals (
+    ticker TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    error TEXT,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS resolved (
+    ticker TEXT PRIMARY KEY,
+    resolved TEXT NOT NULL
+);
+"""
+
+
+def default_fetch_info(ticker: str) -> Dict:
+    """yfinance info 조회 (스카우터와 같은 소스)"""
+    return yf.Ticker(ticker).info
+
+
+def screener_ticker(code: str) -> Optional[str]:
+    """종목코드 → 스크리닝용 티커 (국내 6자리 코드는 일단 .KS, 지수/선물은 제외)"""
+    code = (code or '').strip()
+    if re.fullmatch(r'A?\d{6}', code):
+        return f"{code[-6:]}.KS"
+    ticker = ActiveETFMonitor._ticker_from_code(code) if code else None
+    if not ticker or ticker.startswith('^') or ticker.endswith('=F'):
+        return None
+    return ticker
+
+
+def ticker_candidates(ticker: str) -> List[str]:
+    """조회해 볼 티커 순서 (국내 .KS 티커는 코스닥 .KQ도 시도)"""
+    if re.fullmatch(r'\d{6}\.KS', ticker):
+        return [ticker, ticker[:-3] + '.KQ']
+    return [ticker]
+
+
+class FundamentalScreener:
+    """보유종목 유니버스 + 증분 갱신 펀더멘털 테이블"""
+
+    def __init__(self, data_dir: str = "./data", fetch_info: Callable[[str], Dict] = None,
+                 etf_names: Dict[str, str] = None):
+        """
+        Args:
+            data_dir: 데이터 루트 디렉토리 (idx_*/ 스냅샷, fundamentals.db)
+            fetch_info: 티커 → info 딕셔너리, None이면 yfinance
+            etf_names: idx → 상품명, None이면 ETF_NAMES
+        """
+        self.data_dir = data_dir
+        self.db_path = os.path.join(data_dir, "fundamentals.db")
+        self.fetch_info = fetch_info or default_fetch_info
+        self.etf_names = etf_names or ETF_NAMES
+        os.makedirs(data_dir, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def universe(self) -> pd.DataFrame:
+        """
+        ETF별 최신 스냅샷 보유종목의 합집합 (티커 단위)
+
+        Returns:
+            DataFrame: 티커, 종목코드, 종목명, 보유 ETF 수, 합산 비중(%), 최대 비중(%), 보유 ETF
+        """
+        history = load_all_histories(self.data_dir, days=1)
+        columns = ['티커', '종목코드', '종목명', '보유 ETF 수', '합산 비중(%)', '최대 비중(%)', '보유 ETF']
+        if history.empty:
+            return pd.DataFrame(columns=columns)
+
+        codes = history['종목코드'].astype(str)
+        resolved = self._resolved()
+        code_to_ticker = {code: screener_ticker(code) for code in codes.unique()}
+        code_to_ticker = {code: resolved.get(ticker, ticker) for code, ticker in code_to_ticker.items()}
+        holdings = pd.DataFrame({
+            '티커': codes.map(code_to_ticker),
+            '종목코드': codes,
+            '종목명': history['종목명'].astype(str),
+            'ETF': history['idx'].astype(str).map(lambda idx: self.etf_names.get(idx, idx)),
+            '비중': history['비중'].astype(float),
+        })
+        holdings = holdings[holdings['티커'].notna() & (holdings['종목명'] != '현금')]
+
+        per_etf = holdings.groupby(['티커', 'ETF'], as_index=False, sort=False)['비중'].sum()
+        universe = per_etf.groupby('티커').agg(**{
+            '보유 ETF 수': ('ETF', 'nunique'),
+            '합산 비중(%)': ('비중', 'sum'),
+            '최대 비중(%)': ('비중', 'max'),
+            '보유 ETF': ('ETF', lambda names: ', '.join(sorted(names))),
+        })
+        first = holdings.drop_duplicates('티커').set_index('티커')[['종목코드', '종목명']]
+        return first.join(universe).reset_index()[columns]
+
+    def _resolved(self) -> Dict[str, str]:
+        """기본 티커 → 실제로 info가 조회된 티커 (예: 247540.KS → 247540.KQ)"""
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT ticker, resolved FROM resolved").fetchall())
+
+    def _stored(self) -> pd.DataFrame:
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query("SELECT ticker, fetched_at, ok, error, data FROM fundamentals", conn)
+
+    def stale_tickers(self, tickers: List[str], max_age: float = 86400, error_age: float = 3600) -> List[str]:
+        """조회한 적 없거나 오래된 티커 (실패한 티커는 error_age 후 재시도)"""
+        stored = self._stored().set_index('ticker')
+        now = time.time()
+        stale = []
+        for ticker in tickers:
+            if ticker not in stored.index:
+                stale.append(ticker)
+                continue
+            age = now - stored.at[ticker, 'fetched_at']
+            if age > (max_age if stored.at[ticker, 'ok'] else error_age):
+                stale.append(ticker)
+        return stale
+
+    def _fetch_one(self, ticker: str, budget: Deadline = None) -> Tuple[str, bool, Optional[str], Optional[Dict]]:
+        """
+        티커 하나의 info 조회 (국내 .KS에서 info가 없으면 .KQ로 재시도)
+
+        Returns:
+            (실제 조회된 티커, 성공 여부, 오류, 데이터) - 실패하면 티커는 요청한 그대로
+
+        Raises:
+            SlotTimeout: budget 안에 리미터 슬롯을 얻지 못함
+        """
+        for candidate in ticker_candidates(ticker):
+            with get_limiter(YAHOO_HOST).slot(timeout=budget.remaining() if budget else None):
+                info = self.fetch_info(candidate) or {}
+            data = {key: info.get(key) for key in INFO_FIELDS}
+            if data['pegRatio'] is None:
+                data['pegRatio'] = info.get('trailingPegRatio')
+            if data['currentPrice'] is None:
+                data['currentPrice'] = info.get('regularMarketPrice', info.get('previousClose'))
+            if any(data[key] is not None for key in ('currentPrice', 'marketCap', 'trailingPE', 'forwardPE')):
+                return candidate, True, None, data
+        return ticker, False, "info 없음", None
+
+    def refresh(self, tickers: List[str] = None, max_age: float = 86400, error_age: float = 3600,
+                workers: int = None, deadline: float = 120.0,
+                progress: Callable[[int, int], None] = None) -> Dict:
+        """
+        오래된 티커만 병렬 조회하여 저장 (증분 갱신)
+
+        동시 갱신 요청(여러 세션)은 한 번만 실행된다. 마감을 넘기거나 yfinance 서킷
+        브레이커가 열리면 남은 티커는 다음 갱신으로 미룬다.
+
+        Args:
+            tickers: 대상 티커, None이면 유니버스 전체
+            max_age: 성공한 티커의 재조회 주기 (초)
+            error_age: 실패한 티커의 재시도 주기 (초)
+            workers: 작업 스레드 수, None이면 yfinance 호스트 리미터의 최대값
+                     (실제 동시 요청 수는 리미터가 지연/오류에 따라 조절)
+            deadline: 갱신 전체 허용 시간 (초)
+            progress: (완료 수, 전체 수) 콜백
+
+        Returns:
+            {'universe', 'stale', 'fetched', 'failed', 'skipped', 'seconds'}
+        """
+        tickers = list(self.universe()['티커']) if tickers is None else list(tickers)
+        key = ('screener-refresh', self.db_path, tuple(sorted(tickers)), max_age, error_age)
+        return SINGLE_FLIGHT.do(key, lambda: self._refresh(tickers, max_age, error_age, workers, deadline, progress))
+
+    def _refresh(self, tickers, max_age, error_age, workers, deadline, progress) -> Dict:
+        stale = self.stale_tickers(tickers, max_age, error_age)
+        budget = Deadline(deadline)
+        breaker = get_breaker('yfinance')
+        stats = {'universe': len(tickers), 'stale': len(stale), 'fetched': 0, 'failed': 0, 'skipped': 0}
+
+        def task(ticker):
+            if budget.expired() or not breaker.allow():
+                return ticker, None, "skipped", None
+            try:
+                result = self._fetch_one(ticker, budget)
+            except SlotTimeout:
+                # 슬롯 대기 중 마감 - yfinance는 호출하지 않았으므로 다음 갱신으로 미룸
+                return ticker, None, "skipped", None
+            except Exception as e:
+                breaker.record_failure()
+                return ticker, False, f"{type(e).__name__}: {str(e)[:200]}", None
+            # 응답은 받았지만 종목 정보가 없는 경우(info 없음)는 소스 장애가 아니므로 오류율에 넣지 않음
+            (breaker.record_success if result[1] else breaker.record_neutral)()
+            return result
+
+        rows, resolved = [], []
+        workers = workers or get_limiter(YAHOO_HOST).max_limit
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="screener") as executor:
+            futures = {executor.submit(task, ticker): ticker for ticker in stale}
+            for done, future in enumerate(as_completed(futures), 1):
+                ticker, ok, error, data = future.result()
+                requested = futures[future]
+                if ok and ticker != requested:
+                    resolved.append((requested, ticker))
+                if ok is None:
+                    stats['skipped'] += 1
+                else:
+                    stats['fetched' if ok else 'failed'] += 1
+                    rows.append((ticker, time.time(), int(ok), error,
+                                 json.dumps(data, ensure_ascii=False) if data else None))
+                if progress:
+                    progress(done, len(stale))
+
+        if rows:
+            with closing(self._connect()) as conn, conn:
+                conn.executemany("INSERT OR REPLACE INTO fundamentals (ticker, fetched_at, ok, error, data) "
+                                 "VALUES (?, ?, ?, ?, ?)", rows)
+                # 다른 접미사로 확인된 티커는 매핑을 남기고 기본 티커의 실패 기록은 지움
+                conn.executemany("INSERT OR REPLACE INTO resolved (ticker, resolved) VALUES (?, ?)", resolved)
+                conn.executemany("DELETE FROM fundamentals WHERE ticker = ?", [(requested,) for requested, _ in resolved])
+        stats['seconds'] = budget.elapsed()
+        print(f"[STATS] 펀더멘털 갱신: {stats}")
+        return stats
+
+    def version(self) -> Tuple:
+        """저장된 펀더멘털 버전 (캐시 키용: 행 수, 마지막 조회 시각)"""
+        with closing(self._connect()) as conn:
+            return tuple(conn.execute("SELECT COUNT(*), MAX(fetched_at) FROM fundamentals").fetchone())
+
+    def table(self, universe: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        유니버스 + 저장된 펀더멘털 + 파생 지표 (상승여력)
+
+        Returns:
+            DataFrame: 유니버스 컬럼 + INFO_FIELDS 컬럼 + 상승여력(%), 조회시각
+        """
+        universe = self.universe() if universe is None else universe
+        stored = self._stored()
+        ok = stored[stored['ok'] == 1]
+        fundamentals = pd.DataFrame([json.loads(data) for data in ok['data']], columns=list(INFO_FIELDS))
+        fundamentals[PERCENT_FIELDS] = fundamentals[PERCENT_FIELDS].astype(float) * 100
+        fundamentals = fundamentals.rename(columns=INFO_FIELDS)
+        fundamentals.insert(0, '티커', ok['ticker'].to_numpy())
+        fundamentals['조회시각'] = pd.to_datetime(ok['fetched_at'].to_numpy(), unit='s')
+
+        table = universe.merge(fundamentals, on='티커', how='left')
+        for col in NUMERIC_COLUMNS:
+            if col in table.columns:
+                table[col] = pd.to_numeric(table[col], errors='coerce')
+        price, target = table['현재가'], table['목표가']
+        table['상승여력(%)'] = np.where((price > 0) & (target > 0), (target / price - 1) * 100, np.nan)
+        return table
+
+
+def screen(table: pd.DataFrame, ranges: Dict[str, Tuple[Optional[float], Optional[float]]] = None,
+           sectors: List[str] = None, etfs: List[str] = None, query: str = None,
+           sort_by: str = '상승여력(%)', ascending: bool = False, limit: int = None) -> pd.DataFrame:
+    """
+    메모리 내 스크리닝 (불리언 마스크 + 정렬, 외부 호출 없음)
+
+    Args:
+        table: FundamentalScreener.table() 결과
+        ranges: 컬럼 → (최소, 최대), None인 쪽은 제한 없음 (값이 없는 종목은 제외)
+        sectors: 섹터 목록
+        etfs: 보유 ETF 이름 목록 (하나라도 보유하면 포함)
+        query: 티커/종목명 부분 문자열
+        sort_by: 정렬 컬럼 (값이 없는 종목은 항상 뒤로)
+        ascending: 오름차순 여부
+        limit: 최대 행 수
+    """
+    mask = np.ones(len(table), dtype=bool)
+    for col, (low, high) in (ranges or {}).items():
+        values = table[col].to_numpy(dtype=float)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    if sectors:
+        mask &= table['섹터'].isin(sectors).to_numpy()
+    if etfs:
+        held = table['보유 ETF'].fillna('').str.split(', ')
+        mask &= held.map(lambda names: bool(set(names) & set(etfs))).to_numpy(dtype=bool)
+    if query:
+        text = query.strip()
+        mask &= (table['티커'].str.contains(text, case=False, regex=False)
+                 | table['종목명'].str.contains(text, case=False, regex=False)).to_numpy()
+
+    result = table[mask].sort_values(sort_by, ascending=ascending, na_position='last', kind='stable')
+    return result.head(limit) if limit else result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="전 ETF 보유종목 펀더멘털 스크리너")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--refresh", action="store_true", help="오래된 티커만 yfinance로 갱신")
+    parser.add_argument("--sort", default='상승여력(%)')
+    parser.add_argument("--ascending", action="store_true")
+    parser.add_argument("--top", type=int, default=30)
+    args = parser.parse_args()
+
+    screener = FundamentalScreener(args.data_dir)
+    if args.refresh:
+        screener.refresh()
+    started = time.perf_counter()
+    result = screen(screener.table(), sort_by=args.sort, ascending=args.ascending, limit=args.top)
+    print(result[['티커', '종목명', '섹터', args.sort, 'Forward P/E', 'PEG', '보유 ETF 수']].to_string(index=False))
+    print(f"[STATS] 테이블 + 스크리닝 {(time.perf_counter() - started) * 1000:.0f}ms")
@@ -0,0 +1,415 @@
+"""
+Shared Cache
+여러 Streamlit 레플리카가 함께 쓰는 데이터 캐시
+
+st.cache_data는 프로세스 안에만 있으므로 레플리카마다 같은 외부 호출을 반복한다.
+이 모듈은 교체 가능한 캐시 백엔드와 그 위의 2단 캐시를 제공한다.
+
+- MemoryBackend: 프로세스 내 LRU (기본값, 단일 레플리카)
+- SQLiteBackend: 공유 볼륨의 SQLite(WAL) 파일 - TTL, LRU(항목 수/용량) 제한,
+  DataFrame은 Arrow IPC로 직렬화, 세대(generation) 번호로 클러스터 전체 무효화,
+  리스(lease)로 레플리카 간 동시 미스를 한 번의 계산으로 병합
+
+백엔드는 TEMPO_CACHE 환경변수로 선택한다.
+    TEMPO_CACHE=memory                       (기본)
+    TEMPO_CACHE=sqlite:/shared/tempo_cache.db
+    TEMPO_CACHE_MAX_MB=256                   (SQLite 백엔드 용량 제한)
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from singleflight import SINGLE_FLIGHT
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow가 없으면 DataFrame도 pickle로 저장
+    pa = None
+
+
+_MISS = object()
+
+
+def serialize(value: Any) -> Tuple[str, bytes]:
+    """값 → (형식, 바이트). DataFrame은 Arrow IPC 스트림, 그 외는 pickle"""
+    if pa is not None and isinstance(value, pd.DataFrame):
+        try:
+            table = pa.Table.from_pandas(value, preserve_index=True)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return 'arrow', sink.getvalue().to_pybytes()
+        except (pa.ArrowException, TypeError, ValueError):
+            pass
+    return 'pickle', pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def deserialize(fmt: str, payload: bytes) -> Any:
+    """serialize의 역변환"""
+    if fmt == 'arrow':
+        return pa.ipc.open_stream(payload).read_all().to_pandas()
+    return pickle.loads(payload)
+
+
+class CacheBackend(ABC):
+    """캐시 백엔드 인터페이스"""
+
+    # 값을 직렬화해 프로세스 밖에 저장하는지 (True면 앞단에 프로세스 내 캐시를 둔다)
+    remote = False
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """값 조회 (없거나 만료면 _MISS)"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float], generation: int):
+        """값 저장 (generation이 현재 세대와 다르면 무시)"""
+
+    @abstractmethod
+    def generation(self) -> int:
+        """현재 캐시 세대 번호"""
+
+    @abstractmethod
+    def invalidate(self) -> int:
+        """전체 무효화 (세대 번호 증가), 새 세대 번호 반환"""
+
+    def acquire_lease(self, key: str, seconds: float) -> bool:
+        """key 계산 권한 획득 (다른 레플리카가 계산 중이면 False)"""
+        return True
+
+    def release_lease(self, key: str):
+        pass
+
+    def stats(self) -> Dict:
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """프로세스 내 LRU 캐시"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._generation = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISS
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return _MISS
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float], generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (value, time.time() + ttl if ttl else float('inf'))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self) -> int:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            return self._generation
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries)}
+
+
+class SQLiteBackend(CacheBackend):
+    """공유 볼륨의 SQLite(WAL) 캐시"""
+
+    remote = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        fmt TEXT NOT NULL,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        expires_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed_at);
+    CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires_at);
+    CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    INSERT OR IGNORE INTO meta (name, value) VALUES ('generation', 0);
+    CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+    """
+
+    # LRU 접근 시각 갱신 최소 간격 (읽기마다 쓰기가 생기지 않도록)
+    TOUCH_INTERVAL = 10.0
+
+    def __init__(self, db_path: str, max_entries: int = 2000, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            db_path: SQLite 파일 경로 (모든 레플리카가 보는 공유 볼륨)
+            max_entries: 최대 항목 수 (초과 시 오래 안 쓴 항목부터 삭제)
+            max_bytes: 최대 값 크기 합계
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str) -> Any:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT fmt, value, expires_at, accessed_at FROM cache WHERE key = ?",
+                               (key,)).fetchone()
+            if row is None or row[2] < now:
+                return _MISS
+            if now - row[3] > self.TOUCH_INTERVAL:
+                conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return deserialize(row[0], row[1])
+
+    def set(self, key: str, value: Any, ttl: Optional[float], generation: int):
+        fmt, payload = serialize(value)
+        now = time.time()
+        expires_at = now + ttl if ttl else 1e18
+        with closing(self._connect()) as conn, conn:
+            # 계산 도중 무효화되었으면 (세대 변경) 예전 세대의 값을 저장하지 않음
+            conn.execute("""
+                INSERT OR REPLACE INTO cache (key, fmt, value, size, expires_at, accessed_at)
+                SELECT ?, ?, ?, ?, ?, ? WHERE (SELECT value FROM meta WHERE name = 'generation') = ?
+            """, (key, fmt, payload, len(payload), expires_at, now, generation))
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """만료 항목 삭제 후 항목 수/용량 제한을 넘으면 오래 안 쓴 항목부터 삭제"""
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        freed, removed, victims = 0, 0, []
+        for key, size in conn.execute("SELECT key, size FROM cache ORDER BY accessed_at"):
+            if count - removed <= self.max_entries and total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            removed += 1
+            freed += size
+        conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+
+    def generation(self) -> int:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def invalidate(self) -> int:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+            conn.execute("DELETE FROM cache")
+            return conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def acquire_lease(self, key: str, seconds: float) -> bool:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires_at < ?", (key, now))
+            cursor = conn.execute("INSERT OR IGNORE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                                  (key, self.owner, now + seconds))
+            return cursor.rowcount == 1
+
+    def release_lease(self, key: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+    def stats(self) -> Dict:
+        with closing(self._connect()) as conn, conn:
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {'backend': 'sqlite', 'entries': count, 'bytes': total}
+
+
+class TieredCache:
+    """
+    프로세스 내 캐시(L1) + 백엔드(L2)
+
+    L1은 역직렬화된 값을 세대 번호와 함께 보관하며, 세대 번호는 최대
+    generation_check초마다 백엔드에서 다시 읽는다. 다른 레플리카가 무효화하면
+    그 시간 안에 이 레플리카의 L1도 함께 비워진다.
+
+    반환값은 세션 간에 공유되므로 호출자가 수정하면 안 된다.
+    """
+
+    def __init__(self, backend: CacheBackend, l1_entries: int = 256, generation_check: float = 1.0,
+                 lease_seconds: float = 60.0):
+        self.backend = backend
+        self.generation_check = generation_check
+        self.lease_seconds = lease_seconds
+        self._l1 = MemoryBackend(l1_entries) if backend.remote else None
+        self._lock = threading.Lock()
+        self._generation = backend.generation()
+        self._checked_at = time.monotonic()
+        self._stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'waited': 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def generation(self) -> int:
+        """현재 세대 (백엔드 조회는 generation_check초에 한 번)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.generation_check:
+                return self._generation
+        generation = self.backend.generation()
+        with self._lock:
+            self._checked_at = now
+            if generation != self._generation:
+                self._generation = generation
+                if self._l1 is not None:
+                    self._l1.invalidate()
+            return self._generation
+
+    def get_or_compute(self, key: str, ttl: Optional[float], compute: Callable) -> Any:
+        """
+        key의 값을 반환하고, 없으면 compute()로 계산하여 저장
+
+        프로세스 안의 동시 미스는 SINGLE_FLIGHT로, 레플리카 간 동시 미스는
+        백엔드 리스로 병합한다. 리스를 얻지 못한 레플리카는 값이 올라올 때까지
+        (최대 lease_seconds) 기다린 뒤, 그래도 없으면 직접 계산한다.
+        """
+        generation = self.generation()
+        if self._l1 is not None:
+            value = self._l1.get(key)
+            if value is not _MISS:
+                self._count('l1_hits')
+                return value
+        return SINGLE_FLIGHT.do(('cache', key), self._load, key, ttl, compute, generation)
+
+    def _load(self, key: str, ttl: Optional[float], compute: Callable, generation: int) -> Any:
+        value = self.backend.get(key)
+        if value is not _MISS:
+            self._count('l2_hits' if self._l1 is not None else 'l1_hits')
+            self._remember(key, value, ttl, generation)
+            return value
+
+        self._count('misses')
+        if not self.backend.acquire_lease(key, self.lease_seconds):
+            self._count('waited')
+            deadline = time.monotonic() + self.lease_seconds
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                value = self.backend.get(key)
+                if value is not _MISS:
+                    self._remember(key, value, ttl, generation)
+                    return value
+                # 보유자가 값 없이 리스를 반납했으면(계산 실패) 더 기다리지 않고 직접 계산
+                if self.backend.acquire_lease(key, self.lease_seconds):
+                    break
+            # 리스 만료까지 값이 없으면 (보유자 중단) 직접 계산
+
+        try:
+            value = compute()
+            self.backend.set(key, value, ttl, generation)
+            self._remember(key, value, ttl, generation)
+            return value
+        finally:
+            self.backend.release_lease(key)
+
+    def _remember(self, key: str, value: Any, ttl: Optional[float], generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+        if self._l1 is not None:
+            # L2 만료 시각보다 오래 남지 않도록 L1 TTL을 짧게 유지
+            self._l1.set(key, value, min(ttl, 60.0) if ttl else 60.0, self._l1.generation())
+
+    def invalidate(self) -> int:
+        """클러스터 전체 무효화"""
+        generation = self.backend.invalidate()
+        with self._lock:
+            self._generation = generation
+            self._checked_at = time.monotonic()
+        if self._l1 is not None:
+            self._l1.invalidate()
+        return generation
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(self.backend.stats())
+        stats['generation'] = self._generation
+        return stats
+
+
+def backend_from_env() -> CacheBackend:
+    """TEMPO_CACHE 환경변수로 백엔드 생성"""
+    spec = os.environ.get('TEMPO_CACHE', 'memory')
+    if spec.startswith('sqlite:'):
+        max_mb = float(os.environ.get('TEMPO_CACHE_MAX_MB', 256))
+        return SQLiteBackend(spec[len('sqlite:'):], max_bytes=int(max_mb * 1024 * 1024))
+    if spec == 'memory':
+        return MemoryBackend()
+    raise ValueError(f"알 수 없는 캐시 백엔드입니다: {spec}")
+
+
+_CACHE: Optional[TieredCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache() -> TieredCache:
+    """프로세스 전역 캐시"""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = TieredCache(backend_from_env())
+        return _CACHE
+
+
+def _arg_key(args: tuple, kwargs: dict) -> str:
+    payload = pickle.dumps((args, sorted(kwargs.items())), protocol=pickle.HIGHEST_PROTOCOL)
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def cached(ttl: Optional[float] = None, name: str = None):
+    """
+    st.cache_data 대신 쓰는 공유 캐시 데코레이터
+
+    키는 함수 이름 + 인자(pickle 해시)이므로 인자는 pickle 가능한 단순 값이어야 한다.
+
+    Args:
+        ttl: 유효 시간 (초), None이면 무효화 전까지 유지
+        name: 캐시 키 접두어, None이면 함수 이름
+    """
+    def decorator(fn: Callable) -> Callable:
+        prefix = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = f"{prefix}:{_arg_key(args, kwargs)}"
+            return get_cache().get_or_compute(key, ttl, lambda: fn(*args, **kwargs))
+
+        return wrapper
+    return decorator
@@ -0,0 +1,116 @@
+"""
+Single Flight
+프로세스 전역 요청 병합 계층
+
+동시에 들어온 동일한 요청(같은 키)은 하나의 실행만 수행하고,
+나머지 호출자는 그 결과(또는 예외)를 그대로 공유한다.
+Streamlit 세션들은 같은 프로세스의 스레드이므로 세션 간에도 병합된다.
+
+단, CallerTimeout(호출자 자신의 대기 한도 초과)은 실행한 호출자에게만 해당하므로
+공유하지 않고, 기다리던 호출자가 직접 다시 실행한다.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Hashable
+
+
+class CallerTimeout(TimeoutError):
+    """호출자 자신의 대기 한도 초과 (다른 호출자와 공유하지 않는 오류)"""
+
+
+class WaitTimeout(CallerTimeout):
+    """진행 중인 실행의 결과를 wait_timeout 안에 받지 못함"""
+
+
+class _Call:
+    """진행 중인 실행 하나"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    키 단위 요청 병합기
+
+    키는 튜플이며 첫 번째 원소를 통계용 분류명으로 사용한다.
+    예: ('scrape', idx, date), ('price', ticker)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, wait_timeout: float = None, **kwargs):
+        """
+        key에 대해 진행 중인 실행이 있으면 그 결과를 기다리고, 없으면 fn을 실행
+
+        Args:
+            wait_timeout: 다른 호출자의 실행을 기다릴 최대 시간 (초), None/inf면 무제한.
+                          넘기면 WaitTimeout (직접 실행할 때는 fn 안에서 스스로 제한)
+
+        Returns:
+            fn의 반환값 (병합된 호출자도 같은 객체를 받는다)
+        """
+        kind = key[0] if isinstance(key, tuple) and key else str(key)
+        if wait_timeout is not None and wait_timeout == float('inf'):
+            wait_timeout = None
+        deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+        with self._lock:
+            stats = self._stats.setdefault(kind, {'calls': 0, 'executed': 0, 'coalesced': 0})
+            stats['calls'] += 1
+
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is not None:
+                    call.waiters += 1
+                    stats['coalesced'] += 1
+                    leader = False
+                else:
+                    call = _Call()
+                    self._calls[key] = call
+                    stats['executed'] += 1
+                    leader = True
+
+            if leader:
+                break
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not call.done.wait(remaining):
+                raise WaitTimeout(f"single-flight {kind} 결과 대기 {wait_timeout:.1f}초 초과")
+            if isinstance(call.error, CallerTimeout):
+                # 실행한 호출자의 대기 한도 초과는 내 한도와 무관 - 남은 시간으로 다시 시도
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """현재 진행 중인 실행 수"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """분류별 호출/실행/병합 횟수"""
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self._stats.items()}
+
+
+# 프로세스 전역 인스턴스
+SINGLE_FLIGHT = SingleFlight()
@@ -0,0 +1,403 @@
+"""
+Snapshot Store
+ETF별 일간 PDF 스냅샷 파일 저장소 (전체 저장 / 키프레임 + 델타 저장)
+
+연속된 영업일의 PDF는 대부분 같은 종목에 수량/평가금액만 조금씩 다르므로,
+delta 모드에서는 주기적인 전체 스냅샷(키프레임) 사이의 날짜를 직전 저장일 대비
+변경분(편입 행, 편출 행, 바뀐 숫자 필드)으로만 저장한다.
+
+- 키프레임: portfolio_{date}.json (기존 전체 저장 형식과 동일)
+- 델타:     delta_{date}.json   ({'base': 기준일, 'depth': 키프레임으로부터 거리, ...})
+
+읽기는 저장 모드와 무관하게 두 형식을 모두 복원한다.
+"""
+
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+
+KEY_FIELDS = ['종목코드', '종목명']
+VALUE_FIELDS = ['수량', '평가금액', '비중']
+FIELDS = KEY_FIELDS + VALUE_FIELDS
+
+STORAGE_MODES = ('full', 'delta')
+
+# 저장 모드 기본값 (ETF_SNAPSHOT_STORAGE=delta 로 전환)
+DEFAULT_STORAGE = os.environ.get('ETF_SNAPSHOT_STORAGE', 'full')
+
+
+def atomic_write(filename: str, write: Callable):
+    """임시 파일에 쓴 뒤 교체하여 동시 쓰기 중에도 찢어진 파일이 남지 않게 함"""
+    tmp = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _row_keys(rows: List[list]) -> List[tuple]:
+    """행 식별 키 (종목코드, 종목명, 같은 키 내 등장 순번) - 현금 등 코드 없는 중복 행 구분용"""
+    seen = {}
+    keys = []
+    for row in rows:
+        base = (row[0], row[1])
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        keys.append(base + (occurrence,))
+    return keys
+
+
+def encode_delta(base_rows: List[list], rows: List[list]) -> Dict:
+    """
+    기준일 행 목록 대비 변경분
+
+    복원 순서: 기준일 행 중 편출(removed, 기준일 위치)을 뺀 나머지 + 편입(added) 행.
+    changed의 위치와 order는 이 복원 순서 기준이며, order는 실제 행 순서가
+    복원 순서와 다를 때만 기록한다. 평가금액처럼 유지 종목 전체가 바뀐 필드는
+    위치 목록 없이(pos=None) 값만 기록한다.
+    """
+    base_keys = _row_keys(base_rows)
+    keys = _row_keys(rows)
+    current = dict(zip(keys, rows))
+    base_set = set(base_keys)
+
+    removed = [i for i, key in enumerate(base_keys) if key not in current]
+    survivors = [(key, base_rows[i]) for i, key in enumerate(base_keys) if key in current]
+    added = [row for key, row in zip(keys, rows) if key not in base_set]
+
+    changed = {}
+    for j, field in enumerate(VALUE_FIELDS, start=len(KEY_FIELDS)):
+        positions, values = [], []
+        for pos, (key, base_row) in enumerate(survivors):
+            if current[key][j] != base_row[j]:
+                positions.append(pos)
+                values.append(current[key][j])
+        if len(positions) == len(survivors) and positions:
+            changed[field] = {'pos': None, 'values': values}
+        elif positions:
+            changed[field] = {'pos': positions, 'values': values}
+
+    natural = [key for key, _ in survivors] + [key for key in keys if key not in base_set]
+    natural_pos = {key: i for i, key in enumerate(natural)}
+    order = [natural_pos[key] for key in keys]
+
+    return {
+        'removed': removed,
+        'added': [list(row) for row in added],
+        'changed': changed,
+        'order': order if order != list(range(len(order))) else None,
+    }
+
+
+def apply_delta(base_rows: List[list], delta: Dict) -> List[list]:
+    """encode_delta의 역변환"""
+    removed = set(delta['removed'])
+    rows = [list(row) for i, row in enumerate(base_rows) if i not in removed]
+    rows += [list(row) for row in delta['added']]
+    for j, field in enumerate(VALUE_FIELDS, start=len(KEY_FIELDS)):
+        change = delta['changed'].get(field)
+        if change:
+            positions = change['pos'] if change['pos'] is not None else range(len(change['values']))
+            for pos, value in zip(positions, change['values']):
+                rows[pos][j] = value
+    if delta.get('order'):
+        rows = [rows[i] for i in delta['order']]
+    return rows
+
+
+def _dump_delta(delta: Dict, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(delta, f, ensure_ascii=False, separators=(',', ':'))
+
+
+class SnapshotStore:
+    """ETF 한 개의 날짜별 스냅샷 파일 저장소"""
+
+    def __init__(self, data_dir: str, mode: str = None, keyframe_interval: int = 10,
+                 max_delta_ratio: float = 0.5):
+        """
+        Args:
+            data_dir: ETF 데이터 디렉토리 (예: ./data/idx_5)
+            mode: 'full' (매일 전체 저장) 또는 'delta' (키프레임 + 델타), None이면 DEFAULT_STORAGE
+            keyframe_interval: delta 모드에서 키프레임 간격 (저장일 수)
+            max_delta_ratio: 델타 크기가 키프레임 대비 이 비율을 넘으면 키프레임으로 저장
+        """
+        mode = mode or DEFAULT_STORAGE
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"알 수 없는 저장 모드입니다: {mode}")
+        self.data_dir = data_dir
+        self.mode = mode
+        self.keyframe_interval = keyframe_interval
+        self.max_delta_ratio = max_delta_ratio
+
+    def keyframe_path(self, date: str) -> str:
+        return os.path.join(self.data_dir, f"portfolio_{date}.json")
+
+    def delta_path(self, date: str) -> str:
+        return os.path.join(self.data_dir, f"delta_{date}.json")
+
+    def dates(self) -> List[str]:
+        """저장된 날짜 목록 (오름차순)"""
+        if not os.path.exists(self.data_dir):
+            return []
+        dates = set()
+        for file in os.listdir(self.data_dir):
+            for prefix in ('portfolio_', 'delta_'):
+                if file.startswith(prefix) and file.endswith('.json'):
+                    dates.add(file[len(prefix):-len('.json')])
+        return sorted(dates)
+
+    def exists(self, date: str) -> bool:
+        return os.path.exists(self.keyframe_path(date)) or os.path.exists(self.delta_path(date))
+
+    def _read_delta(self, date: str) -> Optional[Dict]:
+        path = self.delta_path(date)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _load_rows(self, date: str, memo: Dict[str, List[list]] = None) -> Optional[List[list]]:
+        """
+        날짜의 행 목록 복원 (키프레임 또는 델타 체인)
+
+        memo에 이미 복원된 날짜가 있으면 체인을 거기서 멈춘다 (범위 로드용).
+        """
+        memo = memo if memo is not None else {}
+        chain = []
+        current = date
+        rows = None
+        while current is not None:
+            if current in memo:
+                rows = memo[current]
+                break
+            if os.path.exists(self.keyframe_path(current)):
+                with open(self.keyframe_path(current), encoding='utf-8') as f:
+                    records = json.load(f)
+                rows = [[record.get(field) for field in FIELDS] for record in records]
+                memo[current] = rows
+                break
+            delta = self._read_delta(current)
+            if delta is None:
+                return None
+            chain.append((current, delta))
+            current = delta['base']
+
+        if rows is None:
+            return None
+        for chain_date, delta in reversed(chain):
+            rows = apply_delta(rows, delta)
+            memo[chain_date] = rows
+        return rows
+
+    @staticmethod
+    def _to_frame(rows: List[list], date: str) -> pd.DataFrame:
+        df = pd.DataFrame(rows, columns=FIELDS)
+        df.insert(0, '날짜', date)
+        return df
+
+    def load(self, date: str) -> Optional[pd.DataFrame]:
+        """날짜의 스냅샷 (저장 형식 dtype, 없으면 None)"""
+        rows = self._load_rows(date)
+        return None if rows is None else self._to_frame(rows, date)
+
+    def load_range(self, dates: List[str]) -> List[pd.DataFrame]:
+        """
+        여러 날짜를 한 번에 복원
+
+        날짜 오름차순으로 복원하며 앞서 복원한 날짜를 다음 델타의 기준으로 재사용하므로
+        각 델타는 한 번만 적용된다. 복원할 수 없는 날짜는 건너뛴다.
+        """
+        memo = {}
+        frames = []
+        for date in sorted(dates):
+            try:
+                rows = self._load_rows(date, memo)
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                print(f"[WARN] 스냅샷 복원 실패 ({date}): {type(e).__name__}: {e}")
+                continue
+            if rows is not None:
+                frames.append(self._to_frame(rows, date))
+        return frames
+
+    def load_table(self, dates: List[str]) -> pd.DataFrame:
+        """
+        여러 날짜를 하나의 프레임으로 복원 (load_range와 같지만 DataFrame을 한 번만 생성)
+
+        Returns:
+            DataFrame: 날짜 + FIELDS (날짜 오름차순), 복원할 수 있는 날짜가 없으면 빈 프레임
+        """
+        memo = {}
+        records = []
+        for date in sorted(dates):
+            try:
+                rows = self._load_rows(date, memo)
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                print(f"[WARN] 스냅샷 복원 실패 ({date}): {type(e).__name__}: {e}")
+                continue
+            if rows is not None:
+                records.extend([date] + row for row in rows)
+        return pd.DataFrame(records, columns=['날짜'] + FIELDS)
+
+    def _chain_depth(self, date: str) -> int:
+        """키프레임으로부터의 델타 체인 길이"""
+        if os.path.exists(self.keyframe_path(date)):
+            return 0
+        delta = self._read_delta(date)
+        return delta.get('depth', self.keyframe_interval) if delta else self.keyframe_interval
+
+    def _dependents(self, date: str) -> List[str]:
+        """date를 기준으로 저장된 델타 날짜들"""
+        return [d for d in self.dates() if d > date and (self._read_delta(d) or {}).get('base') == date]
+
+    def write(self, storage_df: pd.DataFrame) -> str:
+        """
+        스냅샷 저장 (호출자가 쓰기 잠금을 보유해야 함)
+
+        delta 모드에서는 직전 저장일 대비 델타로 저장하되, 첫 저장이거나 체인이
+        keyframe_interval에 도달했거나 델타가 키프레임 대비 max_delta_ratio보다 크면
+        키프레임으로 저장한다.
+        이미 저장된 날짜를 덮어쓸 때는 그 날짜를 기준으로 하는 델타를 먼저 키프레임으로
+        바꿔 두어, 쓰는 도중에도 모든 날짜가 항상 올바르게 복원되게 한다.
+
+        Args:
+            storage_df: to_storage_frame 결과 (날짜 컬럼 포함)
+
+        Returns:
+            'keyframe' 또는 'delta'
+        """
+        date = str(storage_df['날짜'].iloc[0]) if len(storage_df) else None
+        if date is None:
+            raise ValueError("빈 스냅샷은 저장할 수 없습니다.")
+
+        for dependent in self._dependents(date):
+            self._write_keyframe(self.load(dependent))
+
+        delta = None
+        if self.mode == 'delta' and set(storage_df.columns) <= set(['날짜'] + FIELDS):
+            previous = [d for d in self.dates() if d < date]
+            depth = self._chain_depth(previous[-1]) + 1 if previous else None
+            if depth is not None and depth < self.keyframe_interval:
+                base_rows = self._load_rows(previous[-1])
+                if base_rows is not None:
+                    rows = storage_df[FIELDS].astype(object).values.tolist()
+                    candidate = dict(base=previous[-1], depth=depth, **encode_delta(base_rows, rows))
+                    keyframe_size = len(storage_df.to_json(orient='records', force_ascii=False, indent=2))
+                    if len(json.dumps(candidate, ensure_ascii=False, separators=(',', ':'))) \
+                            <= keyframe_size * self.max_delta_ratio:
+                        delta = candidate
+
+        if delta is None:
+            self._write_keyframe(storage_df)
+            return 'keyframe'
+
+        atomic_write(self.delta_path(date), lambda path: _dump_delta(delta, path))
+        if os.path.exists(self.keyframe_path(date)):
+            os.remove(self.keyframe_path(date))
+        return 'delta'
+
+    def _write_keyframe(self, storage_df: pd.DataFrame):
+        date = str(storage_df['날짜'].iloc[0])
+        atomic_write(self.keyframe_path(date), lambda path: storage_df.to_json(
+            path, orient='records', force_ascii=False, indent=2))
+        if os.path.exists(self.delta_path(date)):
+            os.remove(self.delta_path(date))
+
+    def disk_usage(self) -> int:
+        """스냅샷 파일 전체 크기 (bytes)"""
+        total = 0
+        for date in self.dates():
+            for path in (self.keyframe_path(date), self.delta_path(date)):
+                if os.path.exists(path):
+                    total += os.path.getsize(path)
+        return total
+
+
+def convert_history(data_dir: str = "./data", mode: str = 'delta', keyframe_interval: int = 10) -> pd.DataFrame:
+    """
+    저장된 모든 ETF 히스토리를 지정한 저장 모드로 다시 기록
+
+    ETF마다 별도 작업 디렉토리(.convert_idx_*)에 변환본을 쓰고, 모든 날짜의 복원 결과가
+    원본과 정확히 같을 때만 원래 디렉토리와 교체한다. 다르면 작업 디렉토리를 지우고
+    AssertionError를 던지므로 원본은 그대로 남는다. 교체 중에는 해당 ETF 디렉토리가
+    잠시 비므로 수집/대시보드가 멈춘 상태에서 실행한다.
+
+    Returns:
+        DataFrame: idx, 날짜 수, 기존(bytes), 변환 후(bytes), 로드 시간 전/후(ms)
+    """
+    import shutil
+    import time
+
+    report = []
+    for entry in sorted(os.listdir(data_dir)):
+        etf_dir = os.path.join(data_dir, entry)
+        if not entry.startswith('idx_') or not os.path.isdir(etf_dir):
+            continue
+
+        source = SnapshotStore(etf_dir)
+        dates = source.dates()
+        started = time.perf_counter()
+        originals = {frame['날짜'].iloc[0]: frame for frame in source.load_range(dates)}
+        load_before = (time.perf_counter() - started) * 1000
+        size_before = source.disk_usage()
+
+        # 1) 작업 디렉토리에 스냅샷 외 파일(해시 인덱스 등) 복사 + 변환본 기록
+        staging_dir = os.path.join(data_dir, f".convert_{entry}")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        staged = SnapshotStore(staging_dir, mode=mode, keyframe_interval=keyframe_interval)
+        try:
+            for file in os.listdir(etf_dir):
+                path = os.path.join(etf_dir, file)
+                if os.path.isfile(path) and not (file.endswith('.json') and file.startswith(('portfolio_', 'delta_'))):
+                    shutil.copy2(path, os.path.join(staging_dir, file))
+            for date in sorted(originals):
+                staged.write(originals[date])
+
+            # 2) 변환본을 새로 읽어 원본과 비교
+            started = time.perf_counter()
+            restored = {frame['날짜'].iloc[0]: frame for frame in staged.load_range(staged.dates())}
+            load_after = (time.perf_counter() - started) * 1000
+            if sorted(restored) != sorted(originals):
+                raise AssertionError(f"{entry}: 변환 후 날짜 목록이 다릅니다")
+            for date, original in originals.items():
+                pd.testing.assert_frame_equal(original, restored[date], check_dtype=False, obj=f"{entry} {date}")
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        size_after = staged.disk_usage()
+
+        # 3) 검증을 통과한 경우에만 교체
+        backup_dir = os.path.join(data_dir, f".backup_{entry}")
+        shutil.rmtree(backup_dir, ignore_errors=True)
+        os.rename(etf_dir, backup_dir)
+        os.rename(staging_dir, etf_dir)
+        shutil.rmtree(backup_dir)
+
+        report.append({'idx': entry[len('idx_'):], '날짜 수': len(dates),
+                       '기존(bytes)': size_before, '변환 후(bytes)': size_after,
+                       '로드 전(ms)': round(load_before, 1), '로드 후(ms)': round(load_after, 1)})
+    return pd.DataFrame(report)
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="PDF 스냅샷 저장 형식 변환 (복원 결과 검증 포함)")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--mode", choices=STORAGE_MODES, default='delta')
+    parser.add_argument("--keyframe-interval", type=int, default=10)
+    args = parser.parse_args()
+
+    result = convert_history(args.data_dir, args.mode, args.keyframe_interval)
+    print(result.to_string(index=False))
+    if not result.empty:
+        print(f"[STATS] 디스크 {result['기존(bytes)'].sum():,} → {result['변환 후(bytes)'].sum():,} bytes, "
+              f"로드 {result['로드 전(ms)'].sum():.1f} → {result['로드 후(ms)'].sum():.1f}ms")
@@ -5,6 +5,8 @@ import FinanceDataReader as fdr
 import requests
 import urllib3
 from io import BytesIO
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 import pytz
@@ -13,7 +15,20 @@ import pytz
 import feedparser
 import pytz
 import feedparser
-from etf_monitor import ActiveETFMonitor
+from etf_monitor import ActiveETFMonitor, ETF_CATEGORIES, ETF_NAMES
+import chart_data
+from singleflight import SINGLE_FLIGHT
+from resilience import YAHOO_HOST, get_limiter, limiter_metrics
+from inav import INAVEngine
+from event_store import RebalancingEventStore, EVENT_LABELS
+from news_archive import NewsArchive, holding_query
+from attribution import AttributionEngine
+from screener import FundamentalScreener, NUMERIC_COLUMNS, screen
+from alert_rules import AlertEngine, AlertRule, FIELDS, FUNCTIONS, SEVERITIES, RuleError, save_rules
+from report_site import ReportSite
+from indicators import IndicatorEngine, INDICATOR_LABELS, daily_closes, trend_label
+import shared_cache
+from holdings_schema import apply_holdings_schema, to_storage_frame
 import yfinance as yf
 from curl_cffi import requests as curequests
 
@@ -44,7 +59,7 @@ st.set_page_config(
 # 2. 데이터 수집 함수
 # ---------------------------------------------------------
 
-@st.cache_data(ttl=600)
+@shared_cache.cached(ttl=600)
 def fetch_market_data():
     """시장/거시 지표 수집 (yfinance + curl_cffi)"""
     tickers = {
@@ -63,13 +78,32 @@ def fetch_market_data():
     session = curequests.Session(impersonate="chrome")
     session.verify = False
 
-    for name, ticker in tickers.items():
+    def fetch(ticker):
+        # 최근 1년치 (차트용) + 최근 데이터, 동시 요청 수는 호스트 리미터가 조절
+        with get_limiter(YAHOO_HOST).slot():
+            return yf.Ticker(ticker, session=session).history(period="1y")
+
+    with ThreadPoolExecutor(max_workers=len(tickers), thread_name_prefix="market-data") as executor:
+        futures = {name: executor.submit(fetch, ticker) for name, ticker in tickers.items()}
+
+    for name, future in futures.items():
+        try:
+            df = future.result()
+            if not df.empty:
+                history_data[name] = df
+        except Exception as e:
+            print(f"Error fetching {name}: {e}")
+
+    # 전 지표 기술적 지표 (저장된 롤링 상태에 새 봉만 반영)
+    try:
+        technicals = get_indicator_engine("market").update(
+            daily_closes({name: df['Close'] for name, df in history_data.items()}))
+    except Exception as e:
+        print(f"[WARN] 기술적 지표 계산 실패: {type(e).__name__}: {e}")
+        technicals = pd.DataFrame()
+
+    for name, df in history_data.items():
         try:
-            # yfinance로 데이터 수집
-            stock = yf.Ticker(ticker, session=session)
-            # 최근 1년치 (차트용) + 최근 데이터
-            df = stock.history(period="1y")
-            
             if not df.empty:
                 current = df['Close'].iloc[-1]
                 # 전일 데이터가 있으면 변동 계산
@@ -82,41 +116,64 @@ def fetch_market_data():
                     pct = 0
                 
                 # 20일 이평선 트렌드
-                df['MA20'] = df['Close'].rolling(window=20).mean()
-                ma20 = df['MA20'].iloc[-1] if not pd.isna(df['MA20'].iloc[-1]) else current
-                trend = "상승 🐂" if current > ma20 else "하락 🐻"
+                indicators = technicals.loc[name].to_dict() if name in technicals.index else {}
+                trend = trend_label(current, indicators.get('ma20', current))
                 
                 market_data[name] = {
                     "price": current, 
                     "change": change, 
                     "pct_change": pct, 
-                    "trend": trend
+                    "trend": trend,
+                    "indicators": indicators
                 }
-                history_data[name] = df
         except Exception as e:
             print(f"Error fetching {name}: {e}")
             pass
             
     return market_data, history_data
 
-@st.cache_data(ttl=1800)
-def fetch_industry_news(topic):
-    """구글 뉴스 RSS를 통해 특정 토픽의 뉴스 수집"""
-    # 주제별 검색 쿼리 매핑
-    queries = {
-        "AI & 반도체": "Nvidia OR OpenAI OR TSMC OR Samsung Electronics semiconductor",
-        "2차전지 & EV": "Tesla OR CATL OR LG Energy Solution OR electric vehicle battery",
-        "바이오 & 헬스케어": "Eli Lilly OR Novo Nordisk OR biotech OR FDA approval",
-        "글로벌 거시경제": "Federal Reserve OR inflation OR interest rate OR US economy"
-    }
-    
-    query = queries.get(topic, "Global Economy")
+def _browser_session():
+    """SSL 인증서 검증 비활성화 & 브라우저 위장 세션 (curl_cffi, 봇 탐지 우회)"""
+    session = curequests.Session(impersonate="chrome")
+    session.verify = False
+    return session
+
+@shared_cache.cached(ttl=600)
+def fetch_stock_info(ticker):
+    """스카우터용 종목 정보 (yfinance info)"""
+    with get_limiter(YAHOO_HOST).slot():
+        return yf.Ticker(ticker, session=_browser_session()).info
+
+@shared_cache.cached(ttl=600)
+def fetch_stock_history(ticker):
+    """스카우터용 최근 1년 주가"""
+    with get_limiter(YAHOO_HOST).slot():
+        return yf.Ticker(ticker, session=_browser_session()).history(period="1y")
+
+@shared_cache.cached(ttl=120)
+def fetch_pdf_snapshot(etf_idx, date):
+    """PDF 수집 (레플리카 간 공유, 2분 캐시, 저장 형식 dtype)"""
+    monitor = ActiveETFMonitor(url=f"https://timefolioetf.co.kr/m11_view.php?idx={etf_idx}")
+    return to_storage_frame(monitor.get_portfolio_data(date))
+
+@st.cache_resource
+def get_news_archive():
+    """로컬 뉴스 아카이브 (SQLite FTS5, 프로세스 공유)"""
+    return NewsArchive()
+
+def _fetch_news_feed(query, topic):
+    """구글 뉴스 RSS 조회 + 전체 항목을 아카이브에 누적 (화면에는 최신 10개만)"""
     encoded_query = requests.utils.quote(query)
     # 구글 뉴스 RSS URL (언어: 영어/한국어 섞여있을 수 있음, 여기선 US edition 사용)
     rss_url = f"https://news.google.com/rss/search?q={encoded_query}&hl=en-US&gl=US&ceid=US:en"
-    
+
     try:
         feed = feedparser.parse(rss_url)
+        try:
+            get_news_archive().ingest(feed.entries, topic=topic)
+        except Exception as e:
+            print(f"[WARN] 뉴스 아카이브 저장 실패: {type(e).__name__}: {e}")
+
         news_items = []
         for entry in feed.entries[:10]: # 최신 10개만
             news_items.append({
@@ -129,6 +186,113 @@ def fetch_industry_news(topic):
     except Exception as e:
         return []
 
+@shared_cache.cached(ttl=1800)
+def fetch_industry_news(topic):
+    """구글 뉴스 RSS를 통해 특정 토픽의 뉴스 수집"""
+    # 주제별 검색 쿼리 매핑
+    queries = {
+        "AI & 반도체": "Nvidia OR OpenAI OR TSMC OR Samsung Electronics semiconductor",
+        "2차전지 & EV": "Tesla OR CATL OR LG Energy Solution OR electric vehicle battery",
+        "바이오 & 헬스케어": "Eli Lilly OR Novo Nordisk OR biotech OR FDA approval",
+        "글로벌 거시경제": "Federal Reserve OR inflation OR interest rate OR US economy"
+    }
+
+    query = queries.get(topic, "Global Economy")
+    return _fetch_news_feed(query, topic)
+
+@shared_cache.cached(ttl=1800)
+def fetch_holding_news(query):
+    """보유종목(종목명/티커) 뉴스 수집 → 아카이브에 누적"""
+    return _fetch_news_feed(query, f"종목:{query}")
+
+@shared_cache.cached(ttl=600)
+def get_mini_chart_series(key, n_points=chart_data.MINI_CHART_POINTS):
+    """미니 차트용 종가 시계열 (화면 폭에 맞춰 LTTB 다운샘플링)"""
+    _, history_data = fetch_market_data()
+    return chart_data.downsample_series(history_data[key]['Close'], n_points)
+
+@st.cache_data(max_entries=200)
+def get_chart_figure(chart_type, etf_idx, date, content_hash, etf_name, _df, stock_name=None):
+    """
+    (ETF, 날짜, 차트 종류) 단위로 캐시되는 Plotly figure
+
+    _df는 해시하지 않으며, 같은 날짜에 PDF가 재게시되면 content_hash가 바뀌어 새로 생성된다.
+    히스토리 차트는 당일 해시 대신 구간 전체 해시(get_history_hash)를 content_hash로 넘긴다.
+    """
+    if chart_type == "pie":
+        return chart_data.build_pie_figure(_df)
+    if chart_type == "treemap":
+        return chart_data.build_treemap_figure(_df, etf_name)
+    if chart_type == "history":
+        return chart_data.build_history_figure(_df, stock_name)
+    raise ValueError(f"알 수 없는 차트 종류: {chart_type}")
+
+@st.cache_resource
+def get_inav_engine():
+    """iNAV 엔진 (보유종목 행렬은 프로세스 전체에서 공유)"""
+    engine = INAVEngine()
+    engine.load_holdings()
+    return engine
+
+@st.cache_resource
+def get_screener():
+    """보유종목 펀더멘털 스크리너 (스카우터와 같은 yfinance info 소스)"""
+    return FundamentalScreener(fetch_info=lambda ticker: yf.Ticker(ticker, session=_browser_session()).info)
+
+@st.cache_data(ttl=600, max_entries=4)
+def load_screener_table(version):
+    """유니버스 + 펀더멘털 테이블 (저장 버전이 바뀔 때만 다시 구성, 필터링은 메모리에서)"""
+    return get_screener().table()
+
+@st.cache_resource
+def get_indicator_engine(name):
+    """기술적 지표 엔진 (롤링 상태는 프로세스 전체에서 공유, 디스크에 저장)"""
+    return IndicatorEngine(name)
+
+@shared_cache.cached(ttl=600)
+def fetch_holding_indicators(tickers):
+    """보유종목 기술적 지표 (상태가 있으면 최근 1개월만 배치 조회, 10분 캐시)"""
+    return get_indicator_engine("holdings").refresh(list(tickers))
+
+@st.cache_resource
+def get_alert_engine():
+    """알림 규칙 엔진 (컴파일된 규칙은 프로세스 전체에서 공유)"""
+    return AlertEngine()
+
+@st.cache_resource(ttl=600)
+def get_attribution_engine():
+    """성과 기여도 엔진 (전 ETF × 전 날짜 행렬은 프로세스 전체에서 공유, 10분마다 재계산)"""
+    engine = AttributionEngine()
+    engine.load()
+    return engine
+
+@shared_cache.cached(ttl=30)
+def fetch_inav_returns(tickers, snapshot_dates):
+    """스냅샷 평가 시점 대비 고유 티커 전체 수익률 (세션 간 공유, 30초 캐시, 티커/스냅샷일이 바뀌면 새로 조회)"""
+    return get_inav_engine().fetch_returns()
+
+@st.cache_resource
+def get_pdf_executor():
+    """PDF 탭 리밸런싱 분석용 백그라운드 작업자 (프로세스 공유)"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="pdf-analysis")
+
+def run_pdf_analysis(etf_idx, etf_name, today, df_today, alert_engine=None):
+    """
+    전일 데이터 조회 + 시장 수익률 수집 + 리밸런싱 분석 + 알림 규칙 평가 (백그라운드 스레드에서 실행)
+
+    Streamlit API를 호출하지 않으며, (전일 날짜, 분석 결과)를 반환한다.
+    """
+    monitor = ActiveETFMonitor(url=f"https://timefolioetf.co.kr/m11_view.php?idx={etf_idx}", etf_name=etf_name)
+    prev_day = monitor.get_previous_business_day(today)
+    df_prev = monitor.load_data(prev_day)
+    analysis = monitor.analyze_rebalancing(df_today, df_prev, prev_day, today)
+    try:
+        if alert_engine is not None:
+            alert_engine.run()
+    except Exception as e:
+        print(f"[WARN] 알림 규칙 평가 실패: {type(e).__name__}: {e}")
+    return prev_day, analysis
+
 # 데이터 로드
 metrics, histories = fetch_market_data()
 
@@ -141,10 +305,33 @@ with st.sidebar:
     st.caption("Ver 2.0 - News & Rebalancing")
     st.markdown("---")
     
-    menu = st.radio("메뉴 선택", ["📌 시장 동향", "🔍 기업 펀더멘털 스카우터", "📰 글로벌 산업 뉴스", "📊 타임폴리오 실시간 PDF"])
+    menu = st.radio("메뉴 선택", ["📌 시장 동향", "🔍 기업 펀더멘털 스카우터", "📋 보유종목 스크리너", "📰 글로벌 산업 뉴스", "📊 타임폴리오 실시간 PDF", "⚡ 실시간 iNAV", "🗂️ 리밸런싱 이벤트 검색", "🧮 성과 기여도 분석", "🔔 알림 규칙"], key="menu")
     
     if st.button("🔄 데이터 새로고침"):
+        # 모든 레플리카의 공유 캐시까지 무효화
         st.cache_data.clear()
+        shared_cache.get_cache().invalidate()
+
+    # 세션 간 동시 요청 병합 현황 (크롤링/가격 조회/분석/저장)
+    with st.expander("⚙️ 요청 병합 통계", expanded=False):
+        flight_stats = SINGLE_FLIGHT.stats()
+        if flight_stats:
+            st.dataframe(pd.DataFrame(flight_stats).T.rename(columns={
+                'calls': '호출', 'executed': '실행', 'coalesced': '병합'}), use_container_width=True)
+        else:
+            st.caption("아직 기록된 요청이 없습니다.")
+        cache_stats = shared_cache.get_cache().stats()
+        st.caption(f"공유 캐시({cache_stats['backend']}): 항목 {cache_stats['entries']}개, "
+                   f"L1 적중 {cache_stats['l1_hits']} / L2 적중 {cache_stats['l2_hits']} / "
+                   f"미스 {cache_stats['misses']} (대기 {cache_stats['waited']}), 세대 {cache_stats['generation']}")
+        limits = limiter_metrics()
+        if limits:
+            st.caption("호스트별 적응형 동시성 제한")
+            st.dataframe(pd.DataFrame(limits).T[['limit', 'inflight', 'waiting', 'latency_ms', 'baseline_ms',
+                                                 'ok', 'overload', 'slowdown', 'error']].rename(columns={
+                'limit': '제한', 'inflight': '진행', 'waiting': '대기', 'latency_ms': '지연(ms)',
+                'baseline_ms': '기준(ms)', 'ok': '성공', 'overload': '과부하', 'slowdown': '감속', 'error': '오류'}),
+                use_container_width=True)
 
 # ---------------------------------------------------------
 # 4. 메인 화면
@@ -182,7 +369,7 @@ if menu == "📌 시장 동향":
             
             # 미니 차트 (확장기능)
             if key in histories and not histories[key].empty:
-                col.line_chart(histories[key]['Close'], height=100)
+                col.line_chart(get_mini_chart_series(key), height=100)
 
     # 1열 출력
     for col, key in zip(row1_cols, indicators_row1):
@@ -194,6 +381,15 @@ if menu == "📌 시장 동향":
     for col, key in zip(row2_cols, indicators_row2):
         display_metric(col, key)
 
+    # 기술적 지표 (전 지표를 한 번에 계산한 결과)
+    technicals = pd.DataFrame({key: d['indicators'] for key, d in metrics.items() if d.get('indicators')}).T
+    if not technicals.empty:
+        st.markdown("##### 📐 기술적 지표")
+        technicals = technicals.rename(columns=INDICATOR_LABELS)
+        technicals.insert(1, '추세(MA20)', [metrics[key]['trend'] for key in technicals.index])
+        st.dataframe(technicals, use_container_width=True, column_config={
+            col: st.column_config.NumberColumn(format="%.2f") for col in INDICATOR_LABELS.values()})
+
 elif menu == "🔍 기업 펀더멘털 스카우터":
     st.title("🔍 Stock Fundamental Scout")
     st.markdown("관심 종목의 **핵심 펀더멘털 지표**와 **컨센서스**를 한눈에 파악하세요.")
@@ -209,12 +405,8 @@ elif menu == "🔍 기업 펀더멘털 스카우터":
 
         if ticker_input:
             try:
-                # SSL 인증서 검증 비활성화 & 브라우저 위장 세션 생성 (curl_cffi 사용)
-                # impersonate="chrome"을 사용하여 봇 탐지 우회
-                session = curequests.Session(impersonate="chrome")
-                session.verify = False
-                stock = yf.Ticker(ticker_input, session=session)
-                info = stock.info
+                # 종목 정보 (레플리카 간 공유 캐시)
+                info = fetch_stock_info(ticker_input)
                 
                 # 1. 헤더 정보
                 st.subheader(f"{info.get('longName', ticker_input)} ({ticker_input})")
@@ -240,12 +432,13 @@ elif menu == "🔍 기업 펀더멘털 스카우터":
                     c1, c2 = st.columns(2)
                     with c1:
                         st.markdown("##### 💎 밸류에이션")
+                        ratio = lambda key: f"{info[key]:.2f}" if isinstance(info.get(key), (int, float)) else 'N/A'
                         df_val = pd.DataFrame([
-                            {"지표": "Trailing P/E", "값": info.get('trailingPE', 'N/A')},
-                            {"지표": "Forward P/E", "값": info.get('forwardPE', 'N/A')},
-                            {"지표": "PEG Ratio", "값": info.get('pegRatio', 'N/A')},
-                            {"지표": "Price/Book (PBR)", "값": info.get('priceToBook', 'N/A')},
-                            {"지표": "Price/Sales (PSR)", "값": info.get('priceToSalesTrailing12Months', 'N/A')},
+                            {"지표": "Trailing P/E", "값": ratio('trailingPE')},
+                            {"지표": "Forward P/E", "값": ratio('forwardPE')},
+                            {"지표": "PEG Ratio", "값": ratio('pegRatio')},
+                            {"지표": "Price/Book (PBR)", "값": ratio('priceToBook')},
+                            {"지표": "Price/Sales (PSR)", "값": ratio('priceToSalesTrailing12Months')},
                         ])
                         st.dataframe(df_val, hide_index=True, use_container_width=True)
                         
@@ -255,7 +448,7 @@ elif menu == "🔍 기업 펀더멘털 스카우터":
                             {"지표": "ROE", "값": f"{info.get('returnOnEquity', 0)*100:.2f}%" if info.get('returnOnEquity') else 'N/A'},
                             {"지표": "Profit Margin", "값": f"{info.get('profitMargins', 0)*100:.2f}%" if info.get('profitMargins') else 'N/A'},
                             {"지표": "Dividend Yield", "값": f"{info.get('dividendRate', 0)*100:.2f}%" if info.get('dividendRate') else 'N/A'},
-                            {"지표": "Beta", "값": info.get('beta', 'N/A')},
+                            {"지표": "Beta", "값": ratio('beta')},
                         ])
                         st.dataframe(df_prf, hide_index=True, use_container_width=True)
                     
@@ -263,7 +456,7 @@ elif menu == "🔍 기업 펀더멘털 스카우터":
 
                 with t2:
                     st.markdown("##### 최근 1년 주가 흐름")
-                    hist = stock.history(period="1y")
+                    hist = fetch_stock_history(ticker_input)
                     if not hist.empty:
                         st.line_chart(hist['Close'])
                     else:
@@ -272,10 +465,106 @@ elif menu == "🔍 기업 펀더멘털 스카우터":
             except Exception as e:
                 st.error(f"데이터를 가져오는 중 오류가 발생했습니다: {e}") 
 
+elif menu == "📋 보유종목 스크리너":
+    st.title("📋 Holdings Fundamental Screener")
+    st.markdown("타임폴리오 **전 ETF 보유종목**을 펀더멘털 지표로 순위화합니다. 갱신은 오래된 종목만 병렬로 조회합니다.")
+
+    screener = get_screener()
+    c1, c2 = st.columns([1, 3])
+    with c1:
+        if st.button("🔄 펀더멘털 갱신 (오래된 종목만)"):
+            progress = st.progress(0.0)
+            stats = screener.refresh(progress=lambda done, total: progress.progress(done / total))
+            progress.empty()
+            st.toast(f"조회 {stats['fetched']}건, 실패 {stats['failed']}건, 보류 {stats['skipped']}건 "
+                     f"({stats['seconds']:.1f}초)")
+    table = load_screener_table(screener.version())
+    with c1:
+        with_technicals = st.checkbox("📐 기술적 지표 포함", help="최초 1회는 전 종목 1년치 일봉을 조회합니다.")
+    if with_technicals and not table.empty:
+        technicals = fetch_holding_indicators(tuple(table['티커'])).drop(columns='close')
+        table = table.merge(technicals.rename(columns=INDICATOR_LABELS), left_on='티커', right_index=True, how='left')
+    technical_columns = [INDICATOR_LABELS[name] for name in ('ma20', 'ma60', 'rsi', 'volatility', 'drawdown', 'zscore')
+                         if INDICATOR_LABELS[name] in table.columns]
+    with c2:
+        covered = int(table['현재가'].notna().sum()) if not table.empty else 0
+        st.caption(f"유니버스 {len(table):,}종목 중 펀더멘털 보유 {covered:,}종목 "
+                   f"(마지막 조회 {table['조회시각'].max():%Y-%m-%d %H:%M} UTC)" if covered else
+                   f"유니버스 {len(table):,}종목, 아직 조회한 펀더멘털이 없습니다.")
+
+    if table.empty:
+        st.info("저장된 PDF 스냅샷이 없습니다. PDF 탭에서 스냅샷을 먼저 수집하세요.")
+    else:
+        f1, f2, f3 = st.columns(3)
+        with f1:
+            sectors = st.multiselect("섹터", sorted(table['섹터'].dropna().unique()))
+        with f2:
+            etfs = st.multiselect("보유 ETF", list(ETF_NAMES.values()))
+        with f3:
+            query = st.text_input("티커/종목명 검색", "")
+
+        f4, f5, f6, f7 = st.columns(4)
+        with f4:
+            max_fpe = st.number_input("Forward P/E 이하 (0=제한 없음)", 0.0, 1000.0, 0.0, step=5.0)
+        with f5:
+            max_peg = st.number_input("PEG 이하 (0=제한 없음)", 0.0, 100.0, 0.0, step=0.5)
+        with f6:
+            min_roe = st.number_input("ROE(%) 이상", -100.0, 500.0, -100.0, step=5.0)
+        with f7:
+            min_upside = st.number_input("상승여력(%) 이상", -100.0, 500.0, -100.0, step=5.0)
+
+        s1, s2, s3 = st.columns([2, 1, 1])
+        with s1:
+            sort_by = st.selectbox("정렬 기준", NUMERIC_COLUMNS + technical_columns,
+                                   index=NUMERIC_COLUMNS.index('상승여력(%)'))
+        with s2:
+            ascending = st.radio("순서", ["내림차순", "오름차순"], horizontal=True) == "오름차순"
+        with s3:
+            limit = st.number_input("표시 종목 수", 10, 2000, 100, step=10)
+
+        ranges = {'ROE(%)': (min_roe, None) if min_roe > -100 else (None, None),
+                  '상승여력(%)': (min_upside, None) if min_upside > -100 else (None, None),
+                  'Forward P/E': (None, max_fpe) if max_fpe > 0 else (None, None),
+                  'PEG': (None, max_peg) if max_peg > 0 else (None, None)}
+        ranges = {col: bounds for col, bounds in ranges.items() if bounds != (None, None)}
+        started = time.perf_counter()
+        result = screen(table, ranges=ranges, sectors=sectors, etfs=etfs, query=query,
+                        sort_by=sort_by, ascending=ascending, limit=int(limit))
+        st.caption(f"{len(result):,}종목 표시 · 스크리닝 {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        view = result[['티커', '종목명', '섹터', '현재가', '목표가', '상승여력(%)', 'Trailing P/E', 'Forward P/E', 'PEG',
+                       'PBR', 'PSR', 'ROE(%)', '영업이익률(%)', '순이익률(%)', 'Beta', '애널리스트 수',
+                       '보유 ETF 수', '합산 비중(%)', '보유 ETF'] + technical_columns]
+        st.dataframe(view, hide_index=True, use_container_width=True, column_config={
+            col: st.column_config.NumberColumn(format="%.2f") for col in
+            ['현재가', '목표가', '상승여력(%)', 'Trailing P/E', 'Forward P/E', 'PEG', 'PBR', 'PSR', 'ROE(%)',
+             '영업이익률(%)', '순이익률(%)', 'Beta', '합산 비중(%)'] + technical_columns})
+
+        if not result.empty and result['Forward P/E'].notna().any():
+            fig = px.scatter(result.dropna(subset=['Forward P/E', '상승여력(%)']), x='Forward P/E', y='상승여력(%)',
+                             size='합산 비중(%)', color='섹터', hover_name='티커', hover_data=['종목명', '보유 ETF'],
+                             title="Forward P/E vs 상승여력 (크기: 전 ETF 합산 비중)")
+            st.plotly_chart(fig, use_container_width=True)
+
 elif menu == "📰 글로벌 산업 뉴스":
     st.title("📰 Global Industry & Macro News")
     st.markdown("주요 산업 및 거시 경제 관련 최신 뉴스를 실시간으로 확인하세요.")
-    
+
+    # --- 뉴스 아카이브 검색 (수집한 모든 헤드라인) ---
+    archive = get_news_archive()
+    with st.expander("🔎 뉴스 아카이브 검색", expanded=bool(st.session_state.get('news_query'))):
+        news_query = st.text_input("회사명 / 티커 / 키워드 (공백=AND, OR 지원)", key="news_query",
+                                   placeholder="예: NVIDIA OR NVDA")
+        if news_query:
+            # PDF 탭에서 넘어온 경우 최신 뉴스를 먼저 수집해 아카이브에 누적
+            fetch_holding_news(news_query)
+            results, elapsed = archive.timed_search(news_query, limit=50)
+            st.caption(f"아카이브 {archive.count():,}건 중 {len(results)}건 ({elapsed:.1f}ms)")
+            for row in results.itertuples():
+                st.markdown(f"**[{row.title}]({row.link})**  \n{row.source} | {row.published}")
+            if results.empty:
+                st.info("일치하는 뉴스가 없습니다.")
+
     # 탭으로 분야 구분
     topics = ["AI & 반도체", "2차전지 & EV", "바이오 & 헬스케어", "글로벌 거시경제"]
     tabs = st.tabs(topics)
@@ -298,18 +587,7 @@ elif menu == "📰 글로벌 산업 뉴스":
 elif menu == "📊 타임폴리오 실시간 PDF":
     st.title("📊 TIMEFOLIO Official Portfolio & Rebalancing")
     
-    etf_categories = {
-        "해외주식형 (10종)": {
-            "글로벌탑픽": "22", "글로벌바이오": "9", "우주테크&방산": "20",
-            "S&P500": "5", "나스닥100": "2", "글로벌AI": "6",
-            "차이나AI": "19", "미국배당다우존스": "18",
-            "미국나스닥100채권혼합50": "10", "글로벌소비트렌드": "8"
-        },
-        "국내주식형 (7종)": {
-            "K신재생에너지": "16", "K바이오": "13", "Korea플러스배당": "12",
-            "코스피": "11", "코리아밸류업": "15", "K이노베이션": "17", "K컬처": "1"
-        }
-    }
+    etf_categories = ETF_CATEGORIES
     
     c1, c2 = st.columns(2)
     with c1:
@@ -320,150 +598,188 @@ elif menu == "📊 타임폴리오 실시간 PDF":
     target_idx = etf_categories[cat][name]
     
     if st.button("데이터 분석 및 리밸런싱 요약"):
-        with st.spinner(f"'{name}' 데이터를 수집 및 분석 중입니다..."):
+        # 1단계: 금일 PDF 수집 (화면에 가장 먼저 보여줄 데이터)
+        with st.spinner(f"'{name}' PDF를 수집 중입니다..."):
             try:
-                # ActiveETFMonitor 초기화
-                monitor = ActiveETFMonitor(url=f"https://timefolioetf.co.kr/m11_view.php?idx={target_idx}", etf_name=name)
-                
                 # 금일 날짜 (한국 시간)
                 today = datetime.now(pytz.timezone('Asia/Seoul')).strftime("%Y-%m-%d")
                 
-                # 금일 데이터 수집
-                df_today = monitor.get_portfolio_data(today)
+                # ActiveETFMonitor 초기화 및 금일 데이터 수집
+                monitor = ActiveETFMonitor(url=f"https://timefolioetf.co.kr/m11_view.php?idx={target_idx}", etf_name=name)
+                df_today = apply_holdings_schema(fetch_pdf_snapshot(target_idx, today))
                 monitor.save_data(df_today, today)
-                
-                # 전일 데이터 로드 (없으면 크롤링)
-                try:
-                    prev_day = monitor.get_previous_business_day(today)
-                    df_prev = monitor.load_data(prev_day)
-                    
-                    # 리밸런싱 분석 수행
-                    analysis = monitor.analyze_rebalancing(df_today, df_prev, prev_day, today)
-                    analysis_success = True
-                except Exception as e:
-                    st.warning(f"전일 데이터를 찾을 수 없어 리밸런싱 분석을 건너뜁니다: {e}")
-                    analysis_success = False
-                    df_prev = None
-
-                st.success(f"✅ {name} 데이터 분석 완료" + (f" (기준: {today} vs {prev_day})" if analysis_success else ""))
-
-                # --- 리밸런싱 요약 (분석 성공 시) ---
-                if analysis_success:
-                    st.subheader("🔄 리밸런싱 정밀 분석 (시장수익률 조정 반영)")
-                    
-                    # 요약 메트릭
-                    m1, m2, m3, m4 = st.columns(4)
-                    m1.metric("비중 확대", f"{len(analysis['increased_stocks'])} 종목")
-                    m2.metric("비중 축소", f"{len(analysis['decreased_stocks'])} 종목")
-                    m3.metric("신규 편입", f"{len(analysis['new_stocks'])} 종목")
-                    m4.metric("완전 편출", f"{len(analysis['removed_stocks'])} 종목")
-
-                    # 탭 구성
-                    tab1, tab2, tab3 = st.tabs(["주요 변경내역", "세부 변동", "전체 포트폴리오"])
-                    
-                    with tab1:
-                        # 신규 편입 & 편출
-                        c1, c2 = st.columns(2)
-                        with c1:
-                            st.markdown("##### 🟢 신규 편입")
-                            if analysis['new_stocks']:
-                                rows = []
-                                for s in analysis['new_stocks']:
-                                    rows.append({
-                                        "종목명": s['종목명'],
-                                        "현재비중": f"{s['비중_today']:.2f}%",
-                                        "순수변동": f"+{s['순수_비중변화']:.2f}%p"
-                                    })
-                                st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
-                            else:
-                                st.caption("신규 편입 종목 없음")
-
-                        with c2:
-                            st.markdown("##### 🔴 완전 편출")
-                            if analysis['removed_stocks']:
-                                rows = []
-                                for s in analysis['removed_stocks']:
-                                    rows.append({
-                                        "종목명": s['종목명'],
-                                        "이전비중": f"{s['비중_prev']:.2f}%",
-                                        "순수변동": f"{s['순수_비중변화']:.2f}%p"
-                                    })
-                                st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
-                            else:
-                                st.caption("완전 편출 종목 없음")
-
-                    with tab2:
-                        # 비중 확대 & 축소
-                        c1, c2 = st.columns(2)
-                        with c1:
-                            st.markdown("##### 🔼 비중 확대 (Top 5)")
-                            if analysis['increased_stocks']:
-                                df_inc = pd.DataFrame(analysis['increased_stocks'])
-                                df_inc = df_inc.sort_values('순수_비중변화', ascending=False).head(5)
-                                display_df = df_inc[['종목명', '비중_prev', '비중_today', '순수_비중변화']].copy()
-                                display_df.columns = ['종목명', '이전(%)', '현재(%)', '변동(%p)']
-                                st.dataframe(display_df.style.format({'이전(%)': '{:.2f}', '현재(%)': '{:.2f}', '변동(%p)': '+{:.2f}'}), hide_index=True, use_container_width=True)
-                            else:
-                                st.caption("비중 확대 종목 없음")
-
-                        with c2:
-                            st.markdown("##### 🔽 비중 축소 (Top 5)")
-                            if analysis['decreased_stocks']:
-                                df_dec = pd.DataFrame(analysis['decreased_stocks'])
-                                df_dec = df_dec.sort_values('순수_비중변화', ascending=True).head(5)
-                                display_df = df_dec[['종목명', '비중_prev', '비중_today', '순수_비중변화']].copy()
-                                display_df.columns = ['종목명', '이전(%)', '현재(%)', '변동(%p)']
-                                st.dataframe(display_df.style.format({'이전(%)': '{:.2f}', '현재(%)': '{:.2f}', '변동(%p)': '{:.2f}'}), hide_index=True, use_container_width=True)
-                            else:
-                                st.caption("비중 축소 종목 없음")
-                                
-                        st.info("* **순수 변동**: 시장 가격 등락에 의한 '가상 비중'을 제외한 매니저의 실제 매매로 인한 비중 변화 (추정치)")
-
-                    with tab3:
-                        st.markdown("##### 📋 전체 포트폴리오 구성")
-                else:
-                    # 분석 실패 시 기본 탭
-                    st.subheader("📋 전체 포트폴리오 구성")
 
-                # 전체 리스트 및 차트 (공통)
-                col_chart, col_list = st.columns([1, 1])
+                # 2단계: 전일 조회 + 수익률 수집 + 분석은 백그라운드에서 진행
+                st.session_state['pdf_job'] = {
+                    'idx': target_idx,
+                    'name': name,
+                    'today': today,
+                    'df_today': df_today,
+                    'content_hash': monitor.compute_content_hash(df_today),
+                    'future': get_pdf_executor().submit(run_pdf_analysis, target_idx, name, today, df_today,
+                                                       get_alert_engine()),
+                    'started': time.time(),
+                }
+            except Exception as e:
+                st.session_state.pop('pdf_job', None)
+                st.error(f"데이터 처리 중 오류가 발생했습니다: {e}")
+                st.exception(e)
+
+    job = st.session_state.get('pdf_job')
+    if job and job['idx'] == target_idx:
+        today, df_today, content_hash = job['today'], job['df_today'], job['content_hash']
+        future = job['future']
+
+        st.success(f"✅ {name} PDF 수집 완료 ({today}, {len(df_today)}개 종목)")
+
+        # 분석 결과 영역 (수익률 수집이 끝나면 채워짐)
+        analysis_area = st.container()
+
+        # --- 전체 포트폴리오 (수집 직후 바로 표시) ---
+        st.subheader("📋 전체 포트폴리오 구성")
+        col_chart, col_list = st.columns([1, 1])
+        
+        with col_chart:
+            # 파이 차트 (1% 미만 기타 처리)
+            fig = get_chart_figure("pie", target_idx, today, content_hash, name, df_today)
+            st.plotly_chart(fig, use_container_width=True)
+
+        with col_list:
+            # 간단한 리스트 출력 (상위 15개)
+            top_df = df_today[['종목명', '비중', '수량']].head(15)
+            st.dataframe(top_df.style.format({'비중': '{:.2f}%', '수량': '{:,}'}), use_container_width=True)
+
+            # 보유종목 뉴스 → 뉴스 탭 아카이브 검색으로 이동
+            holdings = df_today[(df_today['종목명'] != '현금') & (df_today['종목코드'].astype(str) != '')]
+            if not holdings.empty:
+                news_options = {
+                    holding_query(str(row.종목명), ActiveETFMonitor._ticker_from_code(str(row.종목코드))): str(row.종목명)
+                    for row in holdings.head(30).itertuples()
+                }
+                news_target = st.selectbox("종목 뉴스", list(news_options), format_func=news_options.get,
+                                           key=f"pdf_news_{target_idx}")
+
+                def open_holding_news(query):
+                    st.session_state['menu'] = "📰 글로벌 산업 뉴스"
+                    st.session_state['news_query'] = query
+
+                st.button("📰 이 종목 뉴스 보기", on_click=open_holding_news, args=(news_target,))
+
+        # --- [신규 기능 3] 트리맵 (히트맵) ---
+        st.markdown("##### 🗺️ 포트폴리오 히트맵")
+        # 트리맵 (현금 제외)
+        # 추후 etf_monitor.py에서 등락률까지 가져오면 color='등락률' 적용 가능
+        fig_tree = get_chart_figure("treemap", target_idx, today, content_hash, name, df_today)
+        if fig_tree is not None:
+            st.plotly_chart(fig_tree, use_container_width=True)
+        else:
+            st.info("시각화할 데이터가 없습니다.")
+
+        # --- 리밸런싱 분석 (백그라운드 완료 시) ---
+        with analysis_area:
+            if not future.done():
+                @st.fragment(run_every=1)
+                def poll_pdf_analysis():
+                    if future.done():
+                        st.rerun()
+                    st.info(f"⏳ 전일 데이터 조회 및 시장 수익률 수집 중... ({time.time() - job['started']:.0f}초 경과)")
+
+                poll_pdf_analysis()
+                analysis = None
+            elif future.exception() is not None:
+                st.warning(f"전일 데이터를 찾을 수 없어 리밸런싱 분석을 건너뜁니다: {future.exception()}")
+                analysis = None
+            else:
+                prev_day, analysis = future.result()
+                st.subheader(f"🔄 리밸런싱 정밀 분석 (시장수익률 조정 반영, 기준: {today} vs {prev_day})")
                 
-                with col_chart:
-                    # 파이 차트용 데이터 준비
-                    chart_df = df_today.copy()
-                    chart_df['비중'] = pd.to_numeric(chart_df['비중'], errors='coerce')
-                    chart_df.loc[chart_df['비중'] < 1.0, '종목명'] = '기타' # 1% 미만 기타 처리
-                    
-                    fig = px.pie(chart_df, values="비중", names="종목명", hole=0.4, title="포트폴리오 비중",
-                                color_discrete_sequence=px.colors.qualitative.Set3)
-                    st.plotly_chart(fig, use_container_width=True)
-
-                # --- [신규 기능 3] 트리맵 (히트맵) ---
-                with tab3:
-                    st.markdown("##### 🗺️ 포트폴리오 히트맵")
-                    # 트리맵용 데이터 준비 (현금 제외)
-                    tree_df = df_today[df_today['종목명'] != '현금'].copy()
-                    if not tree_df.empty:
-                        # 색상을 위한 등락폭 데이터가 있다면 좋겠지만, 지금은 비중 크기로만 시각화
-                        # 추후 etf_monitor.py에서 등락률까지 가져오면 color='등락률' 적용 가능
-                        fig_tree = px.treemap(tree_df, path=['종목명'], values='비중',
-                                             color='비중', color_continuous_scale='Viridis',
-                                             title=f"{name} 보유 종목 맵 (Size=비중)")
-                        fig_tree.update_traces(textinfo="label+value+percent entry")
-                        st.plotly_chart(fig_tree, use_container_width=True)
-                    else:
-                        st.info("시각화할 데이터가 없습니다.")
+                # 요약 메트릭
+                m1, m2, m3, m4 = st.columns(4)
+                m1.metric("비중 확대", f"{len(analysis['increased_stocks'])} 종목")
+                m2.metric("비중 축소", f"{len(analysis['decreased_stocks'])} 종목")
+                m3.metric("신규 편입", f"{len(analysis['new_stocks'])} 종목")
+                m4.metric("완전 편출", f"{len(analysis['removed_stocks'])} 종목")
 
-                    st.markdown("##### 📋 전체 포트폴리오 구성")
+                # 종목별 수익률 소스 요약 (yfinance 장애 시 PDF 가격 대체 여부)
+                source_counts = pd.Series(analysis['return_sources'], dtype=object).value_counts()
+                source_labels = {'yfinance': 'yfinance', 'pdf': 'PDF 가격', 'cash': '현금', 'zero': '0% 가정'}
+                st.caption("수익률 소스: " + " · ".join(
+                    f"{source_labels.get(k, k)} {v}종목" for k, v in source_counts.items()))
 
-                # --- [신규 기능 2] 엑셀 다운로드 ---
-                st.markdown("---")
-                st.subheader("📥 보고서 다운로드")
+                # 탭 구성
+                tab1, tab2 = st.tabs(["주요 변경내역", "세부 변동"])
                 
-                # 엑셀 생성을 위한 데이터 프레임 준비
-                e_new = pd.DataFrame(analysis['new_stocks']) if analysis['new_stocks'] else pd.DataFrame(columns=['종목명', '비중_today', '순수_비중변화'])
-                e_inc = pd.DataFrame(analysis['increased_stocks']) if analysis['increased_stocks'] else pd.DataFrame(columns=['종목명', '비중_prev', '비중_today', '순수_비중변화'])
-                e_dec = pd.DataFrame(analysis['decreased_stocks']) if analysis['decreased_stocks'] else pd.DataFrame(columns=['종목명', '비중_prev', '비중_today', '순수_비중변화'])
+                with tab1:
+                    # 신규 편입 & 편출
+                    c1, c2 = st.columns(2)
+                    with c1:
+                        st.markdown("##### 🟢 신규 편입")
+                        if analysis['new_stocks']:
+                            rows = []
+                            for s in analysis['new_stocks']:
+                                rows.append({
+                                    "종목명": s['종목명'],
+                                    "현재비중": f"{s['비중_today']:.2f}%",
+                                    "순수변동": f"+{s['순수_비중변화']:.2f}%p"
+                                })
+                            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+                        else:
+                            st.caption("신규 편입 종목 없음")
+
+                    with c2:
+                        st.markdown("##### 🔴 완전 편출")
+                        if analysis['removed_stocks']:
+                            rows = []
+                            for s in analysis['removed_stocks']:
+                                rows.append({
+                                    "종목명": s['종목명'],
+                                    "이전비중": f"{s['비중_prev']:.2f}%",
+                                    "순수변동": f"{s['순수_비중변화']:.2f}%p"
+                                })
+                            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+                        else:
+                            st.caption("완전 편출 종목 없음")
+
+                with tab2:
+                    # 비중 확대 & 축소
+                    c1, c2 = st.columns(2)
+                    with c1:
+                        st.markdown("##### 🔼 비중 확대 (Top 5)")
+                        if analysis['increased_stocks']:
+                            df_inc = pd.DataFrame(analysis['increased_stocks'])
+                            df_inc = df_inc.sort_values('순수_비중변화', ascending=False).head(5)
+                            display_df = df_inc[['종목명', '비중_prev', '비중_today', '순수_비중변화']].copy()
+                            display_df.columns = ['종목명', '이전(%)', '현재(%)', '변동(%p)']
+                            st.dataframe(display_df.style.format({'이전(%)': '{:.2f}', '현재(%)': '{:.2f}', '변동(%p)': '+{:.2f}'}), hide_index=True, use_container_width=True)
+                        else:
+                            st.caption("비중 확대 종목 없음")
+
+                    with c2:
+                        st.markdown("##### 🔽 비중 축소 (Top 5)")
+                        if analysis['decreased_stocks']:
+                            df_dec = pd.DataFrame(analysis['decreased_stocks'])
+                            df_dec = df_dec.sort_values('순수_비중변화', ascending=True).head(5)
+                            display_df = df_dec[['종목명', '비중_prev', '비중_today', '순수_비중변화']].copy()
+                            display_df.columns = ['종목명', '이전(%)', '현재(%)', '변동(%p)']
+                            st.dataframe(display_df.style.format({'이전(%)': '{:.2f}', '현재(%)': '{:.2f}', '변동(%p)': '{:.2f}'}), hide_index=True, use_container_width=True)
+                        else:
+                            st.caption("비중 축소 종목 없음")
+                            
+                    st.info("* **순수 변동**: 시장 가격 등락에 의한 '가상 비중'을 제외한 매니저의 실제 매매로 인한 비중 변화 (추정치)")
+
+        # --- [신규 기능 2] 엑셀 다운로드 (열었을 때만 생성) ---
+        st.markdown("---")
+        st.subheader("📥 보고서 다운로드")
+        
+        if st.toggle("엑셀 리포트 준비", key=f"pdf_excel_{target_idx}"):
+            if not future.done():
+                st.caption("리밸런싱 분석이 끝나면 엑셀 리포트를 만들 수 있습니다.")
+            else:
+                # 엑셀 생성을 위한 데이터 프레임 준비 (분석 실패 시 포트폴리오 시트만 채움)
+                result = analysis or {'new_stocks': [], 'increased_stocks': [], 'decreased_stocks': []}
+                e_new = pd.DataFrame(result['new_stocks']) if result['new_stocks'] else pd.DataFrame(columns=['종목명', '비중_today', '순수_비중변화'])
+                e_inc = pd.DataFrame(result['increased_stocks']) if result['increased_stocks'] else pd.DataFrame(columns=['종목명', '비중_prev', '비중_today', '순수_비중변화'])
+                e_dec = pd.DataFrame(result['decreased_stocks']) if result['decreased_stocks'] else pd.DataFrame(columns=['종목명', '비중_prev', '비중_today', '순수_비중변화'])
                 
                 excel_data = to_excel(e_new, e_inc, e_dec, df_today, today)
                 
@@ -474,36 +790,266 @@ elif menu == "📊 타임폴리오 실시간 PDF":
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                 )
 
-                # --- [신규 기능 1] 종목 비중 히스토리 ---
-                st.markdown("---")
-                st.subheader("📅 종목 비중 히스토리 (최근 30일)")
-                
-                with st.expander("📈 개별 종목 트렌드 분석 펼치기", expanded=False):
-                    history_df = monitor.load_history(days=30)
-                    
-                    if not history_df.empty:
-                        # 종목 선택
-                        all_stocks = sorted(history_df['종목명'].unique())
-                        selected_stock = st.selectbox("분석할 종목을 선택하세요", all_stocks, index=0)
-                        
-                        # 선택 종목 데이터 필터링
-                        stock_history = history_df[history_df['종목명'] == selected_stock].sort_values('날짜')
-                        
-                        chart = px.line(stock_history, x='날짜', y='비중', title=f"{selected_stock} 비중 변화 추이",
-                                       markers=True, text='비중')
-                        chart.update_traces(textposition="top center")
-                        st.plotly_chart(chart, use_container_width=True)
-                    else:
-                        st.info("누적된 히스토리 데이터가 아직 없습니다. 매일 데이터를 수집하면 차트가 활성화됩니다.")
+        # --- [신규 기능 1] 종목 비중 히스토리 (열었을 때만 로드) ---
+        st.markdown("---")
+        st.subheader("📅 종목 비중 히스토리 (최근 30일)")
+        
+        if st.toggle("📈 개별 종목 트렌드 분석 펼치기", key=f"pdf_history_{target_idx}"):
+            monitor = ActiveETFMonitor(url=f"https://timefolioetf.co.kr/m11_view.php?idx={target_idx}", etf_name=name)
+            history_df = monitor.load_history(days=30)
+            
+            if not history_df.empty:
+                # 종목 선택
+                all_stocks = sorted(history_df['종목명'].astype(str).unique())
+                selected_stock = st.selectbox("분석할 종목을 선택하세요", all_stocks, index=0)
                 
-                with col_list:
-                    # 간단한 리스트 출력 (상위 15개)
-                    top_df = df_today[['종목명', '비중', '수량']].head(15)
-                    st.dataframe(top_df.style.format({'비중': '{:.2f}%', '수량': '{:,}'}), use_container_width=True)
-
-            except Exception as e:
-                st.error(f"데이터 처리 중 오류가 발생했습니다: {e}")
-                st.exception(e)
+                # 선택 종목 비중 추이 (화면 폭에 맞춰 다운샘플링)
+                history_hash = monitor.get_history_hash(history_df)
+                chart = get_chart_figure("history", target_idx, today, history_hash, name, history_df,
+                                         stock_name=selected_stock)
+                st.plotly_chart(chart, use_container_width=True)
+            else:
+                st.info("누적된 히스토리 데이터가 아직 없습니다. 매일 데이터를 수집하면 차트가 활성화됩니다.")
 
     st.markdown("---")
     st.link_button("🌐 공식 상세페이지 바로가기", f"https://timefolioetf.co.kr/m11_view.php?idx={target_idx}")
+
+elif menu == "⚡ 실시간 iNAV":
+    st.title("⚡ TIMEFOLIO Real-time iNAV")
+    st.markdown("전 ETF 보유종목의 **고유 티커 시세**를 한 번에 조회하여 장중 추정 순자산가치를 계산합니다.")
+
+    c1, c2, c3 = st.columns([1, 1, 2])
+    with c1:
+        refresh_sec = st.selectbox("갱신 주기", [30, 60, 120, 300], index=1, format_func=lambda x: f"{x}초")
+    with c2:
+        st.write("")
+        st.write("")
+        if st.button("📥 전 ETF 금일 PDF 수집"):
+            today = datetime.now(pytz.timezone('Asia/Seoul')).strftime("%Y-%m-%d")
+            progress = st.progress(0.0)
+
+            def collect(etf_idx, etf_name):
+                monitor = ActiveETFMonitor(url=f"https://timefolioetf.co.kr/m11_view.php?idx={etf_idx}", etf_name=etf_name)
+                monitor.save_data(monitor.get_portfolio_data(today), today)
+
+            # 병렬 수집 (타임폴리오 호스트 리미터가 동시 요청 수를 조절)
+            with ThreadPoolExecutor(max_workers=len(ETF_NAMES), thread_name_prefix="pdf-collect") as executor:
+                futures = {executor.submit(collect, etf_idx, etf_name): etf_name
+                           for etf_idx, etf_name in ETF_NAMES.items()}
+                for i, future in enumerate(as_completed(futures), 1):
+                    if future.exception() is not None:
+                        st.warning(f"{futures[future]} 수집 실패: {future.exception()}")
+                    progress.progress(i / len(ETF_NAMES))
+            get_inav_engine.clear()
+            fresh = get_alert_engine().run()
+            if fresh:
+                st.toast(f"🔔 새 알림 {len(fresh)}건")
+            # 정적 리포트 사이트 갱신 (변경된 ETF만, 백그라운드)
+            get_pdf_executor().submit(ReportSite().build)
+
+    engine = get_inav_engine()
+    with c3:
+        st.caption(f"ETF {len(engine.etfs)}개 × 고유 티커 {len(engine.tickers)}개 "
+                   f"(보유종목 쌍 {int((engine.holdings > 0).sum())}개)")
+
+    @st.fragment(run_every=refresh_sec)
+    def render_inav():
+        if not engine.tickers:
+            st.info("저장된 PDF 스냅샷이 없습니다. '전 ETF 금일 PDF 수집'을 먼저 실행하세요.")
+            return
+        try:
+            result = engine.compute(fetch_inav_returns(tuple(engine.tickers),
+                                                       tuple(sorted(set(engine.snapshot_dates.values())))))
+        except Exception as e:
+            st.error(f"시세 조회 중 오류가 발생했습니다: {e}")
+            return
+
+        st.caption(f"마지막 갱신: {datetime.now(pytz.timezone('Asia/Seoul')).strftime('%H:%M:%S')}")
+        result = result.sort_values('추정수익률(%)', ascending=False)
+        st.dataframe(
+            result[['ETF', '스냅샷일', '추정수익률(%)', '추정가치', '기준가치', '시세반영비중(%)']].style.format({
+                '추정수익률(%)': '{:+.2f}', '추정가치': '{:,.0f}', '기준가치': '{:,.0f}', '시세반영비중(%)': '{:.1f}'}),
+            hide_index=True, use_container_width=True)
+
+        fig = px.bar(result, x='ETF', y='추정수익률(%)', color='추정수익률(%)',
+                     color_continuous_scale='RdYlGn', title="ETF별 장중 추정수익률")
+        st.plotly_chart(fig, use_container_width=True)
+
+    render_inav()
+
+elif menu == "🗂️ 리밸런싱 이벤트 검색":
+    st.title("🗂️ Rebalancing Event Search")
+    st.markdown("분석 때마다 누적된 **편입/편출/비중 확대/축소 이벤트**를 종목·ETF·기간별로 검색합니다.")
+
+    store = RebalancingEventStore()
+    today = datetime.now(pytz.timezone('Asia/Seoul')).date()
+
+    c1, c2, c3 = st.columns([1, 2, 2])
+    with c1:
+        code_query = st.text_input("종목코드/티커 (예: NVDA)", "").strip()
+    with c2:
+        etf_filter = st.multiselect("ETF", list(ETF_NAMES.values()))
+    with c3:
+        type_filter = st.multiselect("이벤트 종류", list(EVENT_LABELS.keys()), format_func=EVENT_LABELS.get)
+
+    c4, c5, c6 = st.columns([2, 2, 1])
+    with c4:
+        date_range = st.date_input("기간", (today.replace(month=1, day=1), today))
+    with c5:
+        sort_options = {"최신순": ('date', False), "순수 비중변화 큰 순": ('pure_change', False),
+                        "순수 비중변화 작은 순 (축소 상위)": ('pure_change', True), "현재 비중 큰 순": ('weight_today', False)}
+        sort_label = st.selectbox("정렬", list(sort_options.keys()))
+    with c6:
+        limit = st.number_input("최대 건수", 10, 5000, 200, step=50)
+
+    start, end = (date_range if isinstance(date_range, tuple) and len(date_range) == 2 else (None, None))
+    order_by, ascending = sort_options[sort_label]
+    events, elapsed_ms = store.timed_query(
+        code=code_query or None, etf=etf_filter or None, event_type=type_filter or None,
+        start=start.isoformat() if start else None, end=end.isoformat() if end else None,
+        order_by=order_by, ascending=ascending, limit=int(limit))
+
+    st.caption(f"총 {store.count():,}건 중 {len(events):,}건 · 조회 {elapsed_ms:.1f}ms")
+    if events.empty:
+        st.info("조건에 맞는 이벤트가 없습니다. PDF 탭에서 분석을 실행하면 이벤트가 쌓입니다.")
+    else:
+        view = events[['date', 'etf_name', 'event_type', 'name', 'code', 'weight_prev', 'weight_today',
+                       'pure_change', 'market_return']].copy()
+        view['event_type'] = view['event_type'].map(EVENT_LABELS)
+        view['market_return'] = view['market_return'] * 100
+        view.columns = ['날짜', 'ETF', '이벤트', '종목명', '종목코드', '이전(%)', '현재(%)', '순수변동(%p)', '시장수익률(%)']
+        st.dataframe(view.style.format({'이전(%)': '{:.2f}', '현재(%)': '{:.2f}', '순수변동(%p)': '{:+.2f}',
+                                        '시장수익률(%)': '{:+.2f}'}), hide_index=True, use_container_width=True)
+
+elif menu == "🧮 성과 기여도 분석":
+    st.title("🧮 Performance Attribution")
+    st.markdown("저장된 PDF 히스토리로 ETF 수익률을 **보유종목별 기여도**로 분해합니다. (원화 기준, 환율 효과 포함)")
+
+    engine = get_attribution_engine()
+    funds = engine.fund_returns()
+    if funds.empty:
+        st.info("저장된 PDF 히스토리가 없습니다. PDF 탭에서 스냅샷을 먼저 수집하세요.")
+    else:
+        available = [idx for idx in ETF_NAMES if idx in set(funds['idx'])]
+        c1, c2 = st.columns([1, 2])
+        with c1:
+            selected_idx = st.selectbox("ETF 선택", available, format_func=ETF_NAMES.get)
+        fund = funds[funds['idx'] == selected_idx]
+        first_day, last_day = fund['날짜'].min().date(), fund['날짜'].max().date()
+        with c2:
+            date_range = st.date_input("기간", (first_day, last_day), min_value=first_day, max_value=last_day)
+        start, end = (date_range if isinstance(date_range, tuple) and len(date_range) == 2 else (first_day, last_day))
+
+        st.caption(f"ETF {funds['idx'].nunique()}개 × 저장일 {len(engine.rows):,}행 × 보유종목 {len(engine.holdings):,}개")
+
+        period = engine.period_attribution(selected_idx, start.isoformat(), end.isoformat())
+        window = fund[(fund['날짜'].dt.date >= start) & (fund['날짜'].dt.date <= end)]
+        period_return = period['기여도(%p)'].sum() if not period.empty else 0.0
+        m1, m2, m3 = st.columns(3)
+        m1.metric("기간 수익률", f"{period_return:+.2f}%")
+        m2.metric("최대 기여 종목", period['종목명'].iloc[0] if not period.empty else "-",
+                  f"{period['기여도(%p)'].iloc[0]:+.2f}%p" if not period.empty else None)
+        m3.metric("최소 기여 종목", period['종목명'].iloc[-1] if not period.empty else "-",
+                  f"{period['기여도(%p)'].iloc[-1]:+.2f}%p" if not period.empty else None)
+
+        tab1, tab2, tab3 = st.tabs(["📈 종목별 기여도", "🌏 지역별 기여도", "🏷️ 분류별 비교"])
+        with tab1:
+            fig = px.line(window, x='날짜', y='누적수익률(%)', title=f"{ETF_NAMES[selected_idx]} 누적 수익률 (보유종목 기준)")
+            st.plotly_chart(fig, use_container_width=True)
+            if period.empty:
+                st.info("선택한 기간에 비교할 저장일이 2개 이상 필요합니다.")
+            else:
+                top_n = st.slider("상/하위 종목 수", 5, 20, 10)
+                movers = pd.concat([period.head(top_n), period.tail(top_n)]).drop_duplicates('종목코드')
+                fig = px.bar(movers.sort_values('기여도(%p)'), x='기여도(%p)', y='종목명', orientation='h',
+                             color='기여도(%p)', color_continuous_scale='RdYlGn', title="기간 기여도 상/하위 종목")
+                st.plotly_chart(fig, use_container_width=True)
+                st.dataframe(period.style.format({'기여도(%p)': '{:+.2f}', '평균비중(%)': '{:.2f}'}),
+                             hide_index=True, use_container_width=True)
+        with tab2:
+            regions = engine.rollup(idx=selected_idx)
+            regions = regions[(regions['날짜'].dt.date >= start) & (regions['날짜'].dt.date <= end)]
+            fig = px.bar(regions, x='날짜', y='기여도(%p)', color='그룹', title="지역별 일간 기여도")
+            st.plotly_chart(fig, use_container_width=True)
+            st.dataframe(period.groupby('지역', as_index=False)[['기여도(%p)', '평균비중(%)']].sum()
+                         .sort_values('기여도(%p)', ascending=False)
+                         .style.format({'기여도(%p)': '{:+.2f}', '평균비중(%)': '{:.2f}'}),
+                         hide_index=True, use_container_width=True)
+        with tab3:
+            fig = px.line(engine.category_rollup(), x='날짜', y='누적수익률(%)', color='분류',
+                          title="분류별 평균 누적 수익률")
+            st.plotly_chart(fig, use_container_width=True)
+            latest = funds.groupby('ETF', as_index=False)['누적수익률(%)'].last().sort_values('누적수익률(%)', ascending=False)
+            fig = px.bar(latest, x='ETF', y='누적수익률(%)', color='누적수익률(%)', color_continuous_scale='RdYlGn',
+                         title="ETF별 누적 수익률 (저장 기간 전체)")
+            st.plotly_chart(fig, use_container_width=True)
+
+elif menu == "🔔 알림 규칙":
+    st.title("🔔 Alert Rules")
+    st.markdown("새 PDF가 저장될 때마다 **전 ETF에 모든 규칙을 한 번에 평가**하고, 처음 발생한 알림만 피드와 싱크로 보냅니다.")
+
+    alert_engine = get_alert_engine()
+    tab1, tab2 = st.tabs(["📣 알림 피드", "⚙️ 규칙 관리"])
+
+    with tab1:
+        c1, c2 = st.columns([1, 3])
+        with c1:
+            if st.button("▶️ 지금 평가"):
+                fresh = alert_engine.run()
+                st.toast(f"새 알림 {len(fresh)}건")
+        with c2:
+            stats = alert_engine.last_stats
+            if stats:
+                st.caption(f"최근 평가: ETF {stats['etfs']}개 × {stats['rows']:,}행, 규칙 {stats['rules']}개 → "
+                           f"일치 {stats['matched']}건 / 신규 {stats['new']}건 "
+                           f"(로드 {stats['load_ms']:.0f}ms, 평가 {stats['eval_ms']:.1f}ms)")
+            if alert_engine.rule_errors:
+                st.warning("평가 실패 규칙: " + ", ".join(f"{name} ({error})" for name, error in alert_engine.rule_errors.items()))
+            if stats.get('undelivered'):
+                st.warning(f"전달 실패 알림 {stats['undelivered']}건은 다음 평가 때 다시 전달합니다.")
+        feed = alert_engine.store.recent(200)
+        if feed.empty:
+            st.info("아직 발생한 알림이 없습니다.")
+        else:
+            feed.columns = ['발생시각', '중요도', '규칙', 'ETF', '기준일', '종목코드', '종목명', '내용']
+            st.dataframe(feed, hide_index=True, use_container_width=True)
+
+    with tab2:
+        rules_view = pd.DataFrame([rule.to_dict() for rule in alert_engine.rules],
+                                  columns=['name', 'condition', 'severity', 'enabled'])
+        edited = st.data_editor(
+            rules_view.rename(columns={'name': '이름', 'condition': '조건식', 'severity': '중요도', 'enabled': '사용'}),
+            disabled=['이름', '조건식', '중요도'], hide_index=True, use_container_width=True, key="alert_rules_editor")
+
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("💾 사용 여부 저장"):
+                for rule, enabled in zip(alert_engine.rules, edited['사용']):
+                    rule.enabled = bool(enabled)
+                save_rules(alert_engine.rules, alert_engine.rules_path)
+                st.success("저장했습니다.")
+        with c2:
+            remove = st.selectbox("삭제할 규칙", [""] + [rule.name for rule in alert_engine.rules])
+            if st.button("🗑️ 삭제") and remove:
+                alert_engine.rules = [rule for rule in alert_engine.rules if rule.name != remove]
+                save_rules(alert_engine.rules, alert_engine.rules_path)
+                st.rerun()
+
+        st.markdown("#### 새 규칙")
+        with st.form("new_alert_rule", clear_on_submit=True):
+            rule_name = st.text_input("이름", placeholder="예: 신규 편입 2% 초과")
+            condition = st.text_input("조건식", placeholder="예: event == 'new' and weight > 2")
+            severity = st.selectbox("중요도", SEVERITIES)
+            if st.form_submit_button("추가"):
+                try:
+                    if not rule_name.strip() or rule_name.strip() in {rule.name for rule in alert_engine.rules}:
+                        raise RuleError("이름이 비어 있거나 이미 있는 규칙입니다.")
+                    alert_engine.rules = alert_engine.rules + [AlertRule(rule_name.strip(), condition, severity)]
+                    save_rules(alert_engine.rules, alert_engine.rules_path)
+                    st.success(f"'{rule_name}' 규칙을 추가했습니다.")
+                except RuleError as e:
+                    st.error(str(e))
+
+        with st.expander("조건식에서 쓸 수 있는 이름/함수"):
+            st.dataframe(pd.DataFrame(list(FIELDS.items()) + list(FUNCTIONS.items()), columns=['이름', '설명']),
+                         hide_index=True, use_container_width=True)
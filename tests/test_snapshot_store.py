@@ -0,0 +1,160 @@
+"""SnapshotStore 키프레임 + 델타 저장의 왕복(round-trip) 복원 테스트"""
+
+import json
+import os
+import random
+
+import pandas as pd
+import pytest
+
+import snapshot_store
+from snapshot_store import FIELDS, SnapshotStore, convert_history
+
+
+def make_history(days: int, seed: int = 0) -> dict:
+    """날짜 → 저장 형식 스냅샷 (편입/편출/수량 변화/행 순서 변화/코드 없는 현금 중복 행 포함)"""
+    rng = random.Random(seed)
+    universe = [(f"T{i} US EQUITY", f"Stock {i}") for i in range(60)]
+    held = {key: rng.randint(100, 10_000) for key in rng.sample(universe, 25)}
+    history = {}
+    for day in pd.bdate_range("2026-01-05", periods=days):
+        date = day.strftime("%Y-%m-%d")
+        for key in list(held):
+            if rng.random() < 0.05:
+                del held[key]
+            elif rng.random() < 0.3:
+                held[key] = max(1, held[key] + rng.randint(-500, 500))
+        for key in rng.sample(universe, 2):
+            held.setdefault(key, rng.randint(100, 10_000))
+        rows = [[code, name, qty, qty * rng.randint(1_000, 300_000), 0.0] for (code, name), qty in held.items()]
+        rows += [['', '현금', 0, rng.randint(1_000_000, 5_000_000), 0.0] for _ in range(2)]
+        if rng.random() < 0.2:
+            rng.shuffle(rows)
+        total = sum(row[3] for row in rows)
+        for row in rows:
+            row[4] = round(row[3] / total * 100, 2)
+        frame = pd.DataFrame(rows, columns=FIELDS)
+        frame.insert(0, '날짜', date)
+        history[date] = frame
+    return history
+
+
+def assert_restores(store: SnapshotStore, expected: dict):
+    assert store.dates() == sorted(expected)
+    for date, frame in expected.items():
+        pd.testing.assert_frame_equal(store.load(date), frame, check_dtype=False)
+    for frame in store.load_range(list(expected)):
+        pd.testing.assert_frame_equal(frame, expected[frame['날짜'].iloc[0]], check_dtype=False)
+
+
+def kinds(store: SnapshotStore) -> dict:
+    return {date: 'keyframe' if os.path.exists(store.keyframe_path(date)) else 'delta' for date in store.dates()}
+
+
+def test_sequential_writes_round_trip(tmp_path):
+    history = make_history(30)
+    store = SnapshotStore(str(tmp_path), mode='delta', keyframe_interval=10)
+    for date in sorted(history):
+        store.write(history[date])
+    assert 'delta' in kinds(store).values()
+    assert_restores(store, history)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_write_order_round_trip(tmp_path, seed):
+    history = make_history(25, seed)
+    order = list(history)
+    random.Random(seed).shuffle(order)
+    store = SnapshotStore(str(tmp_path), mode='delta', keyframe_interval=6)
+    for i, date in enumerate(order, start=1):
+        store.write(history[date])
+        # 쓰는 도중에도 지금까지 쓴 모든 날짜가 정확히 복원되어야 함
+        assert_restores(store, {d: history[d] for d in order[:i]})
+
+
+def test_overwrite_rekeyframes_dependents(tmp_path):
+    history = make_history(12, seed=1)
+    dates = sorted(history)
+    store = SnapshotStore(str(tmp_path), mode='delta', keyframe_interval=20, max_delta_ratio=1.0)
+    for date in dates:
+        store.write(history[date])
+    assert kinds(store)[dates[5]] == 'delta' and kinds(store)[dates[6]] == 'delta'
+
+    # 장중 재게시: 중간 날짜를 다른 내용으로 덮어씀
+    replacement = make_history(12, seed=99)[dates[5]].assign(날짜=dates[5])
+    store.write(replacement)
+    history[dates[5]] = replacement
+
+    assert kinds(store)[dates[6]] == 'keyframe'
+    assert_restores(store, history)
+
+    # 같은 날짜를 한 번 더 덮어써도 이후 체인은 그대로 복원
+    store.write(history[dates[0]])
+    assert_restores(store, history)
+
+
+@pytest.mark.parametrize("interval", [1, 2, 3, 10])
+def test_keyframe_interval_boundaries(tmp_path, interval):
+    history = make_history(3 * interval + 2, seed=interval)
+    store = SnapshotStore(str(tmp_path), mode='delta', keyframe_interval=interval, max_delta_ratio=1.0)
+    for date in sorted(history):
+        store.write(history[date])
+
+    depths = [store._chain_depth(date) for date in store.dates()]
+    assert max(depths) < interval
+    # 델타가 충분히 작으면 정확히 interval 저장일마다 키프레임
+    expected = [i % interval for i in range(len(depths))]
+    assert depths == expected
+    for date in store.dates():
+        if os.path.exists(store.delta_path(date)):
+            with open(store.delta_path(date), encoding='utf-8') as f:
+                assert json.load(f)['depth'] == store._chain_depth(date)
+    assert_restores(store, history)
+
+
+def write_full_history(data_dir, history):
+    etf_dir = os.path.join(data_dir, "idx_5")
+    os.makedirs(etf_dir)
+    store = SnapshotStore(etf_dir, mode='full')
+    for date in sorted(history):
+        store.write(history[date])
+    with open(os.path.join(etf_dir, "hashes.json"), 'w', encoding='utf-8') as f:
+        json.dump({date: date for date in history}, f)
+    return etf_dir
+
+
+def test_convert_history_round_trip(tmp_path):
+    history = make_history(20, seed=3)
+    etf_dir = write_full_history(str(tmp_path), history)
+
+    report = convert_history(str(tmp_path), mode='delta', keyframe_interval=5)
+    assert report['날짜 수'].tolist() == [20]
+    store = SnapshotStore(etf_dir)
+    assert 'delta' in kinds(store).values()
+    assert os.path.exists(os.path.join(etf_dir, "hashes.json"))
+    assert sorted(os.listdir(tmp_path)) == ["idx_5"]
+    assert_restores(store, history)
+
+    convert_history(str(tmp_path), mode='full')
+    assert set(kinds(store).values()) == {'keyframe'}
+    assert_restores(store, history)
+
+
+def test_convert_history_failed_verification_keeps_original(tmp_path, monkeypatch):
+    history = make_history(10, seed=4)
+    etf_dir = write_full_history(str(tmp_path), history)
+    before = {file: open(os.path.join(etf_dir, file), 'rb').read() for file in os.listdir(etf_dir)}
+
+    original_apply = snapshot_store.apply_delta
+
+    def corrupt(base_rows, delta):
+        rows = original_apply(base_rows, delta)
+        rows[0][2] += 1
+        return rows
+    monkeypatch.setattr(snapshot_store, 'apply_delta', corrupt)
+
+    with pytest.raises(AssertionError):
+        convert_history(str(tmp_path), mode='delta', keyframe_interval=5)
+    after = {file: open(os.path.join(etf_dir, file), 'rb').read() for file in os.listdir(etf_dir)}
+    assert after == before
+    assert sorted(os.listdir(tmp_path)) == ["idx_5"]